@@ -5,9 +5,12 @@ QArm hardware abstraction for Quanser QArm (simulado o real).
 Provee:
 - Inicialización (Position mode)
 - Lectura/escritura estándar (read_write_std, read_std, write_position)
+- Escritura rápida sin asignaciones (write_position_fast)
 - Stop inmediato (stop_immediate)
 - Terminación limpia (terminate)
 - Context manager support (__enter__/__exit__)
+- Registro de mediciones preasignado (QArmMeasurement) con snapshot()
+- Backend de tarjeta intercambiable (card=...), p. ej. Qarm_sim.SimulatedHIL
 
 Notas:
 - Este módulo mantiene compatibilidad con la API que usa el resto del proyecto.
@@ -17,8 +20,64 @@ Notas:
 
 import numpy as np
 import time
-from quanser.hardware import HIL, HILError, MAX_STRING_LENGTH, Clock
-from quanser.hardware.enumerations import BufferOverflowMode
+
+# quanser.hardware tarda en importarse y no hace falta con un backend simulado
+# (card=...): se carga recién al crear un QArm con la tarjeta real (_load_hil).
+# Hasta entonces se usan los equivalentes de Qarm_sim.
+from Qarm_sim import HILError, MAX_STRING_LENGTH, Clock, BufferOverflowMode
+HIL = None
+
+
+def _load_hil():
+    """
+    Importa quanser.hardware (una sola vez) y pasa a usar sus constantes.
+    HILError queda como tupla: los except siguen atrapando también los
+    errores de los backends simulados. Devuelve la clase HIL o None si los
+    bindings no están instalados.
+    """
+    global HIL, HILError, MAX_STRING_LENGTH, Clock, BufferOverflowMode
+    if HIL is None:
+        try:
+            from quanser.hardware import HIL as _HIL, HILError as _HILError, MAX_STRING_LENGTH as _MAX, Clock as _Clock
+            from quanser.hardware.enumerations import BufferOverflowMode as _Overflow
+        except ImportError:
+            return None
+        HILError = (_HILError, HILError)
+        MAX_STRING_LENGTH, Clock, BufferOverflowMode = _MAX, _Clock, _Overflow
+        HIL = _HIL
+    return HIL
+
+
+class QArmMeasurement:
+    """
+    Registro de mediciones sin asignaciones por lectura.
+
+    Los campos son vistas sobre los buffers de lectura del QArm, por lo que
+    read_std() los actualiza in-place. Quien necesite una copia estable
+    (p. ej. para guardarla o compararla más tarde) debe usar snapshot().
+    """
+
+    __slots__ = ("analog", "other", "current", "position", "speed", "temperature", "pwm")
+
+    def __init__(self, analog, other):
+        self.analog = analog
+        self.other = other
+        self.current = analog[0:5]
+        self.position = other[0:5]
+        self.speed = other[5:10]
+        self.temperature = other[10:15]
+        self.pwm = other[15:20]
+
+    def snapshot(self, out=None):
+        """
+        Copia estable de la medición actual.
+        Si se pasa `out` (otro QArmMeasurement) se copia sobre él sin asignar memoria.
+        """
+        if out is None:
+            return QArmMeasurement(self.analog.copy(), self.other.copy())
+        np.copyto(out.analog, self.analog)
+        np.copyto(out.other, self.other)
+        return out
 
 
 class QArm:
@@ -38,7 +97,7 @@ class QArm:
     ], dtype=np.int32)
     READ_ANALOG_CHANNELS = np.array([5, 6, 7, 8, 9], dtype=np.int32)
 
-    def __init__(self, hardware=1, readMode=1, frequency=500, deviceId=0, hilPort=18900):
+    def __init__(self, hardware=1, readMode=1, frequency=500, deviceId=0, hilPort=18900, card=None):
         """
         Inicializa QArm en modo Position (por defecto).
 
@@ -54,6 +113,9 @@ class QArm:
             ID de dispositivo (hardware).
         hilPort : int
             Puerto para simulador HIL (si hardware==0).
+        card : objeto HIL o None
+            Backend de tarjeta. None usa quanser.hardware.HIL; para correr sin
+            hardware ni QLabs pasar Qarm_sim.SimulatedHIL().
         """
         self.readMode = int(readMode)
         self.hardware = int(hardware)
@@ -64,15 +126,37 @@ class QArm:
         self.readOtherBuffer = np.zeros(len(self.READ_OTHER_CHANNELS), dtype=np.float64)
         self.readAnalogBuffer = np.zeros(len(self.READ_ANALOG_CHANNELS), dtype=np.float64)
 
-        # External measurement arrays (5 entries each: 4 joints + gripper)
-        self.measJointCurrent = np.zeros(5, dtype=np.float64)
-        self.measJointPosition = np.zeros(5, dtype=np.float64)
-        self.measJointSpeed = np.zeros(5, dtype=np.float64)
-        self.measJointPWM = np.zeros(5, dtype=np.float64)
-        self.measJointTemperature = np.zeros(5, dtype=np.float64)
+        # Camino rápido de escritura: canales y vistas cacheadas, más límites
+        # de consigna [j0..j3, gripper] para recortar en un único paso vectorizado.
+        # Por defecto sólo se limita el gripper; QArmWrapper agrega los de las juntas.
+        self._writeAllChannels = self.WRITE_OTHER_CHANNELS.copy()
+        self._writePositionChannels = self.WRITE_OTHER_CHANNELS[0:5].copy()
+        self._writeLedChannels = self.WRITE_OTHER_CHANNELS[5:8].copy()
+        self._writePositionBuffer = self.writeOtherBuffer[0:5]
+        self._writeLedBuffer = self.writeOtherBuffer[5:8]
+        self._cmdStage = np.zeros(5, dtype=np.float64)
+        self.cmdMin = np.array([-np.inf, -np.inf, -np.inf, -np.inf, 0.1], dtype=np.float64)
+        self.cmdMax = np.array([np.inf, np.inf, np.inf, np.inf, 0.9], dtype=np.float64)
+        self.streamTask = None
+        self._streamStage = np.zeros((0, 5), dtype=np.float64)
+
+        # External measurement arrays (5 entries each: 4 joints + gripper).
+        # Son vistas sobre los buffers de lectura: read_std() las actualiza in-place.
+        self.measurement = QArmMeasurement(self.readAnalogBuffer, self.readOtherBuffer)
+        self.measJointCurrent = self.measurement.current
+        self.measJointPosition = self.measurement.position
+        self.measJointSpeed = self.measurement.speed
+        self.measJointPWM = self.measurement.pwm
+        self.measJointTemperature = self.measurement.temperature
 
         # HIL card
-        self.card = HIL()
+        if card is None:
+            if _load_hil() is None:
+                raise ImportError(
+                    "quanser.hardware no está instalado: usar card=Qarm_sim.SimulatedHIL()"
+                )
+            card = HIL()
+        self.card = card
         if self.hardware:
             boardIdentifier = str(deviceId)
         else:
@@ -93,11 +177,10 @@ class QArm:
             self.card.open("qarm_usb", boardIdentifier)
             if self.card.is_valid():
                 self.card.set_card_specific_options(boardSpecificOptions, MAX_STRING_LENGTH)
-                self.status = True
 
                 if self.readMode == 1:
                     self.frequency = int(frequency)
-                    self.samples = HIL.INFINITE
+                    self.samples = getattr(self.card, "INFINITE", -1)
                     self.samplesToRead = 1
 
                     # Create reader task
@@ -136,9 +219,15 @@ class QArm:
                         print("QArm: setting PID gains (non-task mode)")
                     print("QArm configured in Position Mode.")
 
+                # status sólo queda en True si toda la configuración terminó
+                # (incluido el reader task con readMode=1)
+                self.status = True
+
         except HILError as h:
+            self.status = False
             print("QArm init HIL error:", h.get_error_message())
         except Exception as e:
+            self.status = False
             print("QArm init unexpected error:", e)
 
     # -------------------------
@@ -193,30 +282,14 @@ class QArm:
         gprCMD : scalar or array-like (gripper)
         baseLED: array-like (3,) for RGB values (0..1)
         """
-        if phiCMD is None:
-            phiCMD = np.zeros(4, dtype=np.float64)
-        if gprCMD is None:
-            gprCMD = np.array([0.5], dtype=np.float64)
-        if baseLED is None:
-            baseLED = np.array([1.0, 0.0, 0.0], dtype=np.float64)
-
-        # ensure arrays
-        phiCMD = np.asarray(phiCMD, dtype=float).reshape(4,)
-        # gripper scalar
-        try:
-            gpr_val = float(gprCMD[0] if hasattr(gprCMD, '__len__') else gprCMD)
-        except Exception:
-            gpr_val = 0.5
-        gpr_val = float(np.clip(gpr_val, 0.1, 0.9))
-
-        # prepare write buffer
-        self.writeOtherBuffer.fill(0.0)
-        for i in range(4):
-            self.writeOtherBuffer[i] = float(phiCMD[i])
-        self.writeOtherBuffer[4] = gpr_val
+        self._stage_command(phiCMD, gprCMD)
+        np.maximum(self._cmdStage, self.cmdMin, out=self._writePositionBuffer)
+        np.minimum(self._writePositionBuffer, self.cmdMax, out=self._writePositionBuffer)
         # baseLED -> positions 5..7
-        baseLED = np.asarray(baseLED, dtype=float).reshape(3,)
-        self.writeOtherBuffer[5:8] = baseLED
+        if baseLED is None:
+            self._writeLedBuffer[:] = (1.0, 0.0, 0.0)
+        else:
+            self._writeLedBuffer[:] = baseLED
 
         # IO: write then read
         try:
@@ -224,7 +297,7 @@ class QArm:
                 None, 0,
                 None, 0,
                 None, 0,
-                self.WRITE_OTHER_CHANNELS, len(self.WRITE_OTHER_CHANNELS),
+                self._writeAllChannels, 8,
                 None,
                 None,
                 None,
@@ -243,12 +316,14 @@ class QArm:
     def read_std(self):
         """
         Read analog and other channels and update measurement arrays.
-        After calling, the following attributes are updated:
+        After calling, the following attributes are updated in place
+        (they are views into the read buffers, no new arrays are created):
             - measJointCurrent
             - measJointPosition (5 vals)
             - measJointSpeed
             - measJointPWM
             - measJointTemperature
+        Use snapshot() to keep a stable copy.
         """
         try:
             if self.readMode == 1:
@@ -277,60 +352,63 @@ class QArm:
             print("read_std HIL error:", h.get_error_message())
         except Exception as e:
             print("read_std unexpected error:", e)
-        finally:
-            # safely slice into measurement arrays
-            try:
-                self.measJointCurrent = self.readAnalogBuffer.copy()
-                # ensure readOtherBuffer long enough
-                rb = self.readOtherBuffer
-                if len(rb) >= 20:
-                    self.measJointPosition = rb[0:5].copy()
-                    self.measJointSpeed = rb[5:10].copy()
-                    self.measJointTemperature = rb[10:15].copy()
-                    self.measJointPWM = rb[15:20].copy()
-                else:
-                    # fallback: zero arrays if buffer unexpected
-                    self.measJointPosition = np.zeros(5, dtype=float)
-                    self.measJointSpeed = np.zeros(5, dtype=float)
-                    self.measJointTemperature = np.zeros(5, dtype=float)
-                    self.measJointPWM = np.zeros(5, dtype=float)
-            except Exception as e:
-                print("read_std parse error:", e)
+
+    def snapshot(self, out=None):
+        """
+        Copia estable de la última medición (ver QArmMeasurement.snapshot).
+        """
+        return self.measurement.snapshot(out)
 
     # -------------------------
     # Write position
     # -------------------------
-    def write_position(self, phiCMD=None, gprCMD=None):
+    def _stage_command(self, phiCMD, gprCMD):
         """
-        Write desired joint positions (phiCMD: 4,) and gripper command (scalar).
-        Accepts phiCMD as array-like; gprCMD may be scalar or array-like.
+        Copy a (phiCMD, gprCMD) pair into the preallocated 5-element stage buffer.
+        Missing or invalid gripper values fall back to 0.5.
         """
+        cmd = self._cmdStage
         if phiCMD is None:
-            phiCMD = np.zeros(4, dtype=np.float64)
-        phiCMD = np.asarray(phiCMD, dtype=float).reshape(4,)
-
-        # gripper scalar
+            cmd[0:4] = 0.0
+        else:
+            cmd[0:4] = phiCMD
+        if gprCMD is None:
+            cmd[4] = 0.5
+            return cmd
         try:
-            gpr_val = float(gprCMD[0] if hasattr(gprCMD, '__len__') else gprCMD)
+            cmd[4] = gprCMD[0] if hasattr(gprCMD, '__len__') else gprCMD
         except Exception:
-            gpr_val = 0.5
-        gpr_val = float(np.clip(gpr_val, 0.1, 0.9))
+            cmd[4] = 0.5
+        return cmd
 
-        # prepare buffer
-        for i in range(4):
-            self.writeOtherBuffer[i] = float(phiCMD[i])
-        self.writeOtherBuffer[4] = gpr_val
+    def write_position(self, phiCMD=None, gprCMD=None):
+        """
+        Write desired joint positions (phiCMD: 4,) and gripper command (scalar).
+        Accepts phiCMD as array-like; gprCMD may be scalar or array-like.
+        Thin shim over write_position_fast.
+        """
+        return self.write_position_fast(self._stage_command(phiCMD, gprCMD))
+
+    def write_position_fast(self, cmd):
+        """
+        Fast path: cmd is a preallocated float64 buffer (5,) = [j0, j1, j2, j3, gripper].
+        It is clipped against cmdMin/cmdMax straight into the cached write view,
+        without Python-level loops or temporary arrays.
+        """
+        # maximum/minimum con out= (np.clip asigna temporales internamente)
+        np.maximum(cmd, self.cmdMin, out=self._writePositionBuffer)
+        np.minimum(self._writePositionBuffer, self.cmdMax, out=self._writePositionBuffer)
 
         try:
             self.card.write(
                 None, 0,
                 None, 0,
                 None, 0,
-                self.WRITE_OTHER_CHANNELS[0:5], 5,
+                self._writePositionChannels, 5,
                 None,
                 None,
                 None,
-                self.writeOtherBuffer[0:5]
+                self._writePositionBuffer
             )
             return True
         except HILError as h:
@@ -357,17 +435,93 @@ class QArm:
                 None, 0,
                 None, 0,
                 None, 0,
-                self.WRITE_OTHER_CHANNELS[5:], 3,
+                self._writeLedChannels, 3,
                 None,
                 None,
                 None,
-                self.writeOtherBuffer[5:8]
+                self._writeLedBuffer
             )
         except HILError as h:
             print("write_led HIL error:", h.get_error_message())
         except Exception as e:
             print("write_led unexpected error:", e)
 
+    # -------------------------
+    # Buffered streaming (writer task)
+    # -------------------------
+    def stream_start(self, frequency=None, samples_in_buffer=1000, preload=None,
+                     clock=None):
+        """
+        Create a HIL writer task on the position channels and start it on a
+        hardware clock. Samples queued with stream_write are then applied by
+        the card at `frequency`, independent of Python scheduling.
+
+        Parameters
+        ----------
+        frequency : float or None
+            Task rate in Hz (defaults to the read task frequency).
+        samples_in_buffer : int
+            Size of the card-side buffer, in samples.
+        preload : ndarray (n, 5) or None
+            First block, queued before the clock starts to avoid an initial underflow.
+        clock : Clock or None
+            Task clock (None = HARDWARE_CLOCK_0). With readMode=1 the reader task
+            already runs on HARDWARE_CLOCK_0; cards that cannot share it need a
+            different clock.
+        """
+        if self.streamTask is not None:
+            raise RuntimeError("stream already running")
+        self.streamFrequency = float(frequency if frequency is not None else getattr(self, "frequency", 500))
+        self.streamTask = self.card.task_create_other_writer(
+            int(samples_in_buffer), self._writePositionChannels, 5
+        )
+        if preload is not None and len(preload):
+            self.stream_write(preload)
+        if clock is None:
+            clock = Clock.HARDWARE_CLOCK_0
+        self.card.task_start(self.streamTask, clock, self.streamFrequency, 2**32 - 1)
+
+    def stream_write(self, block):
+        """
+        Queue a block of position commands (n, 5) = [j0, j1, j2, j3, gripper]
+        rows. The block is clipped against cmdMin/cmdMax into an internal
+        staging buffer (the caller's block is not modified), as in
+        write_position_fast. Blocks while the card-side buffer is full.
+        Returns the number of samples written (0 on error).
+        """
+        n = len(block)
+        if len(self._streamStage) < n:
+            self._streamStage = np.empty((n, 5), dtype=np.float64)
+        stage = self._streamStage[:n]
+        np.maximum(block, self.cmdMin, out=stage)
+        np.minimum(stage, self.cmdMax, out=stage)
+        try:
+            return self.card.task_write_other(self.streamTask, n, stage)
+        except HILError as h:
+            print("stream_write HIL error:", h.get_error_message())
+            return 0
+        except Exception as e:
+            print("stream_write unexpected error:", e)
+            return 0
+
+    def stream_stop(self):
+        """
+        Stop and delete the writer task. Samples still queued on the card
+        are discarded; the last applied command stays active.
+        """
+        task = self.streamTask
+        if task is None:
+            return
+        self.streamTask = None
+        try:
+            self.card.task_stop(task)
+        except Exception:
+            pass
+        try:
+            self.card.task_delete(task)
+        except Exception:
+            pass
+
     # -------------------------
     # Terminate
     # -------------------------
@@ -376,6 +530,8 @@ class QArm:
         Stop tasks and close connection to QArm.
         """
         try:
+            self.stream_stop()
+
             if getattr(self, "readMode", 0) == 1 and hasattr(self, "readTask"):
                 try:
                     self.card.task_stop(self.readTask)
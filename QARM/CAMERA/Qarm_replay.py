@@ -0,0 +1,209 @@
+# ============================================================
+#                 Qarm_replay.py
+# ============================================================
+"""
+Reproducción offline del control por seguimiento de la mano.
+
+Pasa un video grabado (o un directorio de frames) por la misma cadena que
+test.py (HandDetector -> HandJog) sin cámara ni robot, frame por frame y
+sin descartar ninguno, y guarda el flujo de consignas resultante. El
+controlador se integra con el tiempo del video (dt = 1 / fps), no con el
+reloj, así que dos corridas sobre el mismo video dan las mismas consignas
+salvo que cambie el algoritmo: sirve para medir frames/s, comparar cambios
+y como prueba de regresión.
+
+Formato de salida (.npy estructurado, o .csv con las mismas columnas):
+    frame   número de frame
+    t       tiempo del video (s)
+    hand    0 = sin mano, 1 = abierta, 2 = cerrada
+    cmd     consigna [j0, j1, j2, j3, gripper]
+
+Uso:
+    python Qarm_replay.py mano.mp4 -o comandos.npy            # lo más rápido posible
+    python Qarm_replay.py frames/ --fps 30 -o comandos.csv    # directorio de imágenes
+    python Qarm_replay.py mano.mp4 --realtime                 # a velocidad original
+    python Qarm_replay.py mano.mp4 --roi --complexity 0       # inferencia por ROI, modelo lite
+    python Qarm_replay.py --compare base.npy nuevo.npy        # diferencias entre corridas
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from Qarm_vision import HandCartesian, HandDetector, HandJog, HandObservation, HandTeleop, StageStats, open_source
+
+
+COMMAND_DTYPE = np.dtype([
+    ("frame", np.int32),
+    ("t", np.float64),
+    ("hand", np.int8),
+    ("cmd", np.float64, (5,)),
+])
+
+_HAND_CODES = {"NO HAND": 0, "OPEN": 1, "CLOSED": 2}
+
+CONTROLLERS = {
+    "jog": HandJog,
+    "teleop": HandTeleop,
+    "cartesian": HandCartesian,
+}
+
+
+def replay(source, detector, controller=None, max_frames=None):
+    """
+    Procesa todos los frames de source.
+
+    Returns
+    -------
+    (commands, stats) : arreglo COMMAND_DTYPE (un registro por frame) y dict
+        con frames, wall (s), fps y la StageStats de la inferencia.
+    """
+    controller = controller or HandJog()
+    dt = 1.0 / source.fps
+    inference = StageStats("inferencia", window=4096)
+    clock = time.perf_counter
+
+    capacity = 4096
+    out = np.zeros(capacity, dtype=COMMAND_DTYPE)
+    n = 0
+    t_start = clock()
+    while max_frames is None or n < max_frames:
+        ok, frame, _ = source.read()
+        if not ok:
+            break
+        t_video = n * dt
+        t0 = clock()
+        landmarks, raw = detector(frame)
+        t1 = clock()
+        inference.add(t1 - t0, t1)
+
+        obs = HandObservation(n, t_video, t_video, landmarks, raw, frame)
+        cmd = controller.update(obs, t_video, dt)
+
+        if n == capacity:
+            capacity *= 2
+            out = np.resize(out, capacity)
+        rec = out[n]
+        rec["frame"] = n
+        rec["t"] = t_video
+        rec["hand"] = _HAND_CODES[controller.estado]
+        rec["cmd"] = cmd
+        n += 1
+    wall = clock() - t_start
+
+    return out[:n].copy(), {
+        "frames": n,
+        "wall": wall,
+        "fps": n / wall if wall > 0 else 0.0,
+        "inference": inference,
+    }
+
+
+# -------------------------
+# Archivos de consignas
+# -------------------------
+def save_commands(path, commands):
+    """Guarda el flujo de consignas en .npy (por defecto) o .csv."""
+    if path.lower().endswith(".csv"):
+        table = np.column_stack([commands["frame"], commands["t"], commands["hand"], commands["cmd"]])
+        np.savetxt(path, table, delimiter=",", header="frame,t,hand,j0,j1,j2,j3,gripper",
+                   comments="", fmt=["%d", "%.6f", "%d"] + ["%.9f"] * 5)
+    else:
+        np.save(path, commands)
+
+
+def load_commands(path):
+    if path.lower().endswith(".csv"):
+        table = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        commands = np.zeros(len(table), dtype=COMMAND_DTYPE)
+        commands["frame"] = table[:, 0]
+        commands["t"] = table[:, 1]
+        commands["hand"] = table[:, 2]
+        commands["cmd"] = table[:, 3:8]
+        return commands
+    return np.load(path)
+
+
+def compare(a, b, tol=1e-6):
+    """
+    Diferencias entre dos flujos de consignas.
+
+    Returns
+    -------
+    dict con frames (comparados), hand_changed (frames con otro estado de
+    mano), cmd_changed (frames con |dcmd| > tol), max_diff (5,) y first
+    (primer frame distinto o None).
+    """
+    n = min(len(a), len(b))
+    diff = np.abs(a["cmd"][:n] - b["cmd"][:n])
+    hand = a["hand"][:n] != b["hand"][:n]
+    changed = hand | (diff.max(axis=1) > tol) if n else np.zeros(0, dtype=bool)
+    first = np.flatnonzero(changed)
+    return {
+        "frames": n,
+        "length_mismatch": len(a) != len(b),
+        "hand_changed": int(np.count_nonzero(hand)),
+        "cmd_changed": int(np.count_nonzero(diff.max(axis=1) > tol)) if n else 0,
+        "max_diff": diff.max(axis=0) if n else np.zeros(5),
+        "first": int(first[0]) if first.size else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducción offline del control por visión del QArm")
+    parser.add_argument("source", nargs="?", help="video o directorio de frames")
+    parser.add_argument("-o", "--output", help="archivo de consignas (.npy o .csv)")
+    parser.add_argument("--fps", type=float, default=30.0, help="FPS de un directorio de frames")
+    parser.add_argument("--realtime", action="store_true", help="reproducir a velocidad original")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--roi", action="store_true", help="inferencia sobre un recorte alrededor de la mano")
+    parser.add_argument("--roi-size", type=int, default=224, help="lado del recorte (px)")
+    parser.add_argument("--full-scale", type=float, default=1.0, help="escala del frame completo")
+    parser.add_argument("--controller", choices=sorted(CONTROLLERS), default="jog",
+                        help="jog (test.py original), teleop (filtrado) o cartesian (IK)")
+    parser.add_argument("--complexity", type=int, default=1, choices=(0, 1), help="modelo de MediaPipe")
+    parser.add_argument("--compare", nargs=2, metavar=("A", "B"), help="comparar dos archivos de consignas")
+    args = parser.parse_args()
+    np.set_printoptions(precision=4, suppress=True)
+
+    if args.compare:
+        c = compare(load_commands(args.compare[0]), load_commands(args.compare[1]))
+        print(f"{c['frames']} frames comparados" + (" (largos distintos)" if c["length_mismatch"] else ""))
+        print(f"  estado de mano distinto  {c['hand_changed']}")
+        print(f"  consigna distinta        {c['cmd_changed']}")
+        print(f"  diferencia máx           {c['max_diff']}")
+        if c["first"] is not None:
+            print(f"  primer frame distinto    {c['first']}")
+        sys.exit(1 if c["first"] is not None or c["length_mismatch"] else 0)
+
+    if not args.source:
+        parser.error("falta la fuente (video o directorio)")
+    kw = {"realtime": args.realtime}
+    if os.path.isdir(args.source):
+        kw["fps"] = args.fps
+    source = open_source(args.source, **kw)
+    detector = HandDetector(model_complexity=args.complexity, roi=args.roi,
+                            roi_size=args.roi_size, full_scale=args.full_scale)
+    try:
+        controller = CONTROLLERS[args.controller]()
+        commands, st = replay(source, detector, controller, max_frames=args.max_frames)
+    finally:
+        detector.close()
+        source.release()
+
+    inf = st["inference"].summary()
+    print(f"{args.source}: {st['frames']} frames en {st['wall']:.2f} s ({st['fps']:.1f} frames/s)")
+    print(f"  inferencia               {inf['mean']*1e3:.2f} ms media, p95 {inf['p95']*1e3:.2f} ms")
+    counts = np.bincount(commands["hand"], minlength=3)
+    print(f"  sin mano / abierta / cerrada   {counts[0]} / {counts[1]} / {counts[2]}")
+    if args.roi:
+        d = detector.stats()
+        print(f"  ROI {d['roi_ratio']*100:.1f}% de los frames, {d['lost']} pérdidas de seguimiento")
+    if args.output:
+        save_commands(args.output, commands)
+        print(f"  consignas -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
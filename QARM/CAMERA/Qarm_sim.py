@@ -0,0 +1,427 @@
+# ============================================================
+#                 Qarm_sim.py
+# ============================================================
+"""
+Backend HIL simulado en proceso para el QArm (sin hardware ni QLabs).
+
+SimulatedHIL implementa la parte de la interfaz de quanser.hardware.HIL que
+usa QArm:
+- open / is_valid / close
+- set_card_specific_options / set_double_property
+- read / write
+- task_create_reader / task_start / task_read / task_stop / task_delete
+- task_create_other_writer / task_write_other (streaming con buffer)
+- task_set_buffer_overflow_mode
+
+Modelo:
+- Cada junta es un servo de posición con perfil trapezoidal: velocidad y
+  aceleración máximas tomadas de j*_profile_velocity / j*_profile_acceleration
+  de las board specific options (las mismas que configura QArm.__init__).
+- El gripper sigue su consigna con una dinámica de primer orden.
+- PWM, corriente y temperatura son aproximaciones simples (corriente ~ PWM,
+  calentamiento proporcional a corriente^2) para poder registrar telemetría.
+
+El estado se integra de forma perezosa, con paso fijo, cada vez que se lee o
+escribe la tarjeta, así que no hace falta ningún hilo extra. Las muestras de
+un writer task se aplican durante esa integración en el instante que les
+corresponde según la frecuencia del task (como el reloj de la tarjeta); si el
+buffer se vacía se mantiene la última consigna y se cuenta un underflow.
+
+Si quanser no está instalado, QArm toma de este módulo HILError, Clock,
+BufferOverflowMode y MAX_STRING_LENGTH.
+"""
+
+import threading
+import time
+import numpy as np
+
+
+MAX_STRING_LENGTH = 2048
+
+
+class HILError(Exception):
+    """Equivalente mínimo de quanser.hardware.HILError."""
+
+    def get_error_message(self):
+        return str(self)
+
+
+class Clock:
+    HARDWARE_CLOCK_0 = 0
+    HARDWARE_CLOCK_1 = 1
+    SYSTEM_CLOCK_1 = -1
+
+
+class BufferOverflowMode:
+    # mismos valores que quanser.hardware.enumerations.BufferOverflowMode
+    ERROR_ON_OVERFLOW = 0
+    OVERWRITE_ON_OVERFLOW = 1
+    DISCARD_ON_OVERFLOW = 2
+    WAIT_ON_OVERFLOW = 3
+    SYNCHRONIZED = 4
+
+
+class _SimTask:
+    __slots__ = ("analog_idx", "other_idx", "frequency", "t0", "sample", "overflow_mode",
+                 "channels", "buffer", "head", "count", "underflows")
+
+    def __init__(self, analog_idx=None, other_idx=None):
+        self.analog_idx = analog_idx
+        self.other_idx = other_idx
+        self.frequency = None
+        self.t0 = 0.0
+        self.sample = 0
+        self.overflow_mode = BufferOverflowMode.ERROR_ON_OVERFLOW
+
+        # Sólo writer tasks: buffer circular (muestras x canales)
+        self.channels = None
+        self.buffer = None
+        self.head = 0
+        self.count = 0
+        self.underflows = 0
+
+
+class SimulatedHIL:
+    """
+    Tarjeta HIL simulada para el QArm.
+
+    Parameters
+    ----------
+    dt : float
+        Paso de integración del modelo (s).
+    clock : callable
+        Reloj monotónico en segundos (inyectable para simulación determinista).
+    """
+
+    INFINITE = -1
+
+    # Canales "other" del QArm y su índice en el vector de estado
+    _POSITION_CHANNELS = (1000, 1001, 1002, 1003, 1004)
+    _SPEED_CHANNELS = (3000, 3001, 3002, 3003, 3004)
+    _TEMPERATURE_CHANNELS = (10000, 10001, 10002, 10003, 10004)
+    _PWM_CHANNELS = (11000, 11001, 11002, 11003, 11004)
+    _LED_CHANNELS = (11005, 11006, 11007)
+    _CURRENT_CHANNELS = (5, 6, 7, 8, 9)
+
+    GRIPPER_TAU = 0.1           # s
+    AMBIENT_TEMPERATURE = 30.0  # °C
+    THERMAL_TAU = 600.0         # s
+    THERMAL_GAIN = 20.0         # °C por A^2 en régimen
+    PWM_GAIN = 0.5              # PWM por rad/s^2 de aceleración pedida
+    CURRENT_GAIN = 1.5          # A por unidad de PWM
+
+    def __init__(self, dt=0.001, clock=time.perf_counter):
+        self.dt = float(dt)
+        self.clock = clock
+        self._valid = False
+        self._lock = threading.RLock()
+
+        # Perfil por defecto (igual al BSO de QArm)
+        self.profile_velocity = np.full(4, 1.5708)
+        self.profile_acceleration = np.full(4, 1.0472)
+
+        # Estado: juntas 0..3 + gripper (4)
+        self.position = np.zeros(5)
+        self.speed = np.zeros(5)
+        self.target = np.zeros(5)
+        self.pwm = np.zeros(5)
+        self.current = np.zeros(5)
+        self.temperature = np.full(5, self.AMBIENT_TEMPERATURE)
+        self.led = np.zeros(3)
+        self.double_properties = {}
+        self.write_count = 0
+        self.read_count = 0
+        self.task_write_count = 0
+        self._t = None
+        self._writers = []
+
+        # Tabla canal -> (arreglo, índice) para lecturas/escrituras
+        self._read_other = {}
+        for arr_name, chans in (("position", self._POSITION_CHANNELS),
+                                ("speed", self._SPEED_CHANNELS),
+                                ("temperature", self._TEMPERATURE_CHANNELS),
+                                ("pwm", self._PWM_CHANNELS)):
+            for i, ch in enumerate(chans):
+                self._read_other[ch] = (arr_name, i)
+        self._index_cache = {}
+
+    # -------------------------
+    # Apertura / cierre
+    # -------------------------
+    def open(self, card_type, card_identifier):
+        with self._lock:
+            self._valid = True
+            self._t = self.clock()
+
+    def is_valid(self):
+        return self._valid
+
+    def close(self):
+        self._valid = False
+
+    def set_card_specific_options(self, options, max_length=MAX_STRING_LENGTH):
+        """Toma j*_profile_velocity / j*_profile_acceleration del string de opciones."""
+        for item in options.split(";"):
+            if "=" not in item:
+                continue
+            key, value = item.split("=", 1)
+            key = key.strip()
+            if len(key) > 2 and key[0] == "j" and key[1].isdigit():
+                joint = int(key[1])
+                if key.endswith("_profile_velocity"):
+                    self.profile_velocity[joint] = float(value)
+                elif key.endswith("_profile_acceleration"):
+                    self.profile_acceleration[joint] = float(value)
+
+    def set_double_property(self, properties, num_properties, values):
+        for p, v in zip(np.asarray(properties)[:num_properties], np.asarray(values)[:num_properties]):
+            self.double_properties[int(p)] = float(v)
+
+    def _check_valid(self):
+        if not self._valid:
+            raise HILError("SimulatedHIL: la tarjeta no está abierta")
+
+    # -------------------------
+    # Modelo
+    # -------------------------
+    def _advance(self, now=None):
+        """Integra el modelo con paso fijo hasta `now`."""
+        if now is None:
+            now = self.clock()
+        if self._t is None:
+            self._t = now
+            return
+        steps = int((now - self._t) / self.dt)
+        if steps <= 0:
+            return
+
+        if self._writers:
+            t = self._t
+            for _ in range(steps):
+                t += self.dt
+                for task in self._writers:
+                    self._apply_due(task, t)
+                self._step(self.dt)
+            self._t += steps * self.dt
+            return
+
+        if (not self.speed.any()) and np.array_equal(self.position, self.target):
+            # En reposo: sólo enfriamiento, sin integrar paso a paso
+            elapsed = steps * self.dt
+            self.pwm[:] = 0.0
+            self.current[:] = 0.0
+            self.temperature += (self.AMBIENT_TEMPERATURE - self.temperature) * (
+                1.0 - np.exp(-elapsed / self.THERMAL_TAU))
+            self._t += elapsed
+            return
+
+        for _ in range(steps):
+            self._step(self.dt)
+        self._t += steps * self.dt
+
+    def _apply_due(self, task, t):
+        """Aplica las muestras del writer task cuyo instante es <= t."""
+        n = len(task.buffer)
+        while task.t0 + task.sample / task.frequency <= t:
+            if task.count:
+                tail = (task.head - task.count) % n
+                row = task.buffer[tail]
+                for k, ch in enumerate(task.channels):
+                    self._write_other(ch, row[k])
+                task.count -= 1
+            else:
+                task.underflows += 1
+            task.sample += 1
+
+    def _step(self, dt):
+        q = self.position
+        qd = self.speed
+        vmax = self.profile_velocity
+        amax = self.profile_acceleration
+
+        # Juntas: seguimiento tiempo-óptimo con límites de velocidad/aceleración
+        err = self.target[0:4] - q[0:4]
+        v_des = np.sign(err) * np.minimum(vmax, np.sqrt(2.0 * amax * np.abs(err)))
+        accel = np.clip((v_des - qd[0:4]) / dt, -amax, amax)
+        qd[0:4] += accel * dt
+        q[0:4] += qd[0:4] * dt
+
+        # Llegada: si el próximo paso cruza el objetivo, se fija en él
+        arrived = np.abs(err) <= np.abs(qd[0:4]) * dt + 1e-9
+        slow = np.abs(qd[0:4]) <= amax * dt
+        done = arrived & slow
+        q[0:4][done] = self.target[0:4][done]
+        qd[0:4][done] = 0.0
+
+        # Gripper: primer orden
+        g_err = self.target[4] - q[4]
+        if abs(g_err) < 1e-6:
+            q[4] = self.target[4]
+            qd[4] = 0.0
+        else:
+            qd[4] = g_err / self.GRIPPER_TAU
+            q[4] += qd[4] * dt
+
+        # PWM / corriente / temperatura
+        self.pwm[0:4] = self.PWM_GAIN * accel / amax
+        self.pwm[4] = np.clip(g_err * 2.0, -1.0, 1.0)
+        self.current[:] = self.CURRENT_GAIN * np.abs(self.pwm)
+        t_eq = self.AMBIENT_TEMPERATURE + self.THERMAL_GAIN * self.current ** 2
+        self.temperature += (t_eq - self.temperature) * (dt / self.THERMAL_TAU)
+
+    # -------------------------
+    # IO directa
+    # -------------------------
+    def _indices(self, channels, num_channels):
+        key = (id(channels), num_channels)
+        cached = self._index_cache.get(key)
+        if cached is not None and cached[0] is channels:
+            return cached[1]
+        idx = [self._read_other.get(int(ch)) for ch in np.asarray(channels)[:num_channels]]
+        self._index_cache[key] = (channels, idx)
+        return idx
+
+    def _fill(self, analog_channels, num_analog, other_channels, num_other,
+              analog_buffer, other_buffer):
+        if analog_buffer is not None and num_analog:
+            for k, ch in enumerate(np.asarray(analog_channels)[:num_analog]):
+                i = int(ch) - self._CURRENT_CHANNELS[0]
+                analog_buffer[k] = self.current[i] if 0 <= i < 5 else 0.0
+        if other_buffer is not None and num_other:
+            for k, entry in enumerate(self._indices(other_channels, num_other)):
+                if entry is None:
+                    other_buffer[k] = 0.0
+                else:
+                    other_buffer[k] = getattr(self, entry[0])[entry[1]]
+
+    def read(self, analog_channels, num_analog, encoder_channels, num_encoder,
+             digital_channels, num_digital, other_channels, num_other,
+             analog_buffer, encoder_buffer, digital_buffer, other_buffer):
+        with self._lock:
+            self._check_valid()
+            self._advance()
+            self._fill(analog_channels, num_analog, other_channels, num_other,
+                       analog_buffer, other_buffer)
+            self.read_count += 1
+
+    def write(self, analog_channels, num_analog, pwm_channels, num_pwm,
+              digital_channels, num_digital, other_channels, num_other,
+              analog_buffer, pwm_buffer, digital_buffer, other_buffer):
+        with self._lock:
+            self._check_valid()
+            self._advance()
+            if other_buffer is not None:
+                for ch, value in zip(np.asarray(other_channels)[:num_other], other_buffer):
+                    self._write_other(int(ch), float(value))
+            self.write_count += 1
+
+    def _write_other(self, ch, value):
+        if 1000 <= ch <= 1004:
+            self.target[ch - 1000] = value
+        elif 11005 <= ch <= 11007:
+            self.led[ch - 11005] = value
+
+    # -------------------------
+    # Tareas (reader)
+    # -------------------------
+    def task_create_reader(self, samples_in_buffer,
+                           analog_channels, num_analog,
+                           encoder_channels, num_encoder,
+                           digital_channels, num_digital,
+                           other_channels, num_other):
+        self._check_valid()
+        return _SimTask(
+            (analog_channels, num_analog),
+            (other_channels, num_other),
+        )
+
+    def task_set_buffer_overflow_mode(self, task, mode):
+        task.overflow_mode = mode
+
+    # -------------------------
+    # Tareas (writer)
+    # -------------------------
+    def task_create_other_writer(self, samples_in_buffer, channels, num_channels):
+        self._check_valid()
+        task = _SimTask()
+        task.channels = [int(ch) for ch in np.asarray(channels)[:num_channels]]
+        task.buffer = np.zeros((int(samples_in_buffer), num_channels), dtype=np.float64)
+        return task
+
+    def task_write_other(self, task, num_samples, other_buffer):
+        """
+        Encola num_samples muestras (fila por muestra) en el buffer del task.
+        Con el task corriendo bloquea hasta que haya lugar; antes de
+        task_start el buffer sólo admite hasta su capacidad (precarga).
+        """
+        n = len(task.buffer)
+        data = np.asarray(other_buffer, dtype=np.float64).reshape(-1, len(task.channels))
+        done = 0
+        while done < num_samples:
+            with self._lock:
+                self._check_valid()
+                self._advance()
+                free = n - task.count
+                if free:
+                    k = min(free, num_samples - done)
+                    task.buffer[(task.head + np.arange(k)) % n] = data[done:done + k]
+                    task.head = (task.head + k) % n
+                    task.count += k
+                    done += k
+                    continue
+                if not task.frequency:
+                    raise HILError("SimulatedHIL: buffer del writer task lleno")
+            # espera a que el reloj del task consuma al menos una muestra
+            time.sleep(max(self.dt, 1.0 / task.frequency))
+        self.task_write_count += 1
+        return num_samples
+
+    def task_get_underflows(self, task):
+        """Muestras que el reloj del task encontró con el buffer vacío (sólo simulación)."""
+        return task.underflows
+
+    def task_start(self, task, clock, frequency, num_samples):
+        with self._lock:
+            self._advance()
+            task.frequency = float(frequency)
+            task.t0 = self.clock()
+            task.sample = 0
+            if task.buffer is not None:
+                self._writers.append(task)
+
+    def task_read(self, task, num_samples, analog_buffer, encoder_buffer,
+                  digital_buffer, other_buffer):
+        """
+        Lee una muestra del task. Si el task fue iniciado con task_start,
+        bloquea hasta el instante de la próxima muestra (como un task real
+        clockeado por hardware); si no, lee de inmediato.
+        """
+        if task.frequency:
+            task.sample += 1
+            due = task.t0 + task.sample / task.frequency
+            now = self.clock()
+            if due > now:
+                time.sleep(due - now)
+            elif task.overflow_mode in (BufferOverflowMode.OVERWRITE_ON_OVERFLOW,
+                                        BufferOverflowMode.SYNCHRONIZED):
+                # el lector se atrasó: se descartan las muestras viejas (en
+                # SYNCHRONIZED el task no acumula: se lee la muestra actual)
+                task.sample = int((now - task.t0) * task.frequency)
+        with self._lock:
+            self._check_valid()
+            self._advance()
+            self._fill(task.analog_idx[0], task.analog_idx[1],
+                       task.other_idx[0], task.other_idx[1],
+                       analog_buffer, other_buffer)
+            self.read_count += 1
+        return num_samples
+
+    def task_stop(self, task):
+        with self._lock:
+            self._advance()
+            if task in self._writers:
+                self._writers.remove(task)
+            task.frequency = None
+
+    def task_delete(self, task):
+        pass
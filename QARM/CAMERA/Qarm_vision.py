@@ -0,0 +1,932 @@
+# ============================================================
+#                 Qarm_vision.py
+# ============================================================
+"""
+Control del QArm por seguimiento de la mano, en tres etapas desacopladas.
+
+    captura --LatestSlot--> inferencia --LatestSlot--> actuación --> QArm
+    (hilo)    (sólo el      (MediaPipe,   (última        (lazo a frecuencia
+              último frame)  hilo)        observación)    fija, hilo)
+
+- Captura: lee la cámara (o un video) sin parar y deja sólo el frame más
+  reciente; si la inferencia se atrasa los frames viejos se descartan en
+  lugar de acumularse (se cuentan en `dropped`).
+- Inferencia: MediaPipe Hands sobre el último frame disponible.
+- Actuación: lazo a frecuencia fija (por deadline, como ControlLoop) que
+  integra la consigna con las landmarks más recientes. La tasa de comandos
+  al brazo ya no depende de los FPS de la cámara ni de la latencia de
+  MediaPipe.
+
+Cada etapa tiene su StageStats (eventos/s y latencia). La latencia
+glass-to-motor es el tiempo entre que el frame "aparece" y la primera
+escritura al brazo que usa su observación. Con un video (VideoSource) el
+instante de cada frame es conocido (se reproduce a sus FPS), así que la
+medición es exacta; con una cámara sólo se conoce la llegada del frame al
+proceso (no incluye exposición ni buffers del driver). FrameDirSource
+reproduce un directorio de imágenes igual que un video.
+
+cv2 y mediapipe se importan al crear las fuentes / el detector: el resto
+del módulo (slots, estadísticas, controlador) no depende de ellos.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from Qarm_kinematics import CachedInverse, forward
+
+
+# Observación de la etapa de inferencia
+#   index     número de frame
+#   t_glass   instante del frame (time.perf_counter)
+#   t_done    fin de la inferencia
+#   landmarks (21, 3) float32 normalizadas (x, y, z) o None si no hay mano
+#   raw       landmarks de MediaPipe (para dibujar) o None
+#   frame     imagen BGR analizada
+HandObservation = namedtuple("HandObservation", "index t_glass t_done landmarks raw frame")
+
+
+# -------------------------
+# Estadísticas por etapa
+# -------------------------
+class StageStats:
+    """
+    Eventos/s y latencia de una etapa sobre las últimas `window` muestras.
+    Lo actualiza un solo hilo; summary() se puede llamar desde cualquiera.
+    """
+
+    def __init__(self, name, window=512):
+        self.name = name
+        self.window = int(window)
+        self.count = 0
+        self._lat = np.zeros(self.window)
+        self._t = np.zeros(self.window)
+
+    def add(self, latency, t):
+        i = self.count % self.window
+        self._lat[i] = latency
+        self._t[i] = t
+        self.count += 1
+
+    def summary(self):
+        """dict con count, rate (eventos/s), mean, p50, p95 y max (s)."""
+        count = self.count
+        n = min(count, self.window)
+        if n == 0:
+            return {"count": 0, "rate": 0.0, "mean": np.nan, "p50": np.nan, "p95": np.nan, "max": np.nan}
+        idx = np.arange(count - n, count) % self.window
+        t = self._t[idx]
+        lat = self._lat[idx]
+        span = t[-1] - t[0]
+        return {
+            "count": count,
+            "rate":  (n - 1) / span if n > 1 and span > 0 else 0.0,
+            "mean":  float(lat.mean()),
+            "p50":   float(np.percentile(lat, 50)),
+            "p95":   float(np.percentile(lat, 95)),
+            "max":   float(lat.max()),
+        }
+
+
+# -------------------------
+# Buffer de último valor
+# -------------------------
+class LatestSlot:
+    """
+    Buffer de un solo elemento entre hilos.
+
+    put() reemplaza lo que haya (nunca bloquea al productor); get() espera un
+    elemento más nuevo que el último visto; peek() devuelve el último sin
+    esperar ni tomar el lock (la tupla (seq, item) se publica de una vez).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = (0, None)
+        self._taken = 0
+        self._closed = False
+        self.dropped = 0        # elementos reemplazados sin que get() los viera
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, item):
+        with self._cond:
+            seq = self._latest[0]
+            if seq > self._taken:
+                self.dropped += 1
+            self._latest = (seq + 1, item)
+            self._cond.notify_all()
+
+    def get(self, after, timeout=None):
+        """(seq, item) con seq > after; (after, None) si vence el timeout o se cerró."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest[0] > after or self._closed, timeout)
+            seq, item = self._latest
+            if seq <= after:
+                return after, None
+            self._taken = seq
+            return seq, item
+
+    def peek(self):
+        return self._latest
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# -------------------------
+# Fuentes de frames
+# -------------------------
+class CameraSource:
+    """Cámara por índice; el instante del frame es el de su llegada."""
+
+    def __init__(self, index=0, width=640, height=480):
+        import cv2
+        self.cap = cv2.VideoCapture(index)
+        self.cap.set(3, width)
+        self.cap.set(4, height)
+
+    def read(self):
+        """(ok, frame, t_glass)"""
+        ok, frame = self.cap.read()
+        return ok, frame, time.perf_counter()
+
+    def release(self):
+        self.cap.release()
+
+
+class _PacedSource:
+    """
+    Base de las fuentes grabadas: el frame i "aparece" en t0 + i / fps. Con
+    realtime=True se espera hasta ese instante (reproducción a velocidad
+    original); con realtime=False se lee lo más rápido posible y el instante
+    es el fin de la lectura.
+    """
+
+    def __init__(self, fps, realtime=True, loop=False):
+        self.fps = float(fps)
+        self.realtime = realtime
+        self.loop = loop
+        self._t0 = None
+        self._i = 0
+
+    def _wait(self):
+        """Espera el turno del próximo frame; devuelve su instante."""
+        if self._t0 is None:
+            self._t0 = time.perf_counter()
+        t_glass = self._t0 + self._i / self.fps
+        self._i += 1
+        if self.realtime:
+            remaining = t_glass - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+        return t_glass
+
+    def read(self):
+        """(ok, frame, t_glass)"""
+        t_glass = self._wait()
+        ok, frame = self._read_frame()
+        return ok, frame, t_glass if self.realtime else time.perf_counter()
+
+
+class VideoSource(_PacedSource):
+    """
+    Video grabado reproducido a sus FPS: el instante de cada frame es
+    conocido, así la latencia glass-to-motor se mide desde él
+    (decodificación incluida).
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        import cv2
+        self._cv2 = cv2
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"no se pudo abrir el video {path}")
+        super().__init__(self.cap.get(cv2.CAP_PROP_FPS) or 30.0, realtime, loop)
+
+    def _read_frame(self):
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(self._cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        return ok, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class FrameDirSource(_PacedSource):
+    """Directorio de imágenes (en orden alfabético) reproducido como un video a `fps`."""
+
+    EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def __init__(self, directory, fps=30.0, realtime=True, loop=False):
+        import cv2
+        self._cv2 = cv2
+        self.path = directory
+        self.paths = sorted(
+            os.path.join(directory, f) for f in os.listdir(directory)
+            if f.lower().endswith(self.EXTENSIONS)
+        )
+        if not self.paths:
+            raise IOError(f"no hay imágenes en {directory}")
+        self._k = 0
+        super().__init__(fps, realtime, loop)
+
+    def _read_frame(self):
+        if self._k >= len(self.paths):
+            if not self.loop:
+                return False, None
+            self._k = 0
+        frame = self._cv2.imread(self.paths[self._k])
+        self._k += 1
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+
+def open_source(spec, width=640, height=480, **kw):
+    """
+    Índice de cámara (int o "0") -> CameraSource; directorio -> FrameDirSource;
+    otra ruta -> VideoSource. kw (realtime, loop, fps) van a las fuentes grabadas.
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec), width, height)
+    if os.path.isdir(spec):
+        return FrameDirSource(spec, **kw)
+    kw.pop("fps", None)
+    return VideoSource(spec, **kw)
+
+
+# -------------------------
+# Detector de mano
+# -------------------------
+class HandDetector:
+    """
+    MediaPipe Hands sobre frames BGR: devuelve (landmarks (21, 3), raw) o
+    (None, None). Landmarks y raw siempre en coordenadas normalizadas del
+    frame completo.
+
+    Modo ROI (roi=True): mientras haya mano, se recorta un cuadrado
+    alrededor de las últimas landmarks (más roi_margin por lado), se reduce
+    a roi_size px y sólo eso pasa por MediaPipe. Si en el recorte no hay
+    mano se vuelve al frame completo en ese mismo frame (reducido por
+    full_scale). Recorte y frame completo usan instancias de Hands
+    separadas para que el seguimiento interno de MediaPipe no mezcle
+    coordenadas.
+
+    Parameters
+    ----------
+    model_complexity : 0 (modelo lite, más rápido) o 1 (el de test.py)
+    roi : activa el modo ROI
+    roi_size : lado máximo (px) del recorte que ve MediaPipe
+    roi_margin : margen alrededor de la mano, en fracciones de su tamaño
+    full_scale : escala del frame completo (1.0 = sin reducir)
+    """
+
+    # Lado mínimo del recorte en px del frame (manos lejanas)
+    ROI_MIN_SIDE = 64
+
+    def __init__(self, max_num_hands=1, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 model_complexity=1, roi=False, roi_size=224, roi_margin=0.5, full_scale=1.0):
+        import cv2
+        import mediapipe as mp
+        self._cv2 = cv2
+
+        def make():
+            return mp.solutions.hands.Hands(
+                static_image_mode=False,
+                max_num_hands=max_num_hands,
+                model_complexity=model_complexity,
+                min_detection_confidence=min_detection_confidence,
+                min_tracking_confidence=min_tracking_confidence
+            )
+
+        self.hands = make()
+        self.hands_roi = make() if roi else None
+        self.roi = roi
+        self.roi_size = int(roi_size)
+        self.roi_margin = float(roi_margin)
+        self.full_scale = float(full_scale)
+
+        self._last = None
+        self.full_frames = 0    # frames procesados completos
+        self.roi_frames = 0     # frames resueltos con el recorte
+        self.lost = 0           # recortes sin mano (vuelta al frame completo)
+
+    def __call__(self, frame):
+        if self.roi and self._last is not None:
+            lm, hand = self._detect_roi(frame)
+            if lm is not None:
+                self.roi_frames += 1
+                self._last = lm
+                return lm, hand
+            self.lost += 1
+        lm, hand = self._detect_full(frame)
+        self.full_frames += 1
+        self._last = lm
+        return lm, hand
+
+    def _process(self, hands, img):
+        results = hands.process(self._cv2.cvtColor(img, self._cv2.COLOR_BGR2RGB))
+        if not results.multi_hand_landmarks:
+            return None
+        return results.multi_hand_landmarks[0]
+
+    @staticmethod
+    def _to_array(hand):
+        return np.array([(p.x, p.y, p.z) for p in hand.landmark], dtype=np.float32)
+
+    def _detect_full(self, frame):
+        img = frame
+        if self.full_scale != 1.0:
+            img = self._cv2.resize(frame, None, fx=self.full_scale, fy=self.full_scale,
+                                   interpolation=self._cv2.INTER_AREA)
+        hand = self._process(self.hands, img)
+        if hand is None:
+            return None, None
+        return self._to_array(hand), hand
+
+    def _detect_roi(self, frame):
+        h, w = frame.shape[0:2]
+        lm = self._last
+        x0, x1 = float(lm[:, 0].min()) * w, float(lm[:, 0].max()) * w
+        y0, y1 = float(lm[:, 1].min()) * h, float(lm[:, 1].max()) * h
+        side = max(x1 - x0, y1 - y0) * (1.0 + 2.0 * self.roi_margin)
+        half = max(side, self.ROI_MIN_SIDE) / 2.0
+        cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+        ix0, ix1 = max(int(cx - half), 0), min(int(cx + half), w)
+        iy0, iy1 = max(int(cy - half), 0), min(int(cy + half), h)
+        if ix1 - ix0 < 2 or iy1 - iy0 < 2:
+            return None, None
+
+        crop = frame[iy0:iy1, ix0:ix1]
+        cw, ch = ix1 - ix0, iy1 - iy0
+        f = self.roi_size / max(cw, ch)
+        if f < 1.0:
+            crop = self._cv2.resize(crop, None, fx=f, fy=f, interpolation=self._cv2.INTER_AREA)
+        hand = self._process(self.hands_roi, crop)
+        if hand is None:
+            return None, None
+
+        # recorte -> frame completo (también raw, para dibujar)
+        for p in hand.landmark:
+            p.x = (ix0 + p.x * cw) / w
+            p.y = (iy0 + p.y * ch) / h
+            p.z = p.z * cw / w
+        return self._to_array(hand), hand
+
+    def stats(self):
+        n = self.full_frames + self.roi_frames
+        return {
+            "full_frames": self.full_frames,
+            "roi_frames":  self.roi_frames,
+            "lost":        self.lost,
+            "roi_ratio":   self.roi_frames / n if n else 0.0,
+        }
+
+    def close(self):
+        self.hands.close()
+        if self.hands_roi is not None:
+            self.hands_roi.close()
+
+
+def is_hand_open(lm):
+    """Mano abierta: al menos 3 puntas de dedo por encima de su articulación media."""
+    return int(np.count_nonzero(lm[[8, 12, 16, 20], 1] < lm[[6, 10, 14, 18], 1])) >= 3
+
+
+# -------------------------
+# Controlador
+# -------------------------
+class HandJog:
+    """
+    Lógica de test.py (mano cerrada = mover base/hombro) expresada en rad/s,
+    para integrarla a la frecuencia del lazo de actuación en lugar de una
+    vez por frame.
+    """
+
+    # El lazo original sumaba diff * 0.04 rad por frame a ~30 fps
+    GAIN = 0.04 * 30.0
+
+    BASE_MIN = -1.57     # -90°
+    BASE_MAX = 1.57      # +90°
+    SH_MIN = -1.0
+    SH_MAX = 1.0
+
+    GRIPPER_OPEN = 0.1
+    GRIPPER_CLOSED = 0.9
+
+    def __init__(self, gripper=GRIPPER_OPEN, hold_timeout=0.25):
+        """
+        hold_timeout : s sin observaciones nuevas tras los cuales se deja de
+            mover (la cámara o la inferencia se colgaron).
+        """
+        self.cmd = np.zeros(5, dtype=np.float64)
+        self.cmd[4] = gripper
+        self.hold_timeout = float(hold_timeout)
+        self.estado = "NO HAND"
+
+    def update(self, obs, now, dt):
+        """Avanza la consigna dt segundos con la observación obs; devuelve cmd (5,)."""
+        cmd = self.cmd
+        if obs is None or obs.landmarks is None or now - obs.t_done > self.hold_timeout:
+            self.estado = "NO HAND"
+            return cmd
+        lm = obs.landmarks
+
+        # Mano abierta = no mueve
+        if is_hand_open(lm):
+            self.estado = "OPEN"
+            cmd[4] = self.GRIPPER_OPEN
+            return cmd
+        self.estado = "CLOSED"
+        cmd[4] = self.GRIPPER_CLOSED
+        vb, vs = self._target(float(lm[0, 0]), float(lm[0, 1]))
+        cmd[0] = min(max(cmd[0] + vb * dt, self.BASE_MIN), self.BASE_MAX)
+        cmd[2] = min(max(cmd[2] + vs * dt, self.SH_MIN), self.SH_MAX)
+        return cmd
+
+    def _target(self, x, y):
+        """
+        Velocidades (rad/s) de base y hombro para la muñeca en (x, y):
+        zona muerta en el centro; fuera de ella, proporcional a la distancia
+        al centro (mano a la izquierda -> base +, mano arriba -> brazo sube).
+        """
+        g = self.GAIN
+        vb = g * (0.5 - x) if x < 0.43 else (-g * (x - 0.5) if x > 0.57 else 0.0)
+        vs = -g * (0.5 - y) if y < 0.50 else (g * (y - 0.5) if y > 0.65 else 0.0)
+        return vb, vs
+
+
+class OneEuroFilter:
+    """
+    Filtro One-Euro (Casiez et al., CHI 2012) sobre un vector: pasabajos
+    cuya frecuencia de corte sube con la velocidad, así filtra fuerte el
+    ruido con la mano quieta y sigue sin retardo los movimientos rápidos.
+    Además de la señal filtrada lleva su derivada, que se usa para predecir.
+
+    Parameters
+    ----------
+    min_cutoff : corte (Hz) en reposo; menor = más suave
+    beta : aumento del corte por unidad de velocidad; mayor = menos retardo
+    d_cutoff : corte (Hz) del filtro de la derivada
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.0, d_cutoff=1.0):
+        self.min_cutoff = float(min_cutoff)
+        self.beta = float(beta)
+        self.d_cutoff = float(d_cutoff)
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.velocity = None
+        self.t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        """Agrega la muestra x tomada en t (s); devuelve el valor filtrado."""
+        x = np.asarray(x, dtype=np.float64)
+        if self.value is None:
+            self.value = x.copy()
+            self.velocity = np.zeros_like(self.value)
+            self.t = t
+            return self.value
+        dt = t - self.t
+        if dt <= 0.0:
+            return self.value
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.velocity += a_d * ((x - self.value) / dt - self.velocity)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        self.value += self._alpha(cutoff, dt) * (x - self.value)
+        self.t = t
+        return self.value
+
+    def predict(self, t, horizon):
+        """Extrapolación lineal a t, como mucho `horizon` s más allá de la última muestra."""
+        lead = min(max(t - self.t, 0.0), horizon)
+        return self.value + self.velocity * lead
+
+
+class HandTeleop(HandJog):
+    """
+    Teleoperación por velocidad con la muñeca filtrada, para el lazo de
+    actuación (misma interfaz que HandJog):
+
+    - La muñeca (x, y) pasa por un OneEuroFilter con el tiempo de cada
+      frame (t_glass), no el de llegada.
+    - Entre frames la posición se predice con la derivada del filtro hasta
+      `now` (a lo sumo predict_horizon): compensa la latencia de inferencia
+      y da una consigna nueva en cada período del lazo, no en cada frame.
+    - La velocidad objetivo usa el mismo mapa que HandJog (zonas muertas y
+      GAIN) y se alcanza con aceleración limitada (accel), así ni el
+      ruido ni la entrada/salida de la zona muerta producen escalones.
+    - Mano abierta/cerrada con antirrebote: el estado cambia tras
+      debounce frames seguidos iguales.
+    """
+
+    def __init__(self, gripper=HandJog.GRIPPER_OPEN, hold_timeout=0.25,
+                 min_cutoff=1.0, beta=5.0, d_cutoff=1.0,
+                 predict_horizon=0.05, accel=4.0, debounce=2):
+        super().__init__(gripper, hold_timeout)
+        self.filter = OneEuroFilter(min_cutoff, beta, d_cutoff)
+        self.predict_horizon = float(predict_horizon)
+        self.accel = float(accel)
+        self.debounce = int(debounce)
+        self.v_base = 0.0
+        self.v_shoulder = 0.0
+        self._obs = None
+        self._closed = False
+        self._votes = 0
+
+    def _features(self, lm):
+        """Lo que se filtra de cada observación: la muñeca (x, y)."""
+        return lm[0, 0:2]
+
+    def _observe(self, obs):
+        """Procesa una observación nueva: filtro de la muñeca y estado de la mano."""
+        self._obs = obs
+        lm = obs.landmarks
+        self.filter(self._features(lm), obs.t_glass)
+        closed = not is_hand_open(lm)
+        if closed == self._closed:
+            self._votes = 0
+        else:
+            self._votes += 1
+            if self._votes >= self.debounce:
+                self._closed = closed
+                self._votes = 0
+
+    def update(self, obs, now, dt):
+        """Avanza la consigna dt segundos con la observación obs; devuelve cmd (5,)."""
+        cmd = self.cmd
+        tb = ts = 0.0
+        if obs is None or obs.landmarks is None or now - obs.t_done > self.hold_timeout:
+            self.estado = "NO HAND"
+            if obs is not self._obs:
+                # mano perdida: el filtro arranca de cero con la próxima
+                self._obs = obs
+                self.filter.reset()
+        else:
+            if obs is not self._obs:
+                self._observe(obs)
+            if self._closed:
+                self.estado = "CLOSED"
+                cmd[4] = self.GRIPPER_CLOSED
+                x, y = self.filter.predict(now, self.predict_horizon)
+                tb, ts = self._target(x, y)
+            else:
+                self.estado = "OPEN"
+                cmd[4] = self.GRIPPER_OPEN
+
+        # aceleración limitada hacia la velocidad objetivo
+        dv = self.accel * dt
+        self.v_base += min(max(tb - self.v_base, -dv), dv)
+        self.v_shoulder += min(max(ts - self.v_shoulder, -dv), dv)
+
+        base = cmd[0] + self.v_base * dt
+        if base <= self.BASE_MIN or base >= self.BASE_MAX:
+            base = min(max(base, self.BASE_MIN), self.BASE_MAX)
+            self.v_base = 0.0
+        shoulder = cmd[2] + self.v_shoulder * dt
+        if shoulder <= self.SH_MIN or shoulder >= self.SH_MAX:
+            shoulder = min(max(shoulder, self.SH_MIN), self.SH_MAX)
+            self.v_shoulder = 0.0
+        cmd[0] = base
+        cmd[2] = shoulder
+        return cmd
+
+
+class HandCartesian(HandTeleop):
+    """
+    Seguimiento cartesiano: la mano mueve el efector (X, Y, Z) y las juntas
+    salen de la IK, como en Inverse.py (mapa de alcance + CachedInverse con
+    la solución más cercana a la consigna actual), en lugar de empujar la
+    base y el hombro por separado.
+
+    - Embrague: con la mano cerrada el efector sigue el desplazamiento de la
+      muñeca desde el instante en que se cerró (mapeo relativo, sin saltos
+      al volver a cerrar); con la mano abierta o sin mano se queda quieto.
+      Imagen a la izquierda -> +Y, arriba -> +Z; con depth=True el tamaño
+      aparente de la palma mueve en X (mano más cerca de la cámara -> +X).
+    - La muñeca se filtra y predice como en HandTeleop; el objetivo avanza
+      hacia ella a lo sumo vlin m/s, así en cada período del lazo la IK
+      resuelve un paso pequeño.
+    - Presupuesto de IK: si una resolución tarda más que ik_budget, el
+      período siguiente no resuelve (mantiene las juntas) para que el lazo
+      recupere su deadline. Se descartan soluciones inalcanzables o que
+      saltan más de MAX_STEP en una junta (cambio de rama).
+    - ik_stats (StageStats) registra el tiempo de IK de cada período que resuelve.
+    """
+
+    # Salto articular máximo por período (rad); más = cambio de rama
+    MAX_STEP = 0.2
+
+    def __init__(self, gripper=HandJog.GRIPPER_OPEN, hold_timeout=0.25, reach=None,
+                 p_start=None, gamma=0.0, scale=0.6, depth=False, depth_scale=0.3,
+                 vlin=0.25, bounds=((0.15, 0.60), (-0.45, 0.45), (0.05, 0.70)),
+                 ik_budget=0.002, ik_quantum=1e-3, **kw):
+        """
+        reach : Qarm_workspace.ReachabilityMap (opcional) para descartar
+            objetivos imposibles sin llamar a la IK
+        p_start : posición inicial del efector (None = la de cmd, HOME)
+        scale : m de efector por ancho completo de imagen
+        depth_scale : m de X por cambio relativo de tamaño de la palma
+        vlin : velocidad máxima del objetivo (m/s)
+        bounds : caja (m) a la que se limita el objetivo
+        ik_budget : s por resolución antes de saltear la siguiente
+        ik_quantum : cuantización (m) de la caché de la IK
+        """
+        super().__init__(gripper, hold_timeout, **kw)
+        self.reach = reach
+        self.gamma = float(gamma)
+        self.scale = float(scale)
+        self.depth = depth
+        self.depth_scale = float(depth_scale)
+        self.vlin = float(vlin)
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.ik_budget = float(ik_budget)
+        self.ik = CachedInverse(quantum=ik_quantum)
+        self.ik_stats = StageStats("IK")
+
+        self.cmd[3] = self.gamma
+        self.target = (np.array(p_start, dtype=np.float64) if p_start is not None
+                       else forward(self.cmd[0:4])[0])
+        self._goal = self.target.copy()
+        self._anchor_hand = None
+        self._anchor_target = None
+        self._skip = False
+        self.ik_skipped = 0         # períodos sin IK por exceder el presupuesto
+        self.ik_rejected = 0        # objetivos inalcanzables o con salto de rama
+
+    @property
+    def stage_stats(self):
+        return (self.ik_stats,)
+
+    def _features(self, lm):
+        # muñeca (x, y) y tamaño aparente de la palma (muñeca -> nudillo medio)
+        return (lm[0, 0], lm[0, 1], float(np.hypot(lm[9, 0] - lm[0, 0], lm[9, 1] - lm[0, 1])))
+
+    def _hand_goal(self, now):
+        """Objetivo del efector para la mano predicha en now (embrague ya enganchado)."""
+        hand = self.filter.predict(now, self.predict_horizon)
+        d = hand - self._anchor_hand
+        goal = self._anchor_target.copy()
+        goal[1] -= d[0] * self.scale
+        goal[2] -= d[1] * self.scale
+        if self.depth and self._anchor_hand[2] > 0:
+            goal[0] += (hand[2] / self._anchor_hand[2] - 1.0) * self.depth_scale
+        np.maximum(goal, self.bounds[:, 0], out=goal)
+        np.minimum(goal, self.bounds[:, 1], out=goal)
+        return goal
+
+    def update(self, obs, now, dt):
+        """Avanza la consigna un período: embrague, objetivo cartesiano e IK."""
+        cmd = self.cmd
+        engaged = False
+        if obs is None or obs.landmarks is None or now - obs.t_done > self.hold_timeout:
+            self.estado = "NO HAND"
+            if obs is not self._obs:
+                self._obs = obs
+                self.filter.reset()
+        else:
+            if obs is not self._obs:
+                self._observe(obs)
+            if self._closed:
+                self.estado = "CLOSED"
+                cmd[4] = self.GRIPPER_CLOSED
+                engaged = True
+            else:
+                self.estado = "OPEN"
+                cmd[4] = self.GRIPPER_OPEN
+
+        if engaged:
+            if self._anchor_hand is None:
+                self._anchor_hand = self.filter.value.copy()
+                self._anchor_target = self.target.copy()
+            self._goal = self._hand_goal(now)
+        else:
+            self._anchor_hand = None
+            self._goal = self.target.copy()
+
+        # el objetivo avanza a lo sumo vlin * dt hacia la mano
+        d = self._goal - self.target
+        dist = float(np.sqrt(d @ d))
+        if dist < 1e-6:
+            return cmd
+        if self._skip:
+            self._skip = False
+            self.ik_skipped += 1
+            return cmd
+        step = self.vlin * dt
+        p = self.target + d * (step / dist) if dist > step else self._goal
+
+        clock = time.perf_counter
+        t0 = clock()
+        if self.reach is not None and self.reach.classify(p, self.gamma) is False:
+            ok = False
+        else:
+            phi, ok = self.ik(p, self.gamma, cmd[0:4])
+            ok = ok and float(np.abs(phi[0:3] - cmd[0:3]).max()) <= self.MAX_STEP
+        t1 = clock()
+        self.ik_stats.add(t1 - t0, t1)
+        if t1 - t0 > self.ik_budget:
+            self._skip = True
+
+        if ok:
+            self.target = p
+            cmd[0:4] = phi
+        else:
+            self.ik_rejected += 1
+            # el objetivo no se mueve hacia un punto imposible: se re-ancla
+            # para que la mano no acumule desplazamiento fuera del alcance
+            if self._anchor_hand is not None:
+                self._anchor_hand = self.filter.predict(now, self.predict_horizon).copy()
+                self._anchor_target = self.target.copy()
+        return cmd
+
+
+# -------------------------
+# Pipeline
+# -------------------------
+class HandPipeline:
+    """
+    Captura, inferencia y actuación en hilos separados.
+
+    Parameters
+    ----------
+    source : objeto con read() -> (ok, frame, t_glass) (CameraSource, VideoSource)
+    detector : callable(frame) -> (landmarks, raw) (HandDetector)
+    write_fn : callable(cmd (5,)), p. ej. QArm.write_position_fast
+    controller : HandJog (o cualquier objeto con update(obs, now, dt) -> cmd)
+    frequency : Hz del lazo de actuación
+    """
+
+    def __init__(self, source, detector, write_fn, controller=None, frequency=100, spin=0.0002):
+        self.source = source
+        self.detector = detector
+        self.write_fn = write_fn
+        self.controller = controller or HandJog()
+        self.frequency = float(frequency)
+        self.period = 1.0 / self.frequency
+        self.spin = float(spin)
+
+        self.frames = LatestSlot()
+        self.hands = LatestSlot()
+
+        self.capture_stats = StageStats("captura")        # latencia: lectura tras el instante del frame
+        self.inference_stats = StageStats("inferencia")   # latencia: detector
+        self.actuation_stats = StageStats("actuación")    # latencia: write_fn
+        self.glass_to_motor = StageStats("glass-to-motor")
+        self.overruns = 0
+
+        self._running = False
+        self._threads = []
+        self._inference_done = threading.Event()
+
+    # -------------------------
+    # Arranque / parada
+    # -------------------------
+    def start(self):
+        self._running = True
+        self._inference_done.clear()
+        self._threads = [
+            threading.Thread(target=self._capture, name="QArmCapture", daemon=True),
+            threading.Thread(target=self._inference, name="QArmInference", daemon=True),
+            threading.Thread(target=self._actuation, name="QArmActuation", daemon=True),
+        ]
+        for th in self._threads:
+            th.start()
+
+    def stop(self):
+        self._running = False
+        self.frames.close()
+        for th in self._threads:
+            if th is not threading.current_thread():
+                th.join(timeout=2.0)
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def finished(self):
+        """La fuente se terminó (fin del video) y la inferencia procesó el último frame."""
+        return self._inference_done.is_set()
+
+    def wait(self, timeout=None):
+        """Espera el fin de la fuente; devuelve True si terminó."""
+        return self._inference_done.wait(timeout)
+
+    def latest(self):
+        """Última HandObservation (o None)."""
+        return self.hands.peek()[1]
+
+    # -------------------------
+    # Hilos
+    # -------------------------
+    def _capture(self):
+        clock = time.perf_counter
+        i = 0
+        while self._running:
+            ok, frame, t_glass = self.source.read()
+            if not ok:
+                break
+            t = clock()
+            self.capture_stats.add(t - t_glass, t)
+            self.frames.put((i, t_glass, frame))
+            i += 1
+        self.frames.close()
+
+    def _inference(self):
+        clock = time.perf_counter
+        seq = 0
+        while self._running:
+            seq, item = self.frames.get(seq, timeout=0.5)
+            if item is None:
+                if self.frames.closed:
+                    break
+                continue
+            index, t_glass, frame = item
+            t0 = clock()
+            try:
+                landmarks, raw = self.detector(frame)
+            except Exception as e:
+                print("HandPipeline inference error:", e)
+                landmarks, raw = None, None
+            t1 = clock()
+            self.inference_stats.add(t1 - t0, t1)
+            self.hands.put(HandObservation(index, t_glass, t1, landmarks, raw, frame))
+        self._inference_done.set()
+
+    def _actuation(self):
+        clock = time.perf_counter
+        period = self.period
+        spin = self.spin
+        controller = self.controller
+        last_seq = 0
+
+        deadline = clock() + period
+        while self._running:
+            remaining = deadline - clock()
+            if remaining > spin:
+                time.sleep(remaining - spin)
+            while clock() < deadline:
+                pass
+
+            now = clock()
+            seq, obs = self.hands.peek()
+            cmd = controller.update(obs, now, period)
+            try:
+                self.write_fn(cmd)
+            except Exception as e:
+                print("HandPipeline write error:", e)
+            t = clock()
+            self.actuation_stats.add(t - now, t)
+            if seq != last_seq and obs is not None:
+                # primera escritura que usa esta observación
+                self.glass_to_motor.add(t - obs.t_glass, t)
+                last_seq = seq
+
+            deadline += period
+            if t > deadline:
+                # overrun: se saltea al próximo período en lugar de acumular atraso
+                self.overruns += 1
+                deadline = t + period
+
+    # -------------------------
+    # Estadísticas
+    # -------------------------
+    def stats(self):
+        """Resúmenes por etapa; las StageStats del controlador (p. ej. IK) van en "controller"."""
+        return {
+            "controller":     {st.name: st.summary() for st in getattr(self.controller, "stage_stats", ())},
+            "capture":        self.capture_stats.summary(),
+            "inference":      self.inference_stats.summary(),
+            "actuation":      self.actuation_stats.summary(),
+            "glass_to_motor": self.glass_to_motor.summary(),
+            "dropped_frames": self.frames.dropped,
+            "overruns":       self.overruns,
+        }
+
+    def report(self):
+        print(f"{'etapa':<16}{'eventos':>9}{'1/s':>9}{'media ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'máx ms':>9}")
+        extra = tuple(getattr(self.controller, "stage_stats", ()))
+        for st in (self.capture_stats, self.inference_stats, self.actuation_stats, self.glass_to_motor) + extra:
+            s = st.summary()
+            print(f"{st.name:<16}{s['count']:>9}{s['rate']:>9.1f}{s['mean']*1e3:>10.2f}"
+                  f"{s['p50']*1e3:>9.2f}{s['p95']*1e3:>9.2f}{s['max']*1e3:>9.2f}")
+        print(f"frames descartados {self.frames.dropped}, overruns de actuación {self.overruns}")
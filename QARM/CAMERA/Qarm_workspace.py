@@ -0,0 +1,199 @@
+# ============================================================
+#                 Qarm_workspace.py
+# ============================================================
+"""
+Mapa de alcance del QArm precalculado en una grilla de vóxeles.
+
+Para el centro de cada vóxel se resuelve la IK (las 4 ramas, con los
+límites LIMITS_MIN / LIMITS_MAX de Qarm_kinematics) y se guarda:
+- mask : bits de las ramas válidas (0 = inalcanzable)
+- q    : juntas 0..2 de la rama válida más cercana a HOME (arranque en
+         caliente para la IK o para elegir rama)
+
+La posición no depende de gamma (es el giro de la muñeca, junta 3), así que
+la grilla es sólo (X, Y, Z); gamma se verifica contra el límite de la junta 3.
+
+El mapa se guarda como .npy estructurado más un .json con la grilla y se
+abre con mmap: cargarlo no lee el archivo y cada consulta es O(1) (índice
+directo). La respuesta corresponde al centro del vóxel, así que cerca del
+borde del espacio de trabajo puede equivocarse: classify() sólo contesta
+cuando el vóxel y sus vecinos coinciden y deja el borde a la IK exacta.
+
+Uso:
+    python Qarm_workspace.py                 # genera reach_map.npy (1 cm)
+    python Qarm_workspace.py --resolution 0.005
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+from Qarm_kinematics import LAMBDA_1, LAMBDA_2, LAMBDA_3, LIMITS_MAX, LIMITS_MIN, candidates
+
+
+MAP_DTYPE = np.dtype([("mask", np.uint8), ("q", np.float32, (3,))])
+
+# Caja que contiene todo el alcance (m): radio L2 + L3 alrededor del hombro
+_REACH = LAMBDA_2 + LAMBDA_3
+DEFAULT_BOUNDS = (
+    (-_REACH, _REACH),
+    (-_REACH, _REACH),
+    (LAMBDA_1 - _REACH, LAMBDA_1 + _REACH),
+)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reach_map.npy")
+
+
+class ReachabilityMap:
+    """Mapa de alcance memory-mapped (sólo lectura)."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            meta = json.load(f)
+        self.path = path
+        self.resolution = float(meta["resolution"])
+        self.origin = np.array(meta["origin"], dtype=np.float64)
+        self.shape = tuple(meta["shape"])
+        self.gamma_min = float(meta["gamma_min"])
+        self.gamma_max = float(meta["gamma_max"])
+        self.grid = np.load(path, mmap_mode="r")
+        self._mask = self.grid["mask"]
+        self._q = self.grid["q"]
+        self._inv = 1.0 / self.resolution
+        self._shape_arr = np.array(self.shape)
+
+    # -------------------------
+    # Generación
+    # -------------------------
+    @classmethod
+    def generate(cls, path=DEFAULT_PATH, resolution=0.01, bounds=DEFAULT_BOUNDS,
+                 q_min=LIMITS_MIN, q_max=LIMITS_MAX):
+        """Calcula el mapa plano Z por plano Z y lo escribe en path (+ .json)."""
+        res = float(resolution)
+        axes = [np.arange(lo, hi + 0.5 * res, res) for lo, hi in bounds]
+        shape = tuple(len(a) for a in axes)
+        grid = np.lib.format.open_memmap(path, mode="w+", dtype=MAP_DTYPE, shape=shape)
+
+        X, Y = np.meshgrid(axes[0], axes[1], indexing="ij")
+        P = np.empty((X.size, 3))
+        P[:, 0] = X.ravel()
+        P[:, 1] = Y.ravel()
+        bits = (1 << np.arange(4)).astype(np.uint8)
+        for k, z in enumerate(axes[2]):
+            P[:, 2] = z
+            phi, _, ok = candidates(P, 0.0, q_min, q_max)
+            # rama válida más cercana a HOME
+            dist = np.where(ok, np.sum(phi[:, :, 0:3] ** 2, axis=2), np.inf)
+            best = np.argmin(dist, axis=1)
+            plane = grid[:, :, k]
+            plane["mask"] = (ok * bits).sum(axis=1).astype(np.uint8).reshape(shape[0:2])
+            q = phi[np.arange(len(P)), best, 0:3]
+            q[~ok.any(axis=1)] = np.nan
+            plane["q"] = q.reshape(shape[0], shape[1], 3)
+        grid.flush()
+        del grid
+
+        meta = {
+            "resolution": res,
+            "origin": [float(a[0]) for a in axes],
+            "shape": list(shape),
+            "gamma_min": float(q_min[3]),
+            "gamma_max": float(q_max[3]),
+        }
+        with open(os.path.splitext(path)[0] + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+        return cls(path)
+
+    @classmethod
+    def load_or_generate(cls, path=DEFAULT_PATH, **kw):
+        """Abre el mapa; si no existe lo genera (una sola vez, ~segundos)."""
+        if os.path.exists(path) and os.path.exists(os.path.splitext(path)[0] + ".json"):
+            return cls(path)
+        return cls.generate(path, **kw)
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def index(self, p):
+        """Índice (i, j, k) del vóxel de p, o None fuera de la grilla."""
+        i = int(round((p[0] - self.origin[0]) * self._inv))
+        j = int(round((p[1] - self.origin[1]) * self._inv))
+        k = int(round((p[2] - self.origin[2]) * self._inv))
+        if 0 <= i < self.shape[0] and 0 <= j < self.shape[1] and 0 <= k < self.shape[2]:
+            return i, j, k
+        return None
+
+    def reachable(self, p, gamma=0.0):
+        """¿Hay alguna solución para la pose (p, gamma)?"""
+        idx = self.index(p)
+        if idx is None or not (self.gamma_min <= gamma <= self.gamma_max):
+            return False
+        return bool(self._mask[idx])
+
+    def classify(self, p, gamma=0.0):
+        """
+        Aceptación / rechazo rápido lejos del borde: True si el vóxel de p y
+        sus 26 vecinos son alcanzables, False si ninguno lo es (o gamma está
+        fuera de límites), None cerca del borde (decide la IK exacta).
+        """
+        if not (self.gamma_min <= gamma <= self.gamma_max):
+            return False
+        idx = self.index(p)
+        if idx is None:
+            return False
+        i, j, k = idx
+        block = self._mask[max(i - 1, 0):i + 2, max(j - 1, 0):j + 2, max(k - 1, 0):k + 2]
+        if not block.any():
+            return False
+        if block.size == 27 and block.all():
+            return True
+        return None
+
+    def warm_start(self, p, gamma=0.0):
+        """Juntas aproximadas (4,) para la pose, o None si es inalcanzable."""
+        idx = self.index(p)
+        if idx is None or not self._mask[idx]:
+            return None
+        q = np.empty(4)
+        q[0:3] = self._q[idx]
+        q[3] = gamma
+        return q
+
+    def lookup(self, P, gamma=None):
+        """
+        Consulta vectorizada de N posiciones (N, 3).
+
+        Returns
+        -------
+        (ok, q) : (N,) bool y (N, 3) juntas de arranque (NaN si no hay)
+        """
+        P = np.atleast_2d(np.asarray(P, dtype=np.float64))
+        idx = np.rint((P - self.origin) * self._inv).astype(np.int64)
+        inside = np.all((idx >= 0) & (idx < self._shape_arr), axis=1)
+        np.clip(idx, 0, self._shape_arr - 1, out=idx)
+        cells = self.grid[idx[:, 0], idx[:, 1], idx[:, 2]]
+        ok = inside & (cells["mask"] != 0)
+        if gamma is not None:
+            g = np.asarray(gamma)
+            ok &= (g >= self.gamma_min) & (g <= self.gamma_max)
+        q = cells["q"].astype(np.float64)
+        q[~ok] = np.nan
+        return ok, q
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el mapa de alcance del QArm")
+    parser.add_argument("--resolution", type=float, default=0.01, help="lado del vóxel (m)")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    m = ReachabilityMap.generate(args.path, args.resolution)
+    dt = time.perf_counter() - t0
+    n = int(np.prod(m.shape))
+    frac = float(np.count_nonzero(m.grid["mask"])) / n
+    print(f"{args.path}: {m.shape} vóxeles de {args.resolution*100:.1f} cm, "
+          f"{frac*100:.1f}% alcanzables, {os.path.getsize(args.path)/2**20:.1f} MiB, {dt:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
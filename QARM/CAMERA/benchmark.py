@@ -0,0 +1,336 @@
+# ============================================================
+#                 benchmark.py
+# ============================================================
+"""
+Benchmarks del control por seguimiento de la mano.
+
+Uso:
+    python benchmark.py pipeline --video mano.mp4   # serie (test.py original) vs pipeline
+    python benchmark.py replay --video mano.mp4     # frames/s offline y repetibilidad
+    python benchmark.py roi --video mano.mp4        # frame completo vs ROI reducido: FPS y CPU
+    python benchmark.py teleop                      # jitter y latencia: paso por frame vs filtrado
+    python benchmark.py cartesian                   # seguimiento cartesiano: tiempo de IK por período y frame
+    python benchmark.py startup --video mano.mp4    # arranque de test.py: imports y time-to-first-command
+
+teleop y cartesian no usan video: simula la muñeca (movimiento conocido + ruido de
+landmarks) a los FPS de la cámara con latencia de inferencia, así la
+velocidad ideal es conocida y el retardo de cada controlador se puede medir.
+
+Reproduce un video grabado a sus FPS (VideoSource), así el instante de cada
+frame es conocido y la latencia glass-to-motor se mide exacta. El brazo es
+el QArm emulado (Qarm_sim.SimulatedHIL). Requieren cv2 y mediapipe.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import Qarm_startup
+from Qarm_lib import QArm
+from Qarm_sim import SimulatedHIL
+from Qarm_replay import compare, replay
+from Qarm_kinematics import forward
+from Qarm_vision import (HandCartesian, HandDetector, HandJog, HandObservation, HandPipeline, HandTeleop,
+                         StageStats, VideoSource, open_source)
+from Qarm_workspace import ReachabilityMap
+
+
+def _make_arm():
+    return QArm(hardware=0, readMode=0, card=SimulatedHIL())
+
+
+def _serial(args):
+    """Lazo de test.py: leer, inferir y escribir uno detrás del otro."""
+    arm = _make_arm()
+    source = VideoSource(args.video)
+    detector = HandDetector()
+    controller = HandJog()
+    inference = StageStats("inferencia")
+    g2m = StageStats("glass-to-motor")
+    clock = time.perf_counter
+    try:
+        while True:
+            ok, frame, t_glass = source.read()
+            if not ok:
+                break
+            t0 = clock()
+            landmarks, raw = detector(frame)
+            t1 = clock()
+            inference.add(t1 - t0, t1)
+            obs = HandObservation(0, t_glass, t1, landmarks, raw, frame)
+            arm.write_position_fast(controller.update(obs, t1, 1.0 / source.fps))
+            t = clock()
+            g2m.add(t - t_glass, t)
+    finally:
+        detector.close()
+        source.release()
+        arm.terminate()
+    return inference, g2m
+
+
+def bench_pipeline(args):
+    if not args.video:
+        raise SystemExit("pipeline: falta --video")
+
+    inference, g2m = _serial(args)
+    s_inf = inference.summary()
+    s_g2m = g2m.summary()
+    print(f"serie (test.py): {s_g2m['count']} comandos")
+    print(f"  comandos/s               {s_g2m['rate']:10.1f}")
+    print(f"  inferencia               {s_inf['mean']*1e3:10.2f} ms  ({s_inf['rate']:.1f} fps)")
+    print(f"  glass-to-motor           {s_g2m['mean']*1e3:10.2f} ms  "
+          f"p95 {s_g2m['p95']*1e3:.2f} ms")
+
+    arm = _make_arm()
+    source = VideoSource(args.video)
+    detector = HandDetector()
+    pipe = HandPipeline(source, detector, arm.write_position_fast, HandJog(), frequency=args.rate)
+    pipe.start()
+    pipe.wait()
+    pipe.stop()
+    detector.close()
+    source.release()
+    arm.terminate()
+
+    st = pipe.stats()
+    print(f"\npipeline (actuación a {args.rate:.0f} Hz):")
+    print(f"  comandos/s               {st['actuation']['rate']:10.1f}")
+    print(f"  inferencia               {st['inference']['mean']*1e3:10.2f} ms  "
+          f"({st['inference']['rate']:.1f} fps)")
+    print(f"  glass-to-motor           {st['glass_to_motor']['mean']*1e3:10.2f} ms  "
+          f"p95 {st['glass_to_motor']['p95']*1e3:.2f} ms")
+    print()
+    pipe.report()
+
+
+def bench_replay(args):
+    """Reproducción offline lo más rápido posible, dos veces: frames/s y consignas idénticas."""
+    if not args.video:
+        raise SystemExit("replay: falta --video")
+    runs = []
+    for _ in range(2):
+        source = open_source(args.video, realtime=False)
+        detector = HandDetector()
+        try:
+            runs.append(replay(source, detector))
+        finally:
+            detector.close()
+            source.release()
+
+    (a, st), (b, _) = runs
+    inf = st["inference"].summary()
+    c = compare(a, b)
+    print(f"{args.video}: {st['frames']} frames")
+    print(f"  frames/s                 {st['fps']:10.1f}")
+    print(f"  inferencia               {inf['mean']*1e3:10.2f} ms  "
+          f"({inf['mean']*st['frames']/st['wall']*100:.0f}% del tiempo)")
+    print(f"  corridas idénticas       {'sí' if c['first'] is None else 'no, desde el frame %d' % c['first']}")
+
+
+# (nombre, parámetros de HandDetector); la primera es la referencia (test.py)
+ROI_CONFIGS = (
+    ("completo",              {}),
+    ("completo x0.5",         {"full_scale": 0.5}),
+    ("ROI 224",               {"roi": True}),
+    ("ROI 160",               {"roi": True, "roi_size": 160}),
+    ("ROI 160 + lite",        {"roi": True, "roi_size": 160, "model_complexity": 0}),
+)
+
+
+def bench_roi(args):
+    """Inferencia en frame completo vs recorte reducido: FPS, CPU por frame y cambio en las consignas."""
+    if not args.video:
+        raise SystemExit("roi: falta --video")
+    print(f"{'modo':<22}{'frames/s':>10}{'CPU ms/frame':>14}{'CPU %':>8}{'ROI %':>8}{'pérdidas':>10}"
+          f"{'consignas !=':>14}{'dif. máx rad':>14}")
+    base = None
+    for name, kw in ROI_CONFIGS:
+        source = open_source(args.video, realtime=False)
+        detector = HandDetector(**kw)
+        cpu0 = time.process_time()
+        try:
+            commands, st = replay(source, detector)
+        finally:
+            cpu = time.process_time() - cpu0
+            detector.close()
+            source.release()
+        d = detector.stats()
+        if base is None:
+            base = commands
+        c = compare(base, commands, tol=1e-3)
+        print(f"{name:<22}{st['fps']:>10.1f}{cpu/max(st['frames'], 1)*1e3:>14.2f}"
+              f"{cpu/st['wall']*100:>8.0f}{d['roi_ratio']*100:>8.1f}{d['lost']:>10}"
+              f"{c['cmd_changed']:>14}{c['max_diff'][0:4].max():>14.4f}")
+    print("CPU % > 100: MediaPipe usa más de un hilo")
+
+
+def _wrist(t):
+    """Movimiento de prueba de la muñeca (normalizado): entra y sale de las zonas muertas."""
+    x = 0.5 + 0.3 * np.sin(2 * np.pi * 0.25 * t)
+    y = 0.575 + 0.25 * np.sin(2 * np.pi * 0.2 * t + 1.0)
+    return x, y
+
+
+def _synthetic_frames(args, rng):
+    """Observaciones de una mano cerrada: t_glass a los FPS, t_done = t_glass + latencia."""
+    n = int(args.duration * args.fps)
+    obs = []
+    for i in range(n):
+        t = i / args.fps
+        x, y = _wrist(t)
+        lm = np.zeros((21, 3), dtype=np.float32)
+        lm[:, 0] = x
+        lm[:, 1] = y
+        lm[[8, 12, 16, 20], 1] = y + 0.1      # puntas por debajo: mano cerrada
+        lm[:, 0:2] += rng.normal(scale=args.noise, size=(21, 2))
+        obs.append(HandObservation(i, t, t + args.latency, lm, None, None))
+    return obs
+
+
+def _run_controller(controller, frames, rate, duration, per_frame=False):
+    """
+    Lazo de actuación simulado (sin hilos ni reloj): en cada período usa la
+    última observación ya inferida. per_frame=True reproduce test.py: la
+    consigna sólo cambia al llegar un frame (dt = 1 / fps) y se mantiene.
+    """
+    n = int(duration * rate)
+    out = np.empty((n, 5))
+    k = 0
+    obs = None
+    seen = None
+    for i in range(n):
+        now = i / rate
+        while k < len(frames) and frames[k].t_done <= now:
+            obs = frames[k]
+            k += 1
+        if per_frame:
+            if obs is not seen and obs is not None:
+                seen = obs
+                controller.update(obs, now, frames[1].t_glass - frames[0].t_glass)
+        else:
+            controller.update(obs, now, 1.0 / rate)
+        out[i] = controller.cmd
+    return out
+
+
+def bench_teleop(args):
+    """
+    Paso por frame (test.py) vs HandJog vs HandTeleop, sobre la consigna de la base:
+    - acel. RMS / salto máx: suavidad de la consigna a la frecuencia del lazo
+    - jitter: velocidad RMS atribuible al ruido (misma corrida sin ruido restada)
+    - retardo: desplazamiento que mejor alinea la velocidad con la ideal
+      (mapa de HandJog sobre la muñeca real, sin ruido ni latencia), y el error
+      de velocidad que queda con ese desplazamiento
+    """
+    rng = np.random.default_rng(0)
+    frames = _synthetic_frames(args, rng)
+    clean = _synthetic_frames(argparse.Namespace(**{**vars(args), "noise": 0.0}), rng)
+    rate = args.rate
+    t = np.arange(int(args.duration * rate)) / rate
+    ideal = HandJog()
+    v_ideal = np.array([ideal._target(*_wrist(ti))[0] for ti in t])
+
+    print(f"muñeca simulada: {args.fps:.0f} fps, inferencia {args.latency*1e3:.0f} ms, "
+          f"ruido {args.noise:.4f}; lazo a {rate:.0f} Hz, {args.duration:.0f} s")
+    print(f"{'controlador':<26}{'acel. RMS':>11}{'salto máx':>11}{'jitter':>10}{'retardo':>9}{'err. vel':>10}")
+    print(f"{'':<26}{'rad/s^2':>11}{'mrad':>11}{'rad/s':>10}{'ms':>9}{'rad/s':>10}")
+    cases = (
+        ("paso por frame (test.py)", HandJog, True),
+        ("HandJog al lazo",          HandJog, False),
+        ("HandTeleop (filtrado)",    HandTeleop, False),
+    )
+    lags = np.arange(-int(0.2 * rate), int(0.4 * rate))
+    skip = int(0.5 * rate)
+    m = len(t) - 2 * skip
+    for name, make, per_frame in cases:
+        q = _run_controller(make(), frames, rate, args.duration, per_frame)[:, 0]
+        q0 = _run_controller(make(), clean, rate, args.duration, per_frame)[:, 0]
+        v = np.gradient(q, 1.0 / rate)
+        v0 = np.gradient(q0, 1.0 / rate)
+        acc = np.diff(q, 2) * rate ** 2
+        err = [np.sqrt(np.mean((v0[skip + L:skip + L + m] - v_ideal[skip:skip + m]) ** 2)) for L in lags]
+        best = int(np.argmin(err))
+        print(f"{name:<26}{np.sqrt(np.mean(acc ** 2)):>11.2f}{np.abs(np.diff(q)).max()*1e3:>11.2f}"
+              f"{np.sqrt(np.mean((v - v0) ** 2)):>10.4f}{lags[best] / rate * 1e3:>9.0f}{err[best]:>10.4f}")
+
+
+def bench_cartesian(args):
+    """HandCartesian en el lazo simulado: costo de la IK por período y por frame, y seguimiento."""
+    rng = np.random.default_rng(0)
+    frames = _synthetic_frames(args, rng)
+    reach = ReachabilityMap.load_or_generate()
+    rate = args.rate
+    print(f"muñeca simulada: {args.fps:.0f} fps, inferencia {args.latency*1e3:.0f} ms; "
+          f"lazo a {rate:.0f} Hz, {args.duration:.0f} s")
+    print(f"{'IK':<22}{'media us':>10}{'p95 us':>9}{'máx us':>9}{'us/frame':>10}"
+          f"{'caché %':>9}{'salteos':>9}{'rechazos':>10}{'error FK mm':>13}")
+    for name, quantum in (("caché 1 mm", 1e-3), ("caché 0.1 mm", 1e-4), ("sin caché", 0.0)):
+        controller = HandCartesian(reach=reach, ik_quantum=quantum or 1e-9, ik_budget=1.0 / rate / 4)
+        if not quantum:
+            controller.ik = _Uncached(controller.ik)
+        q = _run_controller(controller, frames, rate, args.duration)
+        s = controller.ik_stats.summary()
+        per_frame = s["mean"] * s["count"] / len(frames)
+        info = controller.ik.cache_info()
+        hits = info.hits / max(info.hits + info.misses, 1)
+        # el efector (FK de la consigna) contra el objetivo al final
+        err = np.linalg.norm(forward(q[-1, 0:4])[0] - controller.target) * 1e3
+        print(f"{name:<22}{s['mean']*1e6:>10.1f}{s['p95']*1e6:>9.1f}{s['max']*1e6:>9.1f}"
+              f"{per_frame*1e6:>10.1f}{hits*100:>9.1f}{controller.ik_skipped:>9}"
+              f"{controller.ik_rejected:>10}{err:>13.3f}")
+    p = forward(q[:, 0:4])[0]
+    print(f"recorrido del efector: X {np.ptp(p[:, 0])*100:.1f} cm, Y {np.ptp(p[:, 1])*100:.1f} cm, "
+          f"Z {np.ptp(p[:, 2])*100:.1f} cm; presupuesto {1e6 / rate / 4:.0f} us por período")
+
+
+class _Uncached:
+    """CachedInverse sin caché (cada llamada resuelve), para comparar."""
+
+    def __init__(self, ik):
+        self._ik = ik
+        self.misses = 0
+
+    def __call__(self, p, gamma, phi_prev=None):
+        self.misses += 1
+        self._ik.cache_clear()
+        return self._ik(p, gamma, phi_prev)
+
+    def cache_info(self):
+        return self._ik.cache_info()._replace(hits=0, misses=self.misses)
+
+
+def bench_startup(args):
+    """
+    Arranque de test.py (emulación) en subprocesos, hasta el HOME: desglose
+    de imports (cv2, mediapipe, ...) y time-to-first-command. La fuente es
+    --video o la cámara 0 (no se buscan cámaras).
+    """
+    Qarm_startup.bench("test.py", [args.video or "0"])
+
+
+BENCHMARKS = {
+    "pipeline": bench_pipeline,
+    "replay": bench_replay,
+    "roi": bench_roi,
+    "teleop": bench_teleop,
+    "cartesian": bench_cartesian,
+    "startup": bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del control por visión del QArm")
+    parser.add_argument("bench", choices=sorted(BENCHMARKS))
+    parser.add_argument("--video", help="video grabado con una mano (mp4, avi, ...) o directorio de frames")
+    parser.add_argument("--rate", type=float, default=100.0, help="Hz del lazo de actuación")
+    parser.add_argument("--fps", type=float, default=30.0, help="teleop: FPS de la cámara simulada")
+    parser.add_argument("--latency", type=float, default=0.04, help="teleop: latencia de inferencia (s)")
+    parser.add_argument("--noise", type=float, default=0.004, help="teleop: ruido de landmarks (normalizado)")
+    parser.add_argument("--duration", type=float, default=30.0, help="teleop: duración (s)")
+    args = parser.parse_args()
+    np.set_printoptions(precision=3, suppress=True)
+    BENCHMARKS[args.bench](args)
+
+
+if __name__ == "__main__":
+    main()
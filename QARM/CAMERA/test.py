@@ -1,204 +1,250 @@
-import cv2
-import mediapipe as mp
+import Qarm_startup as startup
+import os
+import sys
+import threading
 import time
-import numpy as np
-from Qarm_lib import QArm
 import tkinter as tk
 from tkinter import ttk
 
-# =======================================================
-#          SELECCIÓN MODO (REAL / SIMULACIÓN)
-# =======================================================
-hw = tk.Tk()
-hw.title("Modo")
-hw.geometry("260x140")
-modo = tk.StringVar(value="0")
+# Modo de control:
+#   "articular"  -> la muñeca mueve base y hombro por velocidad (HandTeleop)
+#   "cartesiano" -> la muñeca mueve el efector en X/Y/Z y las juntas salen
+#                   de la IK con caché (HandCartesian, como Inverse.py)
+# El cartesiano se activa con la casilla del diálogo de modo, con
+# python test.py --cartesiano [fuente] o con QARM_CONTROL=cartesiano.
+MODO_CONTROL = "articular"
 
-ttk.Label(hw, text="¿Robot físico o simulación?").pack(pady=10)
+# Inferencia: con HAND_ROI MediaPipe sólo ve un recorte reducido alrededor
+# de la última mano; el frame completo se usa al perderla.
+HAND_ROI = True
+HAND_ROI_SIZE = 224          # px del recorte
+HAND_FULL_SCALE = 1.0        # escala del frame completo (búsqueda)
+HAND_MODEL_COMPLEXITY = 1    # 0 = modelo lite
 
-def fisico():
-    modo.set("1")
-    hw.destroy()
-
-def sim():
-    modo.set("0")
-    hw.destroy()
-
-ttk.Button(hw, text="Robot Físico", command=fisico).pack(pady=5)
-ttk.Button(hw, text="Simulación", command=sim).pack(pady=5)
-
-hw.mainloop()
-hardware_mode = int(modo.get())
+# Enseñanza por demostración: la tecla g empieza/detiene la grabación de las
+# juntas a la frecuencia de actuación; al detener se simplifica (Qarm_teach)
+# y se guarda como ruta para la GUI de FINAL (copiarla a FINAL/RUTAS/).
+GRABACION = "demostracion.json"
+GRABACION_MAX_S = 600        # segundos preasignados por grabación
 
 
 # =======================================================
-#                 SELECCIÓN DE CÁMARA
+#          CARGA EN SEGUNDO PLANO
 # =======================================================
+# OpenCV, MediaPipe y los bindings de Quanser tardan segundos en cargarse:
+# se importan mientras el usuario elige el modo, junto con la búsqueda de
+# cámaras y el mapa de alcance. Más abajo el import sólo espera lo que falte.
+#
+# Fuente opcional por línea de comandos (no se buscan cámaras):
+#   python test.py 1            -> cámara 1
+#   python test.py mano.mp4     -> video grabado, a su velocidad original
+#   python test.py frames/      -> directorio de imágenes
+# Para procesar un video sin robot y guardar las consignas: Qarm_replay.py
+pre = startup.BackgroundImport("numpy", "cv2", "mediapipe", "Qarm_lib", "Qarm_sim", "Qarm_vision",
+                               "Qarm_teach", "quanser.hardware")
+
+ARGS = sys.argv[1:]
+if "--cartesiano" in ARGS:
+    ARGS.remove("--cartesiano")
+    MODO_CONTROL = "cartesiano"
+MODO_CONTROL = os.environ.get("QARM_CONTROL", MODO_CONTROL)
+if MODO_CONTROL not in ("articular", "cartesiano"):
+    raise SystemExit(f"QARM_CONTROL={MODO_CONTROL!r}: se espera articular o cartesiano")
+
 def detectar_camaras(max_test=6):
+    import cv2
     disponibles = []
     for i in range(max_test):
         cap = cv2.VideoCapture(i)
+        if not cap.isOpened():
+            # los índices no son consecutivos (en Linux cada webcam UVC ocupa
+            # también un nodo de metadatos): se sigue con el siguiente
+            cap.release()
+            continue
         if cap.read()[0]:
             disponibles.append(i)
         cap.release()
     return disponibles
 
-cams = detectar_camaras()
+def cargar_alcance():
+    from Qarm_workspace import ReachabilityMap
+    return ReachabilityMap.load_or_generate()
 
-cam_win = tk.Tk()
-cam_win.title("Seleccionar Cámara")
-cam_win.geometry("300x150")
+camaras = None if ARGS else startup.Background(detectar_camaras, name="búsqueda de cámaras")
+mapa = startup.Background(cargar_alcance, name="mapa de alcance") if MODO_CONTROL == "cartesiano" else None
 
-ttk.Label(cam_win, text="Selecciona la cámara:").pack(pady=10)
 
-cam_var = tk.StringVar(value=str(cams[0] if cams else 0))
+# =======================================================
+#          SELECCIÓN MODO (REAL / SIMULACIÓN)
+# =======================================================
+def elegir_modo():
+    hw = tk.Tk()
+    hw.title("Modo")
+    hw.geometry("260x205")
+    modo = tk.StringVar(value="simulacion")
+    cartesiano = tk.BooleanVar(value=MODO_CONTROL == "cartesiano")
 
-combo = ttk.Combobox(cam_win, textvariable=cam_var, values=[str(c) for c in cams])
-combo.pack(pady=10)
+    ttk.Label(hw, text="¿Robot físico o simulación?").pack(pady=10)
 
-def elegir_cam():
-    cam_win.destroy()
+    def elegir(nombre):
+        global MODO_CONTROL
+        modo.set(nombre)
+        MODO_CONTROL = "cartesiano" if cartesiano.get() else "articular"
+        hw.destroy()
 
-ttk.Button(cam_win, text="Aceptar", command=elegir_cam).pack(pady=10)
+    ttk.Button(hw, text="Robot Físico", command=lambda: elegir("fisico")).pack(pady=5)
+    ttk.Button(hw, text="Simulación", command=lambda: elegir("simulacion")).pack(pady=5)
+    ttk.Button(hw, text="Emulación (sin hardware)", command=lambda: elegir("emulacion")).pack(pady=5)
+    ttk.Checkbutton(hw, text="Seguimiento cartesiano (IK)", variable=cartesiano).pack(pady=5)
 
-cam_win.mainloop()
+    hw.mainloop()
+    return modo.get()
 
-CAM_INDEX = int(cam_var.get())
+hardware_mode = startup.MODOS[startup.ask_mode(elegir_modo)]
+if mapa is None and MODO_CONTROL == "cartesiano":
+    mapa = startup.Background(cargar_alcance, name="mapa de alcance")
+print("Control de la mano:", MODO_CONTROL)
 
 
 # =======================================================
-#                 Inicialización QArm
+#                 SELECCIÓN DE CÁMARA
 # =======================================================
-qarm = QArm(hardware=hardware_mode, readMode=0)
-time.sleep(1)
+if camaras is None:
+    SOURCE = ARGS[0]
+else:
+    cams = camaras.result()
 
-# HOME
-base_pos   = 0.0
-shoulder   = 0.0
-gripper    = 0.1
-joints = [base_pos, shoulder, 0.0, 0.0]
+    cam_win = tk.Tk()
+    cam_win.title("Seleccionar Cámara")
+    cam_win.geometry("300x150")
 
-qarm.write_position(joints, gripper)
-time.sleep(0.5)
+    ttk.Label(cam_win, text="Selecciona la cámara:").pack(pady=10)
 
-# Límites
-BASE_MIN = -1.57     # -90°
-BASE_MAX =  1.57     # +90°
+    cam_var = tk.StringVar(value=str(cams[0] if cams else 0))
 
-SH_MIN = -1       
-SH_MAX = 1       
+    combo = ttk.Combobox(cam_win, textvariable=cam_var, values=[str(c) for c in cams])
+    combo.pack(pady=10)
 
+    def elegir_cam():
+        cam_win.destroy()
 
-# =======================================================
-#                     Mediapipe
-# =======================================================
-mp_hands = mp.solutions.hands
-mp_draw  = mp.solutions.drawing_utils
+    ttk.Button(cam_win, text="Aceptar", command=elegir_cam).pack(pady=10)
+
+    cam_win.mainloop()
 
-hands = mp_hands.Hands(
-    static_image_mode=False,
-    max_num_hands=1,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+    SOURCE = int(cam_var.get())
 
-def is_hand_open(lm):
-    tips  = [8, 12, 16, 20]
-    base  = [6, 10, 14, 18]
-    count = 0
-    for t, b in zip(tips, base):
-        if lm[t].y < lm[b].y:
-            count += 1
-    return count >= 3
+
+# ya cargados en segundo plano (si todavía no terminaron, el import espera)
+import cv2
+import mediapipe as mp
+from Qarm_lib import QArm
+from Qarm_sim import SimulatedHIL
+from Qarm_vision import HandCartesian, HandDetector, HandPipeline, HandTeleop, open_source
+from Qarm_route import save_route
+from Qarm_teach import TeachRecorder
+
+# El modelo de MediaPipe se construye mientras el brazo se inicializa
+modelo = startup.Background(HandDetector, model_complexity=HAND_MODEL_COMPLEXITY, roi=HAND_ROI,
+                            roi_size=HAND_ROI_SIZE, full_scale=HAND_FULL_SCALE, name="modelo de MediaPipe")
 
 
 # =======================================================
-#                     Cámara
+#                 Inicialización QArm
 # =======================================================
-cap = cv2.VideoCapture(CAM_INDEX)
-cap.set(3, 640)
-cap.set(4, 480)
+if hardware_mode == 2:
+    qarm = QArm(hardware=0, readMode=0, card=SimulatedHIL())
+else:
+    qarm = QArm(hardware=hardware_mode, readMode=0)
+time.sleep(1)
+
+# HOME
+if MODO_CONTROL == "cartesiano":
+    controller = HandCartesian(gripper=HandCartesian.GRIPPER_OPEN, reach=mapa.result())
+else:
+    controller = HandTeleop(gripper=HandTeleop.GRIPPER_OPEN)
+qarm.write_position_fast(controller.cmd)
+startup.first_command()
+time.sleep(0.5)
 
 
 # =======================================================
-#                   LOOP PRINCIPAL
+#          Pipeline: captura / inferencia / actuación
 # =======================================================
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+# Cada etapa en su hilo: el brazo recibe consignas a ACTUATION_RATE Hz con
+# las últimas landmarks, sin esperar a la cámara ni a MediaPipe.
+ACTUATION_RATE = 100
+
+# Mientras se graba, cada consigna va seguida de una lectura de las juntas
+# (en el hilo de actuación, a ACTUATION_RATE Hz). El lock cubre el cambio de
+# grabador y cada muestra: al detener, la última muestra ya está escrita y
+# el hilo de actuación no vuelve a tocar ese grabador.
+grabacion = [None]
+grabacion_lock = threading.Lock()
+
+def escribir(cmd):
+    qarm.write_position_fast(cmd)
+    if grabacion[0] is None:
+        return
+    with grabacion_lock:
+        rec = grabacion[0]
+        if rec is not None:
+            qarm.read_std()
+            rec.record(time.perf_counter(), cmd, qarm.measurement)
+
+def alternar_grabacion():
+    with grabacion_lock:
+        rec = grabacion[0]
+        grabacion[0] = TeachRecorder(ACTUATION_RATE * GRABACION_MAX_S) if rec is None else None
+    if rec is None:
+        print("Grabando demostración (g para detener)")
+        return
+    if len(rec) < 2:
+        print("Grabación vacía.")
+        return
+    ruta = rec.route()
+    save_route(GRABACION, ruta)
+    print(f"Demostración: {len(rec)} muestras en {rec.duration:.1f} s -> {len(ruta)} puntos en {GRABACION}")
+
+source = open_source(SOURCE, 640, 480)
+detector = modelo.result()
+pipeline = HandPipeline(source, detector, escribir, controller,
+                        frequency=ACTUATION_RATE)
+pipeline.start()
+
+mp_hands = mp.solutions.hands
+mp_draw  = mp.solutions.drawing_utils
 
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb)
-
-    estado = "NO HAND"
-
-    if results.multi_hand_landmarks:
-        for hand in results.multi_hand_landmarks:
-            lm = hand.landmark
-            mp_draw.draw_landmarks(frame, hand, mp_hands.HAND_CONNECTIONS)
-
-            # Mano abierta = no mueve
-            if is_hand_open(lm):
-                estado = "OPEN"
-                gripper = 0.1
-            else:
-                estado = "CLOSED"
-                gripper = 0.9
-
-                # ==============================
-                #   CONTROL SOLO MANO CERRADA
-                # ==============================
-
-                # ------- IZQUIERDA / DERECHA -------
-                x = lm[0].x
-                if 0.43 <= x <= 0.57:
-                    dx = 0
-                else:
-                    diff = abs(x - 0.5)
-                    dx = diff * 0.04    # velocidad laterales
-
-                if x < 0.43:
-                    base_pos += dx
-                elif x > 0.57:
-                    base_pos -= dx
-
-                base_pos = np.clip(base_pos, BASE_MIN, BASE_MAX)
-
-                # ------- ARRIBA / ABAJO -------
-                y = lm[0].y
-                if 0.50 <= y <= 0.65:
-                    dy = 0
-                else:
-                    diff = abs(y - 0.5)
-                    dy = diff * 0.04
-
-                # Mano arriba → brazo sube
-                if y < 0.50:
-                    shoulder -= dy
-                elif y > 0.65:
-                    shoulder += dy
-
-                shoulder = np.clip(shoulder, SH_MIN, SH_MAX)
-
-    # --------------------------------
-    # Enviar al brazo
-    # --------------------------------
-    joints[0] = base_pos
-    joints[2] = shoulder
-
-    try:
-        qarm.write_position(joints, gripper)
-    except:
-        pass
-
-    cv2.putText(frame, estado, (10, 40),
-                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
-
-    cv2.imshow("Hand Tracker", frame)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
 
-cap.release()
+# =======================================================
+#           LOOP PRINCIPAL (sólo visualización)
+# =======================================================
+shown = 0
+while not pipeline.finished:
+    seq, obs = pipeline.hands.peek()
+    if seq != shown and obs is not None:
+        shown = seq
+        frame = obs.frame
+        if obs.raw is not None:
+            mp_draw.draw_landmarks(frame, obs.raw, mp_hands.HAND_CONNECTIONS)
+        cv2.putText(frame, controller.estado, (10, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
+        if grabacion[0] is not None:
+            cv2.putText(frame, "REC", (10, 80),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
+        cv2.imshow("Hand Tracker", frame)
+
+    tecla = cv2.waitKey(1) & 0xFF
+    if tecla == ord('q'):
+        break
+    if tecla == ord('g'):
+        alternar_grabacion()
+
+pipeline.stop()
+if grabacion[0] is not None:
+    alternar_grabacion()
+pipeline.report()
+print("detector:", detector.stats())
+detector.close()
+source.release()
 cv2.destroyAllWindows()
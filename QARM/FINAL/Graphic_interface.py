@@ -5,20 +5,169 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import numpy as np
-import json
 import time
+from Qarm_trajectory import optimal_cycle_time, fixed_delay_cycle_time
+from Qarm_executor import RouteExecutor
+from Qarm_route import load_route, save_route, to_array, to_list
+from Qarm_teach import TOL_DEG
+from Qarm_telemetry import MinMaxDecimator
+
+
+class TkCoalescer:
+    """
+    Junta pedidos frecuentes (p. ej. los eventos de un slider al arrastrarlo)
+    en una sola llamada a fn por tick de after(), como mucho una cada
+    period_ms. fn lee el estado cuando se ejecuta, así que sólo se procesa
+    el último; el primer pedido después de un rato quieto sale en la próxima
+    vuelta del event loop, sin esperar el período.
+    """
+
+    def __init__(self, widget, fn, period_ms=16):
+        self.widget = widget
+        self.fn = fn
+        self.period = period_ms / 1000.0
+        self.requests = 0
+        self.flushes = 0
+        self._id = None
+        self._last = -float("inf")
+
+    def request(self):
+        self.requests += 1
+        if self._id is None:
+            wait = self._last + self.period - time.perf_counter()
+            self._id = self.widget.after(int(max(0.0, wait) * 1000), self._flush)
+
+    def _flush(self):
+        self._id = None
+        self._last = time.perf_counter()
+        self.flushes += 1
+        self.fn()
+
+
+class TelemetryPlot(ttk.Frame):
+    """
+    Gráfico en vivo de un campo de la telemetría (J1..J4 y gripper) sobre
+    los últimos `window` segundos de un TelemetryRing.
+
+    Se redibuja con un timer (after) cada period_ms, no por muestra: cada
+    redibujo lee del anillo sin locks sólo las muestras nuevas, las suma al
+    mín/máx por píxel (MinMaxDecimator) y mueve las mismas 5 líneas del
+    Canvas (<= 2 puntos por píxel). El dibujo cuesta lo mismo a 500 Hz que
+    a 10 kHz y el lazo de control nunca espera a la GUI.
+    """
+
+    FIELDS = (
+        ("Posición (rad)", "position"),
+        ("Consigna (rad)", "cmd"),
+        ("Velocidad (rad/s)", "speed"),
+        ("Corriente (A)", "current"),
+        ("PWM", "pwm"),
+        ("Temperatura (°C)", "temperature"),
+    )
+    COLORS = ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#7f7f7f")
+
+    def __init__(self, master, ring, window=10.0, width=560, height=260, period_ms=100):
+        super().__init__(master, padding=8)
+        self.ring = ring
+        self.window = float(window)
+        self.width = int(width)
+        self.decimator = MinMaxDecimator(window, width)
+        self.height = int(height)
+        self.period_ms = int(period_ms)
+        self.redraws = 0
+        self.draw_time = 0.0        # s acumulados en redraw()
+        self._after = None
+
+        top = ttk.Frame(self)
+        top.pack(fill="x")
+        self.campo = tk.StringVar(value=self.FIELDS[0][0])
+        ttk.Combobox(top, textvariable=self.campo, values=[f[0] for f in self.FIELDS],
+                     state="readonly", width=20).pack(side="left")
+        for i, color in enumerate(self.COLORS):
+            tk.Label(top, text="G" if i == 4 else f"J{i+1}", fg=color).pack(side="left", padx=(8, 0))
+        self.info = ttk.Label(top, text="", foreground="gray40")
+        self.info.pack(side="right")
+
+        self.canvas = tk.Canvas(self, width=self.width, height=self.height, bg="white",
+                                highlightthickness=1, highlightbackground="gray70")
+        self.canvas.pack(pady=(6, 0))
+        self.lines = [self.canvas.create_line(0, 0, 0, 0, fill=c) for c in self.COLORS]
+        self.y_max = self.canvas.create_text(4, 2, anchor="nw", fill="gray30")
+        self.y_min = self.canvas.create_text(4, self.height - 2, anchor="sw", fill="gray30")
+        self.canvas.create_text(self.width - 4, self.height - 2, anchor="se", fill="gray30",
+                                text=f"últimos {self.window:.0f} s")
+        self._tick()
+
+    def _tick(self):
+        try:
+            if self.winfo_viewable():
+                t0 = time.perf_counter()
+                self.redraw()
+                self.draw_time += time.perf_counter() - t0
+                self.redraws += 1
+        finally:
+            # un error en un redibujo no detiene el gráfico
+            self._after = self.after(self.period_ms, self._tick)
+
+    def redraw(self):
+        x, yy = self.decimator.update(self.ring, dict(self.FIELDS)[self.campo.get()])
+        if len(x) < 4:
+            return
+        finite = yy[np.isfinite(yy)]
+        if finite.size == 0:
+            return
+        lo, hi = float(finite.min()), float(finite.max())
+        pad = max((hi - lo) * 0.05, 1e-3)
+        lo, hi = lo - pad, hi + pad
+        ys = (hi - yy) * ((self.height - 1) / (hi - lo))
+        pts = np.empty(2 * len(x))
+        for k, line in enumerate(self.lines):
+            col = ys[:, k]
+            ok = ~np.isnan(col)
+            m = int(ok.sum())
+            if m < 2:
+                self.canvas.coords(line, 0, 0, 0, 0)
+                continue
+            pts[0:2*m:2] = x[ok]
+            pts[1:2*m:2] = col[ok]
+            self.canvas.coords(line, pts[:2*m].tolist())
+        self.canvas.itemconfig(self.y_max, text=f"{hi:.3g}")
+        self.canvas.itemconfig(self.y_min, text=f"{lo:.3g}")
+        self.info.config(text=f"{len(x)} puntos por curva")
+
+    def destroy(self):
+        if self._after is not None:
+            self.after_cancel(self._after)
+            self._after = None
+        super().destroy()
 
 
 class QArmGUI:
+    # Refresco de los controles manuales: los eventos de los sliders sólo
+    # piden un tick; en cada tick (como mucho uno por frame) se actualizan
+    # las etiquetas y se entrega la última consigna al lazo de control.
+    FRAME_MS = 16
+
+    # Archivos de ruta: JSON (como RUTAS/) o binario columnar para rutas densas (Qarm_route)
+    TIPOS_RUTA = [("JSON", "*.json"), ("Ruta binaria", "*.npy"), ("Ruta binaria comprimida", "*.npz")]
+
     def __init__(self, master, brazo):
         self.master = master
         self.brazo = brazo
+        self.refresco = TkCoalescer(master, self._refrescar_controles, self.FRAME_MS)
+        self._textos = [None] * 4
+        self.ventana_telemetria = None
 
         self.ruta = []
         self.editing_idx = None
         self.tiempo_entre = tk.DoubleVar(value=1.0)
         self.ciclos = tk.IntVar(value=1)
+        self.mezcla = tk.DoubleVar(value=0.0)
+        self.tolerancia = tk.DoubleVar(value=TOL_DEG)
+        self.grabacion = None
         self.emergency_flag = False
+        self.executor = RouteExecutor(brazo)
+        self._t_ruta = 0.0
 
         master.title("Control QArm - Laboratorio ECA")
         master.geometry("980x760")
@@ -38,8 +187,11 @@ class QArmGUI:
             slider_frame = ttk.Frame(control_frame)
             slider_frame.pack(fill="x", pady=6)
 
+            # el rango del slider son los límites de la junta: no se pueden
+            # guardar puntos que el brazo recortaría
+            low, high = self.brazo.JOINT_LIMITS[i]
             slider = ttk.Scale(
-                slider_frame, from_=-170, to=170,
+                slider_frame, from_=low, to=high,
                 orient="horizontal",
                 variable=val, length=260,
                 command=lambda e, i=i: self.slider_step(i)
@@ -81,21 +233,25 @@ class QArmGUI:
         ttk.Button(control_frame, text="Volver a HOME",
                 command=self.volver_home).pack(fill="x", pady=(12, 4))
 
-        # Parada de emergencia
-        tk.Button(
+        # Parada de emergencia (actúa al presionar, no al soltar el botón)
+        estop = tk.Button(
             control_frame,
             text="PARADA DE EMERGENCIA",
             font=("Arial", 16, "bold"),
             fg="white", bg="#cc0000",
             activebackground="#ff0000",
             activeforeground="white",
-            relief="raised", bd=5,
-            command=self.parada_emergencia
-        ).pack(fill="x", padx=10, pady=15, ipadx=10, ipady=10)
+            relief="raised", bd=5
+        )
+        estop.pack(fill="x", padx=10, pady=15, ipadx=10, ipady=10)
+        estop.bind("<ButtonPress-1>", lambda e: self.parada_emergencia())
 
         ttk.Button(control_frame, text="Reiniciar Robot",
                 command=self.reiniciar_robot).pack(fill="x", pady=(0, 4))
 
+        ttk.Button(control_frame, text="Telemetría en vivo",
+                command=self.abrir_telemetria).pack(fill="x", pady=(0, 4))
+
         ttk.Button(control_frame, text="Cerrar conexión y salir",
                 command=self.salir).pack(fill="x")
 
@@ -129,6 +285,16 @@ class QArmGUI:
         ttk.Button(btns_mid, text="Cargar desde archivo",
                 command=self.cargar_archivo).grid(row=0, column=3, padx=6, pady=2)
 
+        ttk.Button(btns_mid, text="Pausar",
+                command=self.pausar_ruta).grid(row=1, column=0, padx=6, pady=2)
+        ttk.Button(btns_mid, text="Reanudar",
+                command=self.reanudar_ruta).grid(row=1, column=1, padx=6, pady=2)
+        ttk.Button(btns_mid, text="Abortar",
+                command=self.abortar_ruta).grid(row=1, column=2, padx=6, pady=2)
+        self.boton_grabar = ttk.Button(btns_mid, text="Grabar demostración",
+                command=self.alternar_grabacion)
+        self.boton_grabar.grid(row=1, column=3, padx=6, pady=2)
+
         # Tiempo y ciclos
         config_frame = ttk.Frame(ruta_frame)
         config_frame.pack(fill="x", pady=(6, 8))
@@ -143,6 +309,16 @@ class QArmGUI:
         ttk.Entry(config_frame, textvariable=self.ciclos, width=6).grid(
             row=0, column=3, padx=6)
 
+        ttk.Label(config_frame, text="Mezcla en puntos de paso (0-1):").grid(
+            row=1, column=0, padx=(12, 4), pady=(6, 0))
+        ttk.Entry(config_frame, textvariable=self.mezcla, width=8).grid(
+            row=1, column=1, padx=6, pady=(6, 0))
+
+        ttk.Label(config_frame, text="Tolerancia grabación (°):").grid(
+            row=1, column=2, padx=(12, 4), pady=(6, 0))
+        ttk.Entry(config_frame, textvariable=self.tolerancia, width=6).grid(
+            row=1, column=3, padx=6, pady=(6, 0))
+
         # Lista de puntos
         ttk.Label(ruta_frame, text="Puntos guardados:").pack(anchor="w", pady=(6, 0))
         self.lista_puntos = tk.Listbox(ruta_frame, height=26, width=70)
@@ -165,14 +341,22 @@ class QArmGUI:
         self.actualizar_slider()
 
     def actualizar_slider(self):
-        for i, v in enumerate(self.sliders):
-            self.labels[i].config(text=f"{v.get():.0f}°")
-        self.actualizar_pos()
-
-    def actualizar_pos(self):
-        angulos = np.array([v.get() for v in self.sliders])
+        self.refresco.request()
+
+    def _refrescar_controles(self):
+        angulos = [v.get() for v in self.sliders]
+        for i, a in enumerate(angulos):
+            texto = f"{a:.0f}°"
+            if texto != self._textos[i]:
+                self._textos[i] = texto
+                self.labels[i].config(text=texto)
+        self.actualizar_pos(angulos)
+
+    def actualizar_pos(self, angulos=None):
+        if angulos is None:
+            angulos = [v.get() for v in self.sliders]
         try:
-            self.brazo.write_position(
+            self.brazo.post_setpoint(
                 np.deg2rad(angulos),
                 np.array([self.gripper_val.get()])
             )
@@ -185,7 +369,7 @@ class QArmGUI:
 
     def volver_home(self):
         try:
-            self.brazo.write_position(self.brazo.HOME_POSE,
+            self.brazo.post_setpoint(self.brazo.HOME_POSE,
                                     np.array([self.gripper_val.get()]))
             for v in self.sliders:
                 v.set(0)
@@ -204,39 +388,62 @@ class QArmGUI:
         self.salida_segura()
 
     def parada_emergencia(self):
-        print(">>> PARADA DE EMERGENCIA <<<")
+        t_press = time.perf_counter()
         self.emergency_flag = True
 
-        g = float(self.gripper_val.get())
-        for _ in range(8):
-            try:
-                self.brazo.write_position(self.brazo.HOME_POSE, np.array([g]))
-            except:
-                pass
-            time.sleep(0.01)
+        # El lazo de control cancela la ruta y envía HOME en el próximo período
+        try:
+            latencia = self.brazo.emergency_stop(t_press)
+        except Exception as e:
+            latencia = None
+            print("Error parada de emergencia:", e)
+
+        print(">>> PARADA DE EMERGENCIA <<<")
+        if latencia is not None:
+            print(f"Primer HOME enviado {latencia*1e3:.2f} ms después del botón.")
 
     def reiniciar_robot(self):
         self.emergency_flag = False
+        self.brazo.reset_emergency()
         messagebox.showinfo("Reinicio", "Robot listo y habilitado.")
 
+    def abrir_telemetria(self):
+        if self.ventana_telemetria is not None:
+            self.ventana_telemetria.lift()
+            return
+        # el lazo graba cada período en un anillo en memoria; la ventana sólo lo lee
+        ring = self.brazo.start_monitor()
+        win = tk.Toplevel(self.master)
+        win.title("Telemetría en vivo")
+        win.resizable(False, False)
+        TelemetryPlot(win, ring).pack()
+
+        def cerrar():
+            self.ventana_telemetria = None
+            win.destroy()
+            self.brazo.stop_monitor()
+
+        win.protocol("WM_DELETE_WINDOW", cerrar)
+        self.ventana_telemetria = win
+
     # ============================================================
     #   GESTIÓN DE RUTA
     # ============================================================
 
-    def guardar_punto(self):
-        punto = {
+    def _punto_actual(self):
+        return {
             "pos": [float(v.get()) for v in self.sliders],
             "gripper": float(self.gripper_val.get()),
             "tiempo": float(self.tiempo_entre.get())
         }
 
+    def guardar_punto(self):
         if self.editing_idx is not None:
-            self.ruta[self.editing_idx] = punto
-            self.editing_idx = None
-        else:
-            self.ruta.append(punto)
+            self.aplicar_edicion()
+            return
 
-        self.actualizar_lista()
+        self.ruta.append(self._punto_actual())
+        self._insertar_filas(len(self.ruta) - 1)
 
     def iniciar_edicion(self):
         sel = self.lista_puntos.curselection()
@@ -259,14 +466,10 @@ class QArmGUI:
         if self.editing_idx is None:
             return
 
-        self.ruta[self.editing_idx] = {
-            "pos": [float(v.get()) for v in self.sliders],
-            "gripper": float(self.gripper_val.get()),
-            "tiempo": float(self.tiempo_entre.get())
-        }
-
+        idx = self.editing_idx
+        self.ruta[idx] = self._punto_actual()
         self.editing_idx = None
-        self.actualizar_lista()
+        self._reemplazar_filas(idx)
 
     def eliminar_punto(self):
         sel = self.lista_puntos.curselection()
@@ -275,48 +478,123 @@ class QArmGUI:
         idx = sel[0] // 2
         del self.ruta[idx]
         self.editing_idx = None
-        self.actualizar_lista()
+        self.lista_puntos.delete(2 * idx, 2 * idx + 1)
 
     def ejecutar_ruta(self):
         if not self.ruta:
             messagebox.showinfo("Ruta", "Ruta vacía.")
             return
+        if self.executor.active:
+            return
 
+        # La ruta se edita como lista de dicts y se convierte a arreglo una
+        # sola vez por ejecución (validación, ejecutor y tiempos de ciclo)
+        ruta = to_array(self.ruta)
         self.emergency_flag = False
         ciclos = max(1, self.ciclos.get())
+        mezcla = min(max(float(self.mezcla.get()), 0.0), 1.0)
+        q_start, _ = self.brazo.command_position()
+        gripper_start = float(self.gripper_val.get())
+
+        # Validación de límites antes de mover (vectorizada): se avisa y la
+        # ruta se ejecuta igual, con las consignas recortadas a los límites
+        # (misma política que Qarm_runner)
+        n_fuera, t_fuera = self.executor.limit_violations(
+            ruta, blend=mezcla, q_start=q_start, gripper_start=gripper_start)
+        if n_fuera:
+            messagebox.showwarning(
+                "Ruta",
+                f"{n_fuera} consignas fuera de los límites articulares "
+                f"(la primera en t={t_fuera:.2f} s). Se recortan a los límites."
+            )
+
+        # Trayectoria tiempo-óptima (MoveJ trapezoidal sincronizado),
+        # muestreada por el lazo de control a su frecuencia. Con mezcla > 0
+        # los puntos intermedios se pasan sin detenerse. La GUI no se bloquea:
+        # el ejecutor corre en su propio hilo y acá sólo se consulta el progreso.
+        self.executor.start(
+            ruta,
+            ciclos=ciclos,
+            blend=mezcla,
+            q_start=q_start,
+            gripper_start=gripper_start
+        )
+        print(
+            f"Tiempo de ciclo: {optimal_cycle_time(ruta, blend=mezcla):.2f} s "
+            f"(retardo fijo: {fixed_delay_cycle_time(ruta):.2f} s)"
+        )
+
+        self._t_ruta = time.perf_counter()
+        self.monitorear_ruta()
+
+    def monitorear_ruta(self):
+        p = self.executor.progress()
+        estado = {
+            RouteExecutor.RUNNING: "Ejecutando",
+            RouteExecutor.PAUSED: "En pausa",
+            RouteExecutor.DONE: "Ruta completa",
+            RouteExecutor.ABORTED: "Ruta cancelada",
+        }.get(p["state"], "")
+        self.status_label.config(
+            text=f"{estado} - ciclo {p['ciclo']}/{self.executor.ciclos}, "
+                 f"punto {p['punto']}/{self.executor.n_points} ({p['fraction']*100:.0f}%)"
+        )
+
+        if self.executor.active:
+            self.master.after(100, self.monitorear_ruta)
+        elif p["state"] == RouteExecutor.DONE:
+            print(f"Ruta completa: {self.executor.ciclos} ciclos en "
+                  f"{time.perf_counter() - self._t_ruta:.2f} s.")
+        else:
+            print("Ruta cancelada.")
 
-        for c in range(ciclos):
-            print(f"--- Ciclo {c+1}/{ciclos} ---")
+    def pausar_ruta(self):
+        self.executor.pause()
 
-            for i in range(len(self.ruta) - 1):
-                if self.emergency_flag:
-                    print("Ruta cancelada.")
-                    return
+    def reanudar_ruta(self):
+        if not self.emergency_flag:
+            self.executor.resume()
 
-                p1 = self.ruta[i+1]
+    def abortar_ruta(self):
+        self.executor.abort()
 
-                p1_deg = p1["pos"]
-                grip = p1["gripper"]
-                delay_s = p1["tiempo"]
+    # Enseñanza por demostración: el lazo graba las juntas medidas y el
+    # gripper en cada período mientras el operador mueve el brazo; al
+    # detener, la grabación se simplifica (Qarm_teach) y sus puntos se
+    # agregan al final de la ruta.
 
-                # Movimiento ANGULAR (MoveJ simple)
-                self.brazo.write_position(
-                    np.deg2rad(np.array(p1_deg)),
-                    np.array([grip])
-                )
+    def alternar_grabacion(self):
+        if self.grabacion is None:
+            self.grabacion = self.brazo.start_recording()
+            self.boton_grabar.config(text="Detener grabación")
+            self.monitorear_grabacion()
+            return
 
-                # delay
-                t0 = time.time()
-                while time.time() - t0 < delay_s:
-                    if self.emergency_flag:
-                        return
-                    try:
-                        self.master.update()
-                    except:
-                        pass
-                    time.sleep(0.01)
+        grabacion = self.brazo.stop_recording()
+        self.grabacion = None
+        self.boton_grabar.config(text="Grabar demostración")
+        if grabacion is None or len(grabacion) < 2:
+            self.status_label.config(text="Grabación vacía.")
+            return
 
-        print("Ruta completa.")
+        puntos = grabacion.route(tol_deg=max(float(self.tolerancia.get()), 0.01))
+        self.ruta.extend(to_list(puntos))
+        self.editing_idx = None
+        self.actualizar_lista()
+        texto = (f"Demostración: {len(grabacion)} muestras en {grabacion.duration:.1f} s "
+                 f"-> {len(puntos)} puntos")
+        if grabacion.dropped:
+            texto += f" (buffer lleno, {grabacion.dropped} muestras sin grabar)"
+        self.status_label.config(text=texto)
+        print(texto)
+
+    def monitorear_grabacion(self):
+        grabacion = self.grabacion
+        if grabacion is None:
+            return
+        self.status_label.config(
+            text=f"Grabando: {len(grabacion)} muestras ({grabacion.duration:.1f} s)")
+        self.master.after(200, self.monitorear_grabacion)
 
     def nueva_ruta(self):
         self.ruta = []
@@ -328,33 +606,56 @@ class QArmGUI:
             return
         file = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON", "*.json")]
+            filetypes=self.TIPOS_RUTA
         )
         if file:
-            with open(file, "w") as f:
-                json.dump(self.ruta, f, indent=4)
+            try:
+                save_route(file, self.ruta)
+            except ValueError as e:
+                messagebox.showerror("Ruta", str(e))
 
     def cargar_archivo(self):
         file = filedialog.askopenfilename(
-            filetypes=[("JSON", "*.json")]
+            filetypes=self.TIPOS_RUTA
         )
         if not file:
             return
-        with open(file, "r") as f:
-            self.ruta = json.load(f)
+        try:
+            self.ruta = load_route(file)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Ruta", str(e))
+            return
 
         self.editing_idx = None
         self.actualizar_lista()
 
+    # La lista muestra dos filas por punto (posición y retardo): el punto i
+    # ocupa las filas 2i y 2i+1. Las ediciones tocan sólo esas filas; la
+    # reconstrucción completa (al cargar) es un único insert.
+
+    @staticmethod
+    def _filas(pos, tiempo):
+        p0, p1, p2, p3 = (int(x) for x in pos)
+        return f"({p0}, {p1}, {p2}, {p3})", f"── delay {tiempo:.1f}s ──"
+
+    def _filas_punto(self, idx):
+        p = self.ruta[idx]
+        return self._filas(p["pos"], p["tiempo"])
+
+    def _insertar_filas(self, idx):
+        self.lista_puntos.insert(2 * idx, *self._filas_punto(idx))
+
+    def _reemplazar_filas(self, idx):
+        self.lista_puntos.delete(2 * idx, 2 * idx + 1)
+        self._insertar_filas(idx)
+
     def actualizar_lista(self):
         self.lista_puntos.delete(0, "end")
-        for i, p in enumerate(self.ruta):
-            texto = (
-                f"({int(p['pos'][0])}, {int(p['pos'][1])}, "
-                f"{int(p['pos'][2])}, {int(p['pos'][3])})"
-            )
-            self.lista_puntos.insert("end", texto)
-            self.lista_puntos.insert("end", f"── delay {p['tiempo']:.1f}s ──")
+        filas = []
+        for p in self.ruta:
+            filas.extend(self._filas(p["pos"], p["tiempo"]))
+        if filas:
+            self.lista_puntos.insert("end", *filas)
 
     def on_listbox_select(self, event):
         sel = self.lista_puntos.curselection()
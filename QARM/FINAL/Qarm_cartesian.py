@@ -0,0 +1,172 @@
+# ============================================================
+#                 Qarm_cartesian.py
+# ============================================================
+"""
+Movimientos cartesianos (MoveL): el efector va en línea recta entre dos
+poses (X, Y, Z, gamma), como las del control por inversa.
+
+Todo se calcula antes de mover, fuera del lazo de tiempo real:
+1. Perfil trapezoidal de s: 0 -> 1 sobre la línea (velocidad/aceleración
+   lineales y del giro gamma).
+2. Muestreo de la línea a la frecuencia del lazo e IK de todas las muestras
+   en un solo lote (Qarm_kinematics), siempre con la misma rama (base y codo)
+   elegida en la primera muestra según la posición actual.
+3. Verificación: alcance y límites en todas las muestras, continuidad
+   (sin saltos de rama) y velocidades articulares. Si la línea pasa cerca de
+   una singularidad y alguna junta excede su velocidad, el perfil se estira
+   en el tiempo en lugar de fallar.
+4. Resultado: SampledTrajectory, que el lazo de control escribe con
+   write_position_fast en cada período como cualquier otra trayectoria.
+
+Si el brazo no está en la pose inicial se antepone un MoveJ hasta ella.
+"""
+
+import numpy as np
+from Qarm_kinematics import candidates, forward
+from Qarm_trajectory import (DEFAULT_AMAX, DEFAULT_VMAX, SampledTrajectory, Trajectory,
+                             _normalized_profiles, trapezoid_batch)
+
+
+# Velocidad y aceleración del efector por defecto
+DEFAULT_VLIN = 0.10     # m/s
+DEFAULT_ALIN = 0.20     # m/s^2
+
+# Salto articular máximo entre muestras consecutivas que se considera
+# continuo (mayor = cambio de rama de la IK)
+MAX_STEP = 0.2          # rad
+
+
+class MoveLError(ValueError):
+    """La línea no se puede ejecutar; `index` es la primera muestra con problemas."""
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def _line_profile(length, dgamma, vlin, alin, vmax, amax, scale):
+    # dos "ejes": distancia sobre la línea y giro de la muñeca
+    dq = np.array([[length, dgamma]])
+    T, ta, v = _normalized_profiles(
+        dq, np.array([vlin, vmax[3]]) / scale, np.array([alin, amax[3]]) / scale ** 2
+    )
+    return T[0], ta[0], v[0]
+
+
+def line_samples(p_start, gamma_start, p_end, gamma_end, rate=500,
+                 vlin=DEFAULT_VLIN, alin=DEFAULT_ALIN, vmax=DEFAULT_VMAX, amax=DEFAULT_AMAX,
+                 scale=1.0):
+    """
+    Poses cartesianas de la línea muestreadas a `rate` Hz.
+
+    Returns
+    -------
+    (P, G) : (M, 3) posiciones y (M,) gamma
+    """
+    p0 = np.asarray(p_start, dtype=np.float64).reshape(3)
+    p1 = np.asarray(p_end, dtype=np.float64).reshape(3)
+    d = p1 - p0
+    dg = float(gamma_end) - float(gamma_start)
+    T, ta, v = _line_profile(np.linalg.norm(d), dg, vlin, alin, vmax, amax, scale)
+
+    t = np.arange(0.0, T + 0.5 / rate, 1.0 / rate)
+    s = trapezoid_batch(t, T, ta, v)[0]
+    if len(s):
+        s[-1] = 1.0
+    return p0 + s[:, None] * d, gamma_start + s * dg
+
+
+def solve_line(P, G, q_ref, q_min=None, q_max=None):
+    """
+    IK por lotes de las muestras de la línea con una única rama.
+
+    Returns
+    -------
+    q : (M, 4) consignas articulares
+
+    Raises
+    ------
+    MoveLError si alguna muestra es inalcanzable, sale de [q_min, q_max]
+    o hay un salto de rama.
+    """
+    phi, geometric, in_limits = candidates(P, G)
+    if q_min is not None:
+        in_limits = in_limits & np.all((phi >= q_min) & (phi <= q_max), axis=2)
+
+    # rama: la solución válida de la primera muestra más cercana a q_ref
+    dist = np.sum((phi[0, :, 0:3] - np.asarray(q_ref)[0:3]) ** 2, axis=1)
+    dist[~in_limits[0]] = np.inf
+    k = int(np.argmin(dist))
+    if not np.isfinite(dist[k]):
+        raise MoveLError("la pose inicial es inalcanzable", 0)
+
+    bad = np.flatnonzero(~in_limits[:, k])
+    if bad.size:
+        i = int(bad[0])
+        why = "fuera del alcance" if not geometric[i, k] else "fuera de límites articulares"
+        raise MoveLError(f"muestra {i} de {len(P)} {why}: {P[i]}", i)
+
+    q = phi[:, k]
+    if len(q) > 1:
+        step = np.abs(np.diff(q, axis=0)).max(axis=1)
+        jump = np.flatnonzero(step > MAX_STEP)
+        if jump.size:
+            i = int(jump[0]) + 1
+            raise MoveLError(f"discontinuidad en la muestra {i} (cambio de rama de la IK)", i)
+    return q
+
+
+def movel(p_start, gamma_start, p_end, gamma_end, q_start, gripper=0.5, rate=500,
+          vlin=DEFAULT_VLIN, alin=DEFAULT_ALIN, vmax=DEFAULT_VMAX, amax=DEFAULT_AMAX,
+          q_min=None, q_max=None, approach_tol=1e-3):
+    """
+    Arma un MoveL de (p_start, gamma_start) a (p_end, gamma_end).
+
+    Parameters
+    ----------
+    q_start : (4,) posición articular actual (rad); elige la rama de la IK
+        y, si no coincide con la pose inicial, se agrega un MoveJ previo.
+    gripper : valor fijo del gripper durante el movimiento.
+    q_min, q_max : límites articulares adicionales (p. ej. los de QArmWrapper).
+
+    Returns
+    -------
+    SampledTrajectory con uno o dos tramos (aproximación + línea).
+    """
+    q_start = np.asarray(q_start, dtype=np.float64).reshape(4)
+    scale = 1.0
+    for _ in range(4):
+        P, G = line_samples(p_start, gamma_start, p_end, gamma_end, rate,
+                            vlin, alin, vmax, amax, scale)
+        q = solve_line(P, G, q_start, q_min, q_max)
+        if len(q) < 2:
+            break
+        # velocidades articulares: cerca de singularidades la línea puede
+        # pedir más de lo que da una junta; se estira el perfil
+        ratio = (np.abs(np.diff(q, axis=0)) * rate / vmax).max()
+        if ratio <= 1.0:
+            break
+        scale *= ratio * 1.05
+    else:
+        raise MoveLError("la línea exige velocidades articulares fuera de límites")
+
+    starts = [0]
+    if np.abs(q[0] - q_start).max() > approach_tol:
+        # MoveJ hasta el inicio de la línea, muestreado a la misma frecuencia
+        approach = Trajectory(q_start, gripper)
+        approach.add_move(q[0], gripper, vmax, amax)
+        qa = approach.sample_batch(approach.time_grid(rate))[0]
+        starts.append(len(qa) - 1)
+        q = np.concatenate([qa[:-1], q])
+
+    return SampledTrajectory(q, gripper, rate, segment_starts=starts)
+
+
+def path_deviation(q, p_start, p_end):
+    """Distancia máxima (m) del efector, con juntas q (M, 4), a la recta p_start-p_end."""
+    p, _ = forward(q)
+    a = np.asarray(p_start, dtype=np.float64)
+    d = np.asarray(p_end, dtype=np.float64) - a
+    L2 = float(d @ d)
+    s = np.clip((p - a) @ d / L2, 0.0, 1.0) if L2 > 0 else np.zeros(len(p))
+    return float(np.linalg.norm(p - (a + s[:, None] * d), axis=1).max())
@@ -2,14 +2,321 @@
 #                 Qarm_controller.py
 # ============================================================
 
+import threading
+import time
 import numpy as np
 import Qarm_lib as q
+from Qarm_cartesian import movel
+from Qarm_kinematics import forward
+from Qarm_sim import SimulatedHIL
+from Qarm_stream import BufferedStream
+from Qarm_teach import TeachRecorder
+from Qarm_telemetry import TelemetryLogger, TelemetryRing
+from Qarm_trajectory import check_limits
+
+
+class ControlLoop:
+    """
+    Lazo de control de tiempo real a frecuencia fija, en su propio hilo.
+
+    - Planificación por deadline (no acumula deriva: next += period)
+    - Slot de consigna sin locks: post() reemplaza un arreglo que no se
+      vuelve a modificar, el hilo del lazo sólo lee la referencia más reciente
+    - Trayectorias: run_trajectory() hace que el lazo muestree la trayectoria
+      en cada período (consignas densas a la frecuencia del lazo)
+    - Escala de tiempo de la trayectoria (pausa/reanudación suaves)
+    - Parada de emergencia atendida en el próximo período, con su latencia medida
+    - Telemetría opcional: lectura y registro de cada período (attach_telemetry)
+    - Estadísticas: período medio logrado, jitter y cantidad de overruns
+    """
+
+    # Tiempo en que la escala de tiempo va de 1 a 0 (o de 0 a 1) al pausar/reanudar
+    PAUSE_RAMP = 1.0
+
+    def __init__(self, write_fn, frequency=500, spin=0.0002):
+        """
+        Parameters
+        ----------
+        write_fn : callable(cmd)
+            Función que envía la consigna [j0..j3, gripper] al brazo
+            (una vez por período), p. ej. QArm.write_position_fast.
+        frequency : float
+            Frecuencia del lazo en Hz.
+        spin : float
+            Últimos segundos antes del deadline que se esperan activamente
+            en lugar de dormir (reduce jitter a costa de CPU).
+        """
+        self.write_fn = write_fn
+        self.frequency = float(frequency)
+        self.period = 1.0 / self.frequency
+        self.spin = float(spin)
+
+        self._setpoint = None
+        self._trajectory = None
+        self._traj_cmd = np.zeros(5, dtype=np.float64)
+        self._time_scale_target = 1.0
+        self._time_scale = 1.0
+        self._traj_time = 0.0
+        self._estop_request = None
+        self.estop_latency = None
+        self._telemetry = None
+        self._running = False
+        self._thread = None
+        self.reset_stats()
+
+    # -------------------------
+    # Consignas
+    # -------------------------
+    def post(self, pos_rad, gripper):
+        """
+        Publica la última consigna (la asignación de referencia es atómica).
+        Cada consigna es un arreglo nuevo que no se modifica después de publicado.
+        """
+        cmd = np.empty(5, dtype=np.float64)
+        cmd[0:4] = pos_rad
+        cmd[4] = gripper
+        self._cancel_trajectory()
+        self._setpoint = cmd
+
+    def run_trajectory(self, traj):
+        """
+        Ejecuta una Trajectory (Qarm_trajectory) muestreándola en el hilo del
+        lazo. Devuelve un threading.Event que se activa al terminar o cancelarse.
+        Al terminar, el último punto queda como consigna fija.
+        """
+        done = threading.Event()
+        traj.prepare()
+        self._cancel_trajectory()
+        self._time_scale_target = 1.0
+        self._trajectory = (traj, done)
+        return done
+
+    def set_time_scale(self, target):
+        """
+        Escala de tiempo de la trayectoria en curso (1 = normal, 0 = pausa).
+        El lazo la lleva al valor pedido en rampa (PAUSE_RAMP), así que la
+        pausa desacelera sobre el mismo camino en lugar de frenar en seco.
+        """
+        self._time_scale_target = min(max(float(target), 0.0), 1.0)
+
+    @property
+    def time_scale(self):
+        return self._time_scale
+
+    @property
+    def trajectory_time(self):
+        """Tiempo transcurrido dentro de la trayectoria actual (s, escalado)."""
+        return self._traj_time
+
+    def hold(self):
+        """Cancela la trayectoria y mantiene la última consigna enviada."""
+        if self._trajectory is not None:
+            self.post(self._traj_cmd[0:4], self._traj_cmd[4])
+
+    def emergency(self, pos_rad, gripper, t_press=None):
+        """
+        Pide una parada de emergencia: el próximo período cancela cualquier
+        trayectoria y escribe pos_rad (HOME). Devuelve un Event que se activa
+        cuando esa primera consigna fue enviada; la latencia desde t_press
+        (time.perf_counter) queda en estop_latency.
+        """
+        cmd = np.empty(5, dtype=np.float64)
+        cmd[0:4] = pos_rad
+        cmd[4] = gripper
+        issued = threading.Event()
+        self.estop_latency = None
+        self._estop_request = (cmd, time.perf_counter() if t_press is None else t_press, issued)
+        return issued
+
+    def attach_telemetry(self, read_fn, record_fn, measurement):
+        """
+        Después de cada escritura el lazo llama read_fn() y luego
+        record_fn(t, consigna, measurement) (p. ej. QArm.read_std y
+        TelemetryLogger.record). None en read_fn desactiva la telemetría.
+        """
+        if read_fn is None:
+            self._telemetry = None
+        else:
+            self._telemetry = (read_fn, record_fn, measurement)
+
+    def _cancel_trajectory(self):
+        tr = self._trajectory
+        self._trajectory = None
+        if tr is not None:
+            tr[1].set()
+
+    @property
+    def trajectory_active(self):
+        return self._trajectory is not None
+
+    @property
+    def setpoint(self):
+        return self._setpoint
+
+    @property
+    def last_command(self):
+        """Última consigna [j0..j3, gripper] (de la trayectoria en curso o fija)."""
+        if self._trajectory is not None:
+            return self._traj_cmd
+        return self._setpoint
+
+    @property
+    def running(self):
+        return self._running
+
+    # -------------------------
+    # Arranque / parada
+    # -------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="QArmControlLoop", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self.stats()
+
+    # -------------------------
+    # Estadísticas
+    # -------------------------
+    def reset_stats(self):
+        self._cycles = 0
+        self._period_mean = 0.0
+        self._period_m2 = 0.0
+        self._jitter_max = 0.0
+        self._overruns = 0
+
+    def stats(self):
+        """
+        Devuelve un dict con:
+            cycles, period_mean, jitter_std, jitter_max (s) y overruns.
+        """
+        n = self._cycles
+        return {
+            "cycles":       n,
+            "period_mean":  self._period_mean,
+            "jitter_std":   (self._period_m2 / (n - 1)) ** 0.5 if n > 1 else 0.0,
+            "jitter_max":   self._jitter_max,
+            "overruns":     self._overruns,
+        }
+
+    def _record(self, dt):
+        # Welford: media y varianza del período sin guardar historial
+        self._cycles += 1
+        delta = dt - self._period_mean
+        self._period_mean += delta / self._cycles
+        self._period_m2 += delta * (dt - self._period_mean)
+        self._jitter_max = max(self._jitter_max, abs(dt - self.period))
+
+    # -------------------------
+    # Hilo del lazo
+    # -------------------------
+    def _run(self):
+        clock = time.perf_counter
+        period = self.period
+        spin = self.spin
+
+        deadline = clock() + period
+        last = None
+        current_tr = None
+        cmd = self._traj_cmd
+        ramp_step = period / self.PAUSE_RAMP
+
+        while self._running:
+            remaining = deadline - clock()
+            if remaining > spin:
+                time.sleep(remaining - spin)
+            while clock() < deadline:
+                pass
+
+            now = clock()
+            if last is not None:
+                self._record(now - last)
+            last = now
+
+            estop = self._estop_request
+            if estop is not None:
+                # Emergencia: tiene prioridad sobre todo lo demás
+                self._estop_request = None
+                self._cancel_trajectory()
+                self._setpoint = estop[0]
+                try:
+                    self.write_fn(estop[0])
+                except Exception as e:
+                    print("ControlLoop emergency write error:", e)
+                self.estop_latency = clock() - estop[1]
+                estop[2].set()
+                deadline += period
+                continue
+
+            tr = self._trajectory
+            if tr is not None:
+                if tr is not current_tr:
+                    current_tr = tr
+                    self._traj_time = 0.0
+                    self._time_scale = self._time_scale_target
+                else:
+                    # escala de tiempo en rampa hacia el objetivo
+                    scale = self._time_scale
+                    target = self._time_scale_target
+                    if scale < target:
+                        scale = min(target, scale + ramp_step)
+                    elif scale > target:
+                        scale = max(target, scale - ramp_step)
+                    self._time_scale = scale
+                    self._traj_time += period * scale
+                traj, done = tr
+                t = self._traj_time
+                try:
+                    traj.sample_into(t, cmd)
+                    self.write_fn(cmd)
+                except Exception as e:
+                    print("ControlLoop trajectory error:", e)
+                    self._cancel_trajectory()
+                    deadline += period
+                    continue
+                if t >= traj.duration_total:
+                    # fin: el último punto queda como consigna fija
+                    self._setpoint = cmd.copy()
+                    if self._trajectory is tr:
+                        self._trajectory = None
+                    done.set()
+                written = cmd
+            else:
+                sp = self._setpoint
+                if sp is not None:
+                    try:
+                        self.write_fn(sp)
+                    except Exception as e:
+                        print("ControlLoop write error:", e)
+                written = sp
+
+            tel = self._telemetry
+            if tel is not None:
+                try:
+                    tel[0]()
+                    tel[1](now, written, tel[2])
+                except Exception as e:
+                    print("ControlLoop telemetry error:", e)
+
+            deadline += period
+            if clock() > deadline:
+                # Overrun: se descartan los deadlines perdidos en vez de
+                # ejecutar ráfagas para "alcanzar" el reloj
+                self._overruns += 1
+                deadline = clock() + period
+
 
 class QArmWrapper:
     """
     Envoltura del QArm para simplificar:
     - límites
-    - manejo de simulación
+    - manejo de simulación (QLabs o emulación en proceso, sin hardware)
     - normalización del gripper
     - envío de posiciones en radianes
     """
@@ -23,35 +330,38 @@ class QArmWrapper:
         (-180, 180)   # J4
     ]
 
+    # Límites precalculados en radianes (vectores para np.clip)
+    JOINT_LIMITS_MIN_RAD = np.deg2rad([low for low, _ in JOINT_LIMITS])
+    JOINT_LIMITS_MAX_RAD = np.deg2rad([high for _, high in JOINT_LIMITS])
+
     def __init__(self, modo="simulacion"):
         self.modo = modo
         self.emergency = False
         self.brazo = None
+        self.loop = None
+        self.stream = None
+        self.telemetry = None
+        self.monitor = None
+        self.recorder = None
 
         if modo == "simulacion":
             print("Modo simulación activado (QLabs)")
             self.brazo = q.QArm(hardware=0, readMode=0)
+        elif modo == "emulacion":
+            print("Modo emulación activado (QArm simulado en proceso)")
+            self.brazo = q.QArm(hardware=0, readMode=0, card=SimulatedHIL())
         else:
             print("Modo físico activado")
             self.brazo = q.QArm(hardware=1, readMode=0)  # hardware real
 
-    def write_position(self, pos_rad, gripper_val):
-        pos_deg = np.rad2deg(pos_rad)
-        for i, (low, high) in enumerate(self.JOINT_LIMITS):
-            pos_deg[i] = np.clip(pos_deg[i], low, high)
-        pos_rad_clip = np.deg2rad(pos_deg)
+        # El QArm recorta juntas y gripper en un solo paso vectorizado
+        self.brazo.cmdMin[0:4] = self.JOINT_LIMITS_MIN_RAD
+        self.brazo.cmdMax[0:4] = self.JOINT_LIMITS_MAX_RAD
+        self._cmd = np.zeros(5, dtype=np.float64)
 
-        if isinstance(gripper_val, (list, np.ndarray)):
-            g = float(gripper_val[0])
-        else:
-            g = float(gripper_val)
-        g = np.clip(g, 0.1, 0.9)
-
-        self.brazo.write_position(pos_rad_clip, g)
-
-    def read_std(self):
-        self.brazo.read_std()
-        return {
+        # Diccionario de mediciones armado una sola vez: sus valores son
+        # vistas que read_std() actualiza in-place.
+        self._meas = {
             "current":      self.brazo.measJointCurrent,
             "position":     self.brazo.measJointPosition,
             "pwm":          self.brazo.measJointPWM,
@@ -59,6 +369,230 @@ class QArmWrapper:
             "temperature":  self.brazo.measJointTemperature
         }
 
+    @staticmethod
+    def _gripper(gripper_val):
+        if isinstance(gripper_val, (list, np.ndarray)):
+            return float(gripper_val[0])
+        return float(gripper_val)
+
+    @classmethod
+    def check_limits(cls, q_batch):
+        """
+        Verifica un lote de posiciones (M, 4) en rad contra JOINT_LIMITS.
+        Devuelve (máscara de muestras fuera de límites, índice de la primera o None).
+        """
+        return check_limits(q_batch, cls.JOINT_LIMITS_MIN_RAD, cls.JOINT_LIMITS_MAX_RAD)
+
+    def write_position(self, pos_rad, gripper_val):
+        cmd = self._cmd
+        cmd[0:4] = pos_rad
+        cmd[4] = self._gripper(gripper_val)
+        self.brazo.write_position_fast(cmd)
+
+    def write_command(self, cmd):
+        """Camino rápido: cmd es un buffer float64 (5,) = [j0..j3 (rad), gripper]."""
+        self.brazo.write_position_fast(cmd)
+
+    # -------------------------
+    # Lazo de control
+    # -------------------------
+    def start_loop(self, frequency=500):
+        """Arranca el lazo de tiempo real; desde ahora la GUI sólo publica consignas."""
+        if self.loop is None:
+            self.loop = ControlLoop(self.brazo.write_position_fast, frequency)
+        self.loop.start()
+
+    def stop_loop(self):
+        if self.loop is None:
+            return None
+        stats = self.loop.stop()
+        self.loop = None
+        return stats
+
+    def run_trajectory(self, traj):
+        """Ejecuta una Trajectory en el lazo de control (lo arranca si hace falta)."""
+        if self.loop is None or not self.loop.running:
+            self.start_loop()
+        return self.loop.run_trajectory(traj)
+
+    def movel(self, p_end, gamma_end, p_start=None, gamma_start=None, gripper_val=None, **kw):
+        """
+        Movimiento en línea recta del efector hasta (p_end, gamma_end).
+        Por defecto arranca en la pose de la consigna actual. La IK de toda
+        la línea y sus verificaciones se hacen acá, antes de mover; kw se
+        pasa a Qarm_cartesian.movel (vlin, alin, ...).
+
+        Devuelve (Event de fin, SampledTrajectory). Lanza MoveLError si la
+        línea no es ejecutable.
+        """
+        if self.loop is None or not self.loop.running:
+            self.start_loop()
+        q_now, g_now = self.command_position()
+        if p_start is None:
+            p_start = forward(q_now)[0]
+        if gamma_start is None:
+            gamma_start = q_now[3]
+        g = g_now if gripper_val is None else self._gripper(gripper_val)
+
+        traj = movel(p_start, gamma_start, p_end, gamma_end, q_now, g,
+                     rate=self.loop.frequency,
+                     q_min=self.JOINT_LIMITS_MIN_RAD, q_max=self.JOINT_LIMITS_MAX_RAD, **kw)
+        return self.loop.run_trajectory(traj), traj
+
+    def stream_trajectory(self, traj, frequency=None, block=50):
+        """
+        Ejecuta una Trajectory con streaming en la tarjeta (writer task en
+        Clock.HARDWARE_CLOCK_0): las consignas se envían por bloques y las
+        aplica el reloj de la tarjeta. Bloquea hasta terminar y devuelve las
+        estadísticas de BufferedStream; si el hilo que alimenta la tarjeta
+        falla, su error se relanza acá (el brazo queda en la posición medida).
+
+        Mientras dura se suspende el lazo de control (dos escritores sobre
+        los mismos canales); al terminar se reanuda con el último punto como
+        consigna fija.
+        """
+        loop = self.loop
+        was_running = loop is not None and loop.running
+        rate = frequency or (loop.frequency if loop is not None else 500)
+        if was_running:
+            loop.hold()
+            loop.stop()
+
+        stream = self.stream = BufferedStream(self.brazo, rate, block=block)
+        try:
+            stats = stream.play(traj)
+        finally:
+            self.stream = None
+            if was_running:
+                if self.emergency:
+                    loop.post(self.HOME_POSE, self.brazo.measJointPosition[4])
+                elif stream.error is not None:
+                    # trayectoria incompleta: no saltar al último punto
+                    meas = self.read_std()["position"]
+                    loop.post(meas[0:4].copy(), meas[4])
+                else:
+                    loop.post(traj.q_end, traj.gripper_end)
+                loop.start()
+        if stream.error is not None:
+            raise stream.error
+        return stats
+
+    def start_telemetry(self, directory, **kw):
+        """
+        Registra cada período del lazo (consigna y mediciones) en `directory`
+        con un TelemetryLogger; kw se pasa al logger. Arranca el lazo si hace falta.
+        """
+        if self.loop is None or not self.loop.running:
+            self.start_loop()
+        self.stop_telemetry()
+        # con el monitor en vivo activo el logger vuelca su mismo anillo
+        self.telemetry = TelemetryLogger(directory, self.loop.frequency, ring=self.monitor, **kw)
+        self.telemetry.start()
+        self._attach_recorders()
+        return self.telemetry
+
+    def stop_telemetry(self):
+        logger = self.telemetry
+        if logger is None:
+            return None
+        self.telemetry = None
+        self._attach_recorders()
+        logger.stop()
+        return logger
+
+    def start_monitor(self, seconds=20.0):
+        """
+        Graba cada período del lazo en un TelemetryRing en memoria (sin
+        disco) para verlo en vivo (TelemetryPlot). Si ya hay un logger se usa
+        su anillo. Devuelve el anillo; los lectores no bloquean al lazo.
+        """
+        if self.loop is None or not self.loop.running:
+            self.start_loop()
+        if self.telemetry is not None:
+            return self.telemetry.ring
+        if self.monitor is None:
+            self.monitor = TelemetryRing(int(self.loop.frequency * seconds))
+            self._attach_recorders()
+        return self.monitor
+
+    def stop_monitor(self):
+        if self.monitor is not None:
+            self.monitor = None
+            self._attach_recorders()
+
+    def start_recording(self, seconds=600.0):
+        """
+        Graba la demostración: en cada período del lazo las juntas medidas y
+        el gripper en un TeachRecorder preasignado para `seconds` segundos
+        (sin asignar memoria mientras graba). Convive con la telemetría y el
+        monitor. Devuelve el grabador; stop_recording() lo desconecta.
+        """
+        if self.loop is None or not self.loop.running:
+            self.start_loop()
+        self.recorder = TeachRecorder(int(self.loop.frequency * seconds))
+        self._attach_recorders()
+        return self.recorder
+
+    def stop_recording(self):
+        recorder = self.recorder
+        if recorder is not None:
+            self.recorder = None
+            self._attach_recorders()
+        return recorder
+
+    def _attach_recorders(self):
+        """
+        Conecta al lazo lo que graba cada período: el logger (que ya vuelca
+        el anillo del monitor si lo hay) o el monitor, y el grabador de
+        demostraciones. Con más de uno se leen las mediciones una sola vez.
+        """
+        if self.loop is None:
+            return
+        first = self.telemetry if self.telemetry is not None else self.monitor
+        sinks = [s.record for s in (first, self.recorder) if s is not None]
+        if not sinks:
+            self.loop.attach_telemetry(None, None, None)
+        elif len(sinks) == 1:
+            self.loop.attach_telemetry(self.brazo.read_std, sinks[0], self.brazo.measurement)
+        else:
+            def record_all(t, cmd, measurement, sinks=tuple(sinks)):
+                for record in sinks:
+                    record(t, cmd, measurement)
+            self.loop.attach_telemetry(self.brazo.read_std, record_all, self.brazo.measurement)
+
+    def command_position(self):
+        """
+        Última consigna articular enviada (rad, 4) y gripper.
+        Sin lazo o sin consignas todavía, se usa la posición medida.
+        """
+        sp = self.loop.last_command if self.loop is not None else None
+        if sp is not None:
+            return sp[0:4].copy(), float(sp[4])
+        meas = self.read_std()["position"]
+        return meas[0:4].copy(), float(meas[4])
+
+    def post_setpoint(self, pos_rad, gripper_val):
+        """
+        Publica una consigna para el lazo de control.
+        Sin lazo activo se escribe directamente (comportamiento anterior).
+        """
+        if self.loop is not None and self.loop.running:
+            # el recorte a límites lo hace write_position_fast en el hilo del lazo
+            self.loop.post(pos_rad, self._gripper(gripper_val))
+        else:
+            self.write_position(pos_rad, gripper_val)
+
+    def read_std(self):
+        """
+        Lee el brazo y devuelve el dict de mediciones (siempre el mismo objeto,
+        actualizado in-place). Usar snapshot() si se necesita una copia estable.
+        """
+        self.brazo.read_std()
+        return self._meas
+
+    def snapshot(self):
+        return self.brazo.snapshot()
+
     @property
     def measJointPosition(self):
         return self.brazo.measJointPosition
@@ -80,12 +614,48 @@ class QArmWrapper:
         return self.brazo.measJointTemperature
 
     def terminate(self):
+        self.stop_recording()
+        self.stop_monitor()
+        logger = self.stop_telemetry()
+        if logger is not None:
+            print(f"Telemetría: {logger.tail} muestras en {logger.directory} "
+                  f"({logger.chunks} chunks, {logger.dropped} perdidas)")
+        stats = self.stop_loop()
+        if stats is not None:
+            print(
+                f"Lazo de control: {stats['cycles']} ciclos, "
+                f"período medio {stats['period_mean']*1e3:.3f} ms, "
+                f"jitter {stats['jitter_std']*1e6:.1f} us (máx {stats['jitter_max']*1e6:.1f} us), "
+                f"overruns {stats['overruns']}"
+            )
         self.brazo.terminate()
 
-    def emergency_stop(self):
+    def emergency_stop(self, t_press=None):
+        """
+        Parada de emergencia: HOME inmediato.
+        Con el lazo activo la atiende el próximo período y devuelve la
+        latencia (s) desde t_press (time.perf_counter del botón) hasta el
+        primer HOME enviado; sin lazo usa stop_immediate y devuelve None.
+        """
+        if t_press is None:
+            t_press = time.perf_counter()
         self.emergency = True
-        if self.brazo is not None:
+        stream = self.stream
+        if stream is not None:
+            # streaming en curso (lazo suspendido): se descarta el buffer de
+            # la tarjeta y se escribe HOME directamente
+            stream.abort()
+            self.write_position(self.HOME_POSE, self.brazo.measJointPosition[4])
+            return time.perf_counter() - t_press
+        if self.loop is not None and self.loop.running:
+            sp = self.loop.last_command
+            g = sp[4] if sp is not None else 0.5
+            issued = self.loop.emergency(self.HOME_POSE, g, t_press)
+            issued.wait(0.1)
+            return self.loop.estop_latency
+        elif self.brazo is not None:
             self.brazo.stop_immediate()
+        return None
 
     def reset_emergency(self):
         self.emergency = False
@@ -0,0 +1,169 @@
+# ============================================================
+#                 Qarm_executor.py
+# ============================================================
+"""
+Ejecutor de rutas no bloqueante.
+
+La trayectoria la muestrea el hilo del lazo de control (ControlLoop); este
+ejecutor sólo la arma, la entrega al lazo y la supervisa desde un hilo
+propio, así que la GUI nunca se bloquea esperando que termine una ruta.
+
+- start / pause / resume / abort
+- limit_violations(): consignas fuera de JOINT_LIMITS antes de arrancar
+- progress(): estado, ciclo y punto actuales, fracción completada
+- on_progress / on_finish: callbacks opcionales, llamados desde el hilo
+  del ejecutor (en Tk usar after() en lugar de tocar widgets desde ahí)
+
+La pausa baja la escala de tiempo de la trayectoria en rampa, de modo que
+el brazo desacelera sobre el mismo camino y luego puede reanudar. La parada
+de emergencia no pasa por acá: la atiende el lazo directamente.
+"""
+
+import threading
+from Qarm_trajectory import route_trajectory
+
+
+class RouteExecutor:
+    IDLE = "idle"
+    RUNNING = "running"
+    PAUSED = "paused"
+    DONE = "done"
+    ABORTED = "aborted"
+
+    def __init__(self, brazo, on_progress=None, on_finish=None, progress_period=0.05):
+        """
+        Parameters
+        ----------
+        brazo : QArmWrapper
+        on_progress : callable(dict) o None
+            Se llama cada progress_period segundos con progress().
+        on_finish : callable(state) o None
+            Se llama al terminar con DONE o ABORTED.
+        """
+        self.brazo = brazo
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.progress_period = float(progress_period)
+
+        self.state = self.IDLE
+        self.trajectory = None
+        self.n_points = 0
+        self.ciclos = 0
+        self._done = None
+        self._thread = None
+
+    @property
+    def active(self):
+        return self.state in (self.RUNNING, self.PAUSED)
+
+    def limit_violations(self, ruta, blend=0.0, q_start=None, gripper_start=None):
+        """
+        Consignas de la ruta fuera de JOINT_LIMITS, antes de moverse: el
+        acercamiento desde q_start, un ciclo y el regreso al punto 0 (los
+        demás ciclos son iguales al segundo). El brazo recorta cada consigna
+        a los límites al escribirla, así que esto sirve para avisar: la GUI
+        y Qarm_runner avisan y ejecutan igual.
+
+        Returns
+        -------
+        (n, t_first) : muestras fuera de límites y tiempo (s) de la primera
+                       (None si no hay)
+        """
+        if q_start is None:
+            q_start, g = self.brazo.command_position()
+            if gripper_start is None:
+                gripper_start = g
+        traj = route_trajectory(ruta, q_start=q_start, gripper_start=gripper_start,
+                                ciclos=2, blend=blend)
+        t = traj.time_grid(self.brazo.loop.frequency)
+        bad, first = self.brazo.check_limits(traj.sample_batch(t)[0])
+        return int(bad.sum()), None if first is None else float(t[first])
+
+    # -------------------------
+    # Control
+    # -------------------------
+    def start(self, ruta, ciclos=1, blend=0.0, q_start=None, gripper_start=None):
+        """Arma la trayectoria de la ruta y la lanza en el lazo de control."""
+        if self.active:
+            raise RuntimeError("Ya hay una ruta en ejecución.")
+
+        if q_start is None:
+            q_start, g = self.brazo.command_position()
+            if gripper_start is None:
+                gripper_start = g
+
+        self.ciclos = max(1, int(ciclos))
+        self.n_points = len(ruta)
+        self.trajectory = route_trajectory(
+            ruta, q_start=q_start, gripper_start=gripper_start,
+            ciclos=self.ciclos, blend=blend
+        )
+        self.state = self.RUNNING
+        self._done = self.brazo.run_trajectory(self.trajectory)
+
+        self._thread = threading.Thread(target=self._monitor, name="RouteExecutor", daemon=True)
+        self._thread.start()
+        return self.trajectory
+
+    def pause(self):
+        if self.state == self.RUNNING:
+            self.brazo.loop.set_time_scale(0.0)
+            self.state = self.PAUSED
+
+    def resume(self):
+        if self.state == self.PAUSED:
+            self.brazo.loop.set_time_scale(1.0)
+            self.state = self.RUNNING
+
+    def abort(self):
+        """Cancela la ruta y deja el brazo en la última consigna enviada."""
+        if self.active:
+            self.brazo.loop.hold()
+
+    def wait(self, timeout=None):
+        """Espera a que la ruta termine (o se cancele). Devuelve el estado final."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.state
+
+    # -------------------------
+    # Progreso
+    # -------------------------
+    def progress(self):
+        """
+        Devuelve un dict con: state, t, duration, fraction, ciclo y punto
+        (ambos desde 1).
+        """
+        traj = self.trajectory
+        if traj is None:
+            return {"state": self.state, "t": 0.0, "duration": 0.0,
+                    "fraction": 0.0, "ciclo": 0, "punto": 0}
+
+        t = min(self.brazo.loop.trajectory_time, traj.duration_total)
+        k = traj.segment_at(t)
+        n = max(1, self.n_points)
+        return {
+            "state":    self.state,
+            "t":        t,
+            "duration": traj.duration_total,
+            "fraction": t / traj.duration_total if traj.duration_total > 0 else 1.0,
+            "ciclo":    k // n + 1,
+            "punto":    k % n + 1,
+        }
+
+    def _monitor(self):
+        done = self._done
+        while not done.wait(self.progress_period):
+            if self.on_progress is not None:
+                self.on_progress(self.progress())
+
+        traj = self.trajectory
+        if self.brazo.loop.trajectory_time >= traj.duration_total:
+            self.state = self.DONE
+        else:
+            self.state = self.ABORTED
+
+        if self.on_progress is not None:
+            self.on_progress(self.progress())
+        if self.on_finish is not None:
+            self.on_finish(self.state)
@@ -0,0 +1,165 @@
+# ============================================================
+#                 Qarm_route.py
+# ============================================================
+"""
+Archivos de ruta: JSON (formato de la GUI) y binario columnar.
+
+El JSON de RUTAS/ es una lista de dicts indentada, cómodo para 10 puntos
+pero no para trayectorias grabadas o generadas de 10^5-10^6 muestras: el
+archivo pesa ~150 B por punto y json.load arma un dict y una lista por
+punto. El formato binario guarda las mismas columnas contiguas:
+
+    .npy   arreglo estructurado ROUTE_DTYPE (pos en grados, gripper,
+           tiempo), sin comprimir: open_route() lo abre memory-mapped
+           (no lee nada hasta que se usa) e iter_route() lo recorre por
+           bloques con memoria acotada.
+    .npz   las mismas columnas (pos, gripper, tiempo) comprimidas; ocupa
+           menos pero se descomprime entero al abrirlo.
+
+Los valores son los mismos float64 del JSON, así que JSON -> binario -> JSON
+no pierde nada. route_trajectory() y el resto de Qarm_trajectory aceptan
+el arreglo estructurado igual que la lista de dicts.
+
+Uso:
+    python Qarm_route.py "RUTAS/pick and place 2.json" ruta.npy   # convertir (por extensión)
+    python Qarm_route.py ruta.npy                                 # resumen
+"""
+
+import json
+import os
+import sys
+import numpy as np
+
+
+ROUTE_DTYPE = np.dtype([
+    ("pos", np.float64, (4,)),      # grados, J1..J4
+    ("gripper", np.float64),
+    ("tiempo", np.float64),         # retardo del punto (s), como en la GUI
+])
+
+FORMATS = (".json", ".npy", ".npz")
+
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"{path}: formato de ruta desconocido (se espera {', '.join(FORMATS)})")
+    return ext
+
+
+# -------------------------
+# Conversión lista de dicts <-> arreglo
+# -------------------------
+def to_array(ruta):
+    """Lista de dicts de la GUI -> arreglo ROUTE_DTYPE (valida cada punto)."""
+    arr = np.zeros(len(ruta), dtype=ROUTE_DTYPE)
+    try:
+        # por columnas: un np.array por campo en lugar de una fila por punto
+        pos = np.array([p["pos"] for p in ruta], dtype=np.float64)
+        if pos.shape == (len(ruta), 4):
+            arr["pos"] = pos
+            arr["gripper"] = [p["gripper"] for p in ruta]
+            arr["tiempo"] = [p.get("tiempo", 0.0) for p in ruta]
+            return arr
+    except (KeyError, TypeError, ValueError, AttributeError):
+        pass
+    # algún punto inválido: se recorre punto por punto para el mensaje
+    for i, p in enumerate(ruta):
+        if not isinstance(p, dict) or len(p.get("pos", ())) != 4 or "gripper" not in p:
+            raise ValueError(f"punto {i} inválido (se esperan 'pos' de 4 juntas y 'gripper')")
+        arr[i] = (p["pos"], p["gripper"], p.get("tiempo", 0.0))
+    return arr
+
+
+def to_list(arr):
+    """Arreglo ROUTE_DTYPE -> lista de dicts de la GUI (floats de Python, sin pérdida)."""
+    pos = arr["pos"].tolist()
+    grip = arr["gripper"].tolist()
+    tiempo = arr["tiempo"].tolist()
+    return [{"pos": p, "gripper": g, "tiempo": t} for p, g, t in zip(pos, grip, tiempo)]
+
+
+# -------------------------
+# Lectura / escritura
+# -------------------------
+def save_route(path, ruta):
+    """Guarda una ruta (lista de dicts o arreglo ROUTE_DTYPE) según la extensión de path."""
+    ext = _format(path)
+    if ext == ".json":
+        if isinstance(ruta, np.ndarray):
+            ruta = to_list(ruta)
+        with open(path, "w") as f:
+            json.dump(ruta, f, indent=4)
+        return
+    arr = ruta if isinstance(ruta, np.ndarray) else to_array(ruta)
+    if ext == ".npy":
+        np.save(path, np.ascontiguousarray(arr, dtype=ROUTE_DTYPE))
+    else:
+        np.savez_compressed(path, pos=arr["pos"], gripper=arr["gripper"], tiempo=arr["tiempo"])
+
+
+def open_route(path, mmap=True):
+    """
+    Ruta como arreglo ROUTE_DTYPE. Un .npy se abre memory-mapped (sólo
+    lectura) salvo mmap=False; .npz y .json se leen enteros.
+    """
+    ext = _format(path)
+    if ext == ".npy":
+        arr = np.load(path, mmap_mode="r" if mmap else None)
+        if arr.dtype != ROUTE_DTYPE:
+            raise ValueError(f"{path}: no es una ruta (dtype {arr.dtype})")
+    elif ext == ".npz":
+        with np.load(path) as z:
+            faltan = [k for k in ("pos", "gripper", "tiempo") if k not in z]
+            if faltan:
+                raise ValueError(f"{path}: no es una ruta (faltan {', '.join(faltan)})")
+            arr = np.zeros(len(z["gripper"]), dtype=ROUTE_DTYPE)
+            arr["pos"] = z["pos"]
+            arr["gripper"] = z["gripper"]
+            arr["tiempo"] = z["tiempo"]
+    else:
+        with open(path, "r") as f:
+            ruta = json.load(f)
+        if not isinstance(ruta, list):
+            raise ValueError(f"{path}: la ruta debe ser una lista de puntos")
+        try:
+            arr = to_array(ruta)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+    if not len(arr):
+        raise ValueError(f"{path}: ruta vacía")
+    return arr
+
+
+def load_route(path):
+    """Ruta como lista de dicts de la GUI (validada), desde cualquiera de los formatos."""
+    return to_list(open_route(path))
+
+
+def iter_route(path, chunk_rows=65536):
+    """
+    Recorre la ruta por bloques ROUTE_DTYPE de a lo sumo chunk_rows puntos.
+    Con .npy sólo hay un bloque en memoria a la vez (lee del mmap a medida
+    que avanza); .npz y .json se leen enteros primero.
+    """
+    arr = open_route(path)
+    for i in range(0, len(arr), chunk_rows):
+        yield np.array(arr[i:i + chunk_rows])
+
+
+def main():
+    if len(sys.argv) == 3:
+        src, dst = sys.argv[1:]
+        save_route(dst, open_route(src))
+        print(f"{src} ({os.path.getsize(src):,} B) -> {dst} ({os.path.getsize(dst):,} B)")
+    elif len(sys.argv) == 2:
+        arr = open_route(sys.argv[1])
+        print(f"{sys.argv[1]}: {len(arr)} puntos, retardo total {arr['tiempo'][1:].sum():.2f} s")
+        print(f"  J1..J4 mín {arr['pos'].min(axis=0)} máx {arr['pos'].max(axis=0)} (grados)")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# ============================================================
+#                 Qarm_runner.py
+# ============================================================
+"""
+Ejecución de rutas sin interfaz gráfica (celdas de producción, cron, systemd).
+
+Carga una ruta (RUTAS/*.json o binaria .npy/.npz, ver Qarm_route), la
+ejecuta N ciclos con el mismo camino que la GUI (QArmWrapper + ControlLoop
++ RouteExecutor) e imprime estadísticas de tiempo de ciclo. No importa
+tkinter: arranca rápido y no necesita display.
+
+Uso:
+    python Qarm_runner.py "RUTAS/pick and place 2.json" --modo emulacion --ciclos 20
+    python Qarm_runner.py ruta.json --modo fisico --ciclos 100 --blend 0.3
+    python Qarm_runner.py ruta.json --modo emulacion --json     # resumen en JSON
+    python Qarm_runner.py ruta.json --modo simulacion --telemetry logs/corrida1
+
+--modo es obligatorio (no hay un modo por defecto que pueda mover el
+brazo físico sin querer, ni uno que deje una celda corriendo en
+emulación): emulacion (QArm simulado en proceso), simulacion (QLabs) o
+fisico; se imprime al arrancar. Antes del primer ciclo el brazo va al
+primer punto de la ruta (fuera de la medición); al final vuelve a HOME
+salvo --no-home. Como en la GUI, las consignas fuera de los límites
+articulares se avisan y se recortan.
+
+Código de salida: 0 ruta completa, 1 ruta cancelada o inválida,
+130 interrumpida (Ctrl+C / SIGTERM: se cancela la ruta y se cierra el brazo).
+"""
+
+import argparse
+import contextlib
+import json
+import signal
+import sys
+import time
+import numpy as np
+from Qarm_controller import QArmWrapper
+from Qarm_executor import RouteExecutor
+from Qarm_route import open_route
+from Qarm_trajectory import fixed_delay_cycle_time, optimal_cycle_time, route_trajectory
+
+
+MODOS = ("emulacion", "simulacion", "fisico")
+
+
+def load_route(path):
+    """
+    Lee y valida una ruta: JSON [{"pos": [deg x4], "gripper": g, "tiempo": s}, ...]
+    o binaria (.npy memory-mapped, .npz). Devuelve el arreglo Qarm_route.ROUTE_DTYPE.
+    """
+    return open_route(path)
+
+
+class CycleTimer:
+    """
+    Tiempo de pared de cada ciclo, a partir del progreso del RouteExecutor
+    (on_progress): un ciclo termina cuando el ejecutor pasa al siguiente.
+    """
+
+    def __init__(self):
+        self.marks = []         # (ciclo, t) de cada comienzo de ciclo
+        self.t_end = None
+
+    def on_progress(self, p):
+        t = time.perf_counter()
+        ciclo = p["ciclo"]
+        if not self.marks or ciclo > self.marks[-1][0]:
+            self.marks.append((ciclo, t))
+        if p["state"] == RouteExecutor.DONE:
+            # un ciclo cancelado a medias no se cuenta
+            self.t_end = t
+
+    def durations(self):
+        """Duraciones (s) de los ciclos completos."""
+        t = [m[1] for m in self.marks]
+        if self.t_end is not None:
+            t.append(self.t_end)
+        return np.diff(t)
+
+
+def run(ruta, modo, ciclos=1, blend=0.0, rate=500, telemetry=None,
+        home=True, progress_period=0.005, verbose=True):
+    """
+    Ejecuta la ruta y devuelve un dict con el estado final y las estadísticas.
+    Se puede llamar desde otros scripts (no depende de argparse ni de la GUI).
+    """
+    def on_signal(signum, frame):
+        # SIGTERM (systemd stop) se trata igual que Ctrl+C
+        raise KeyboardInterrupt
+
+    if verbose:
+        print(f"Modo: {modo}")
+    previous = signal.signal(signal.SIGTERM, on_signal)
+    brazo = QArmWrapper(modo=modo)
+    executor = None
+    timer = CycleTimer()
+    state = None
+    fuera = 0
+    wall = err = None
+    try:
+        brazo.start_loop(frequency=rate)
+        if telemetry:
+            brazo.start_telemetry(telemetry)
+
+        # al primer punto de la ruta, fuera de la medición
+        q_now, g_now = brazo.command_position()
+        brazo.run_trajectory(route_trajectory(ruta[:1], q_start=q_now, gripper_start=g_now)).wait()
+
+        executor = RouteExecutor(brazo, on_progress=timer.on_progress, progress_period=progress_period)
+        q_now, g_now = brazo.command_position()
+        fuera, t_fuera = executor.limit_violations(ruta, blend=blend, q_start=q_now, gripper_start=g_now)
+        if fuera:
+            print(f"Aviso: {fuera} consignas fuera de los límites articulares "
+                  f"(la primera en t={t_fuera:.2f} s), se recortan.")
+        brazo.loop.reset_stats()
+        t0 = time.perf_counter()
+        traj = executor.start(ruta, ciclos=ciclos, blend=blend, q_start=q_now, gripper_start=g_now)
+        if verbose:
+            print(f"{len(ruta)} puntos x {ciclos} ciclos, duración planificada {traj.duration_total:.2f} s")
+        state = executor.wait()
+        wall = time.perf_counter() - t0
+
+        # error final: medición contra el último punto (deja asentar al servo)
+        time.sleep(0.2)
+        err = np.rad2deg(np.abs(brazo.read_std()["position"][0:4] - traj.q_end)).max()
+
+        if home and state == RouteExecutor.DONE:
+            q_now, g_now = brazo.command_position()
+            back = route_trajectory([{"pos": [0.0, 0.0, 0.0, 0.0], "gripper": g_now}],
+                                    q_start=q_now, gripper_start=g_now)
+            brazo.run_trajectory(back).wait()
+    except KeyboardInterrupt:
+        if executor is not None:
+            executor.abort()
+            executor.wait(1.0)
+        state = "interrupted"
+    finally:
+        loop_stats = brazo.loop.stats() if brazo.loop is not None else {}
+        brazo.terminate()
+        signal.signal(signal.SIGTERM, previous)
+
+    d = timer.durations()
+    return {
+        "state":        state,
+        "cycles":       int(len(d)),
+        "cycle_times":  [float(x) for x in d],
+        "cycle_mean":   float(d.mean()) if len(d) else None,
+        "cycle_std":    float(d.std()) if len(d) > 1 else 0.0,
+        "cycle_min":    float(d.min()) if len(d) else None,
+        "cycle_max":    float(d.max()) if len(d) else None,
+        "planned":      optimal_cycle_time(ruta, blend=blend),
+        "fixed_delay":  fixed_delay_cycle_time(ruta),
+        "wall":         wall,
+        "final_error_deg": None if err is None else float(err),
+        "limit_violations": fuera,
+        "loop":         {k: float(v) for k, v in loop_stats.items()},
+    }
+
+
+def print_report(name, r):
+    print(f"\n{name}: {r['state']}, {r['cycles']} ciclos")
+    if r["cycles"]:
+        print(f"  tiempo de ciclo     media {r['cycle_mean']:.3f} s  desv {r['cycle_std']*1e3:.1f} ms  "
+              f"mín {r['cycle_min']:.3f} s  máx {r['cycle_max']:.3f} s")
+        print(f"  planificado         {r['planned']:.3f} s (retardo fijo: {r['fixed_delay']:.2f} s; "
+              f"el ciclo 1 no incluye el regreso al primer punto)")
+    if r["wall"] is not None:
+        print(f"  total               {r['wall']:.2f} s")
+    if r["final_error_deg"] is not None:
+        print(f"  error final         {r['final_error_deg']:.3f} deg")
+    lp = r["loop"]
+    if lp:
+        print(f"  lazo                período {lp['period_mean']*1e3:.3f} ms, jitter {lp['jitter_std']*1e6:.1f} us "
+              f"(máx {lp['jitter_max']*1e6:.0f} us), overruns {int(lp['overruns'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ejecuta una ruta del QArm sin interfaz gráfica")
+    parser.add_argument("ruta", help="archivo de la ruta (RUTAS/*.json, .npy o .npz)")
+    parser.add_argument("--modo", choices=MODOS, required=True,
+                        help="emulacion, simulacion (QLabs) o fisico")
+    parser.add_argument("--ciclos", type=int, default=1)
+    parser.add_argument("--blend", type=float, default=0.0, help="mezcla en puntos intermedios (0..1)")
+    parser.add_argument("--rate", type=float, default=500, help="frecuencia del lazo de control (Hz)")
+    parser.add_argument("--telemetry", metavar="DIR", help="registrar telemetría en DIR")
+    parser.add_argument("--no-home", action="store_true", help="no volver a HOME al terminar")
+    parser.add_argument("--json", action="store_true", help="imprimir el resumen como JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        ruta = load_route(args.ruta)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    # con --json, stdout queda sólo para el resumen (los mensajes del brazo van a stderr)
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        r = run(ruta, modo=args.modo, ciclos=max(1, args.ciclos), blend=min(max(args.blend, 0.0), 1.0),
+                rate=args.rate, telemetry=args.telemetry, home=not args.no_home)
+    if args.json:
+        print(json.dumps(r))
+    else:
+        print_report(args.ruta, r)
+    if r["state"] == "interrupted":
+        return 130
+    return 0 if r["state"] == RouteExecutor.DONE else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# ============================================================
+#                 Qarm_startup.py
+# ============================================================
+"""
+Arranque rápido de los scripts con GUI (TODO.py, Inverse.py, CAMERA/test.py).
+
+Lo que tarda en arrancar no es tkinter sino los módulos pesados
+(quanser.hardware, cv2, mediapipe) y lo que se construye con ellos (modelo
+de MediaPipe, búsqueda de cámaras, mapa de alcance). Con BackgroundImport /
+Background esas cargas corren en un hilo mientras el usuario elige el modo
+en el diálogo inicial, y el script sólo espera lo que todavía falte cuando
+lo necesita:
+
+    import Qarm_startup as startup                 # primera línea del script
+    pre = startup.BackgroundImport("Qarm_controller", "quanser.hardware")
+    modo = startup.ask_mode(ask_mode_gui)
+    from Qarm_controller import QArmWrapper        # ya cargado (o espera a que termine)
+    ...
+    startup.first_command()                        # después del primer comando
+
+Cada script marca los hitos del arranque (mark) con el tiempo desde que se
+importó este módulo; el tiempo en el diálogo se registra aparte, porque
+depende del usuario y no del programa.
+
+Variables de entorno (para medir sin interacción, ver measure()):
+    QARM_MODO            modo sin diálogo: simulacion, fisico o emulacion
+    QARM_DIALOG_DELAY    segundos que "tarda el usuario" con QARM_MODO (0)
+    QARM_STARTUP_REPORT  imprime el reporte de arranque en el primer comando
+    QARM_STARTUP_EXIT    idem, y termina el script ahí
+
+Uso (desglose estilo -X importtime y time-to-first-command):
+    python Qarm_startup.py TODO.py --runs 5 --dialog 0 3
+    python benchmark.py startup          # lo mismo para el script de la carpeta
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Este módulo es lo primero que importa cada script: argparse, json y
+# subprocess (sólo para el reporte y la medición) se importan donde se usan.
+
+
+MODOS = {"simulacion": 0, "fisico": 1, "emulacion": 2}   # -> hardware_mode de test.py (Inverse.py: sin emulación)
+
+_REPORT_TAG = "QARM_STARTUP "
+
+_t0 = time.perf_counter()
+_epoch0 = time.time()
+_marks = []             # (etiqueta, t desde _t0); list.append es atómico entre hilos
+_dialog = [0.0]         # tiempo total en diálogos (s)
+
+
+# -------------------------
+# Hitos del arranque
+# -------------------------
+def mark(label):
+    """Registra un hito del arranque; devuelve su tiempo desde el inicio (s)."""
+    t = time.perf_counter() - _t0
+    _marks.append((label, t))
+    return t
+
+
+def marks():
+    return list(_marks)
+
+
+def ask_mode(dialog):
+    """
+    Modo de operación: QARM_MODO si está definida (sin diálogo), si no
+    dialog(). El tiempo que el diálogo está abierto no cuenta como arranque.
+    """
+    mark("diálogo de modo")
+    t = time.perf_counter()
+    modo = os.environ.get("QARM_MODO")
+    if modo:
+        if modo not in MODOS:
+            raise ValueError(f"QARM_MODO={modo!r}: se espera uno de {', '.join(MODOS)}")
+        time.sleep(float(os.environ.get("QARM_DIALOG_DELAY", 0.0)))
+    else:
+        modo = dialog()
+    _dialog[0] += time.perf_counter() - t
+    mark(f"modo elegido ({modo})")
+    return modo
+
+
+def first_command():
+    """
+    Marca el primer comando al brazo. Con QARM_STARTUP_REPORT imprime el
+    reporte; con QARM_STARTUP_EXIT además termina (SystemExit, así los
+    finally del script cierran el brazo).
+    """
+    mark("primer comando")
+    if os.environ.get("QARM_STARTUP_REPORT") or os.environ.get("QARM_STARTUP_EXIT"):
+        report()
+    if os.environ.get("QARM_STARTUP_EXIT"):
+        raise SystemExit(0)
+
+
+def summary():
+    """dict con los hitos, el tiempo en diálogos y el time-to-first-command."""
+    first = next((t for label, t in _marks if label == "primer comando"), None)
+    return {
+        "epoch0": _epoch0,
+        "marks": marks(),
+        "dialog": _dialog[0],
+        "first_command": first,
+        "first_command_no_dialog": None if first is None else first - _dialog[0],
+    }
+
+
+def report(file=None):
+    """Imprime los hitos y una línea JSON (QARM_STARTUP ...) para measure()."""
+    import json
+    file = file or sys.stderr
+    s = summary()
+    print("arranque:", file=file)
+    for label, t in s["marks"]:
+        print(f"  {t*1e3:9.1f} ms  {label}", file=file)
+    if s["first_command"] is not None:
+        print(f"  primer comando a {s['first_command_no_dialog']*1e3:.1f} ms sin contar el diálogo "
+              f"({s['dialog']:.2f} s en diálogo)", file=file)
+    print(_REPORT_TAG + json.dumps(s), file=file, flush=True)
+
+
+# -------------------------
+# Carga en segundo plano
+# -------------------------
+class Background:
+    """
+    Ejecuta fn(*args, **kw) en un hilo daemon. result() espera a que
+    termine y devuelve su valor o relanza su excepción en quien lo llama.
+    """
+
+    def __init__(self, fn, *args, name=None, **kw):
+        self._value = None
+        self._error = None
+        self._done = threading.Event()
+        self.name = name or getattr(fn, "__name__", "background")
+        self._thread = threading.Thread(target=self._run, args=(fn, args, kw),
+                                        name=f"startup-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self, fn, args, kw):
+        t = time.perf_counter()
+        try:
+            self._value = fn(*args, **kw)
+        except BaseException as e:
+            self._error = e
+        finally:
+            mark(f"{self.name} listo en segundo plano ({(time.perf_counter() - t)*1e3:.0f} ms)")
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name}: no terminó en {timeout} s")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class BackgroundImport(Background):
+    """
+    Importa módulos en orden, en un solo hilo, para que el `import` del
+    script los encuentre ya cargados (si uno está a medio cargar, el import
+    espera a que termine). Un módulo que no está instalado (p. ej. quanser
+    en emulación) no corta la carga de los demás: el error aparece recién en
+    el import del script, si es que lo necesita.
+    """
+
+    def __init__(self, *names):
+        self.names = names
+        super().__init__(self._import_all, name="import " + ", ".join(names))
+
+    def _import_all(self):
+        missing = []
+        for name in self.names:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                missing.append(name)
+        return missing
+
+
+# -------------------------
+# Medición (benchmark)
+# -------------------------
+def parse_importtime(text):
+    """
+    Filas de `python -X importtime`: lista de (módulo, propio_s, acumulado_s,
+    nivel), nivel 0 = importado directamente por el script.
+    """
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(own) * 1e-6, int(cumulative) * 1e-6, level))
+    return rows
+
+
+def measure(script, args=(), modo="emulacion", dialog_delay=0.0, importtime=False, timeout=120.0):
+    """
+    Corre script en un subproceso hasta su primer comando (QARM_MODO,
+    QARM_STARTUP_EXIT) y devuelve summary() del hijo más:
+        launch    time-to-first-command desde el lanzamiento del proceso,
+                  sin contar el diálogo (incluye arrancar el intérprete)
+        imports   filas de parse_importtime() si importtime=True
+    """
+    import json
+    import subprocess
+    script = os.path.abspath(script)
+    env = dict(os.environ, QARM_MODO=modo, QARM_DIALOG_DELAY=str(dialog_delay), QARM_STARTUP_EXIT="1")
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [script] + list(args)
+    t_launch = time.time()
+    p = subprocess.run(cmd, cwd=os.path.dirname(script), env=env, capture_output=True, text=True,
+                       timeout=timeout)
+    line = next((l for l in p.stderr.splitlines() if l.startswith(_REPORT_TAG)), None)
+    if line is None or p.returncode != 0:
+        tail = "\n".join(p.stderr.strip().splitlines()[-8:])
+        raise RuntimeError(f"{os.path.basename(script)} terminó con código {p.returncode} "
+                           f"sin llegar al primer comando:\n{tail}")
+    s = json.loads(line[len(_REPORT_TAG):])
+    s["launch"] = s["epoch0"] - t_launch + s["first_command_no_dialog"]
+    s["imports"] = parse_importtime(p.stderr) if importtime else []
+    return s
+
+
+def print_imports(rows, top=12):
+    """Desglose por paquete raíz (acumulado de los imports de nivel 0)."""
+    by_root = {}
+    for name, _, cumulative, level in rows:
+        if level == 0:
+            root = name.split(".")[0]
+            by_root[root] = by_root.get(root, 0.0) + cumulative
+    total = sum(by_root.values())
+    print(f"  imports: {total*1e3:.1f} ms en total (-X importtime, incluye los de segundo plano)")
+    for root, t in sorted(by_root.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"    {t*1e3:9.1f} ms  {root}")
+
+
+def bench(script, args=(), modo="emulacion", runs=5, dialogs=(0.0, 3.0)):
+    """
+    Target "startup" de benchmark.py: desglose de imports y
+    time-to-first-command (desde el lanzamiento, sin contar el diálogo) con
+    cada tiempo de diálogo simulado. Con 0 s no hay nada que solapar: es el
+    costo completo de las cargas; con unos segundos de diálogo la carga en
+    segundo plano ya terminó cuando el usuario elige.
+    """
+    s = measure(script, args, modo, dialogs[-1], importtime=True)
+    print(f"{script} ({modo}):")
+    print_imports(s["imports"])
+    print("  hitos (última corrida con diálogo, -X importtime):")
+    for label, t in s["marks"]:
+        print(f"    {t*1e3:9.1f} ms  {label}")
+    for dialog in dialogs:
+        launch = [measure(script, args, modo, dialog)["launch"] for _ in range(runs)]
+        print(f"  time-to-first-command  {min(launch)*1e3:8.1f} ms mín  {sum(launch)/len(launch)*1e3:8.1f} ms media"
+              f"   (diálogo de {dialog:.1f} s, descontado; {runs} corridas)")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de un script del QArm")
+    parser.add_argument("script", help="TODO.py, Inverse.py o test.py")
+    parser.add_argument("args", nargs="*", help="argumentos del script (p. ej. la cámara de test.py)")
+    parser.add_argument("--modo", choices=sorted(MODOS), default="emulacion")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--dialog", type=float, nargs="+", default=[0.0, 3.0],
+                        help="segundos simulados en el diálogo de modo (tiempo para la carga en segundo plano)")
+    args = parser.parse_args()
+    bench(args.script, args.args, args.modo, args.runs, args.dialog)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# ============================================================
+#                 Qarm_stream.py
+# ============================================================
+"""
+Streaming de trayectorias con buffer en la tarjeta (HIL writer task).
+
+En lugar de escribir una consigna por período desde Python (ControlLoop),
+la tarjeta aplica las muestras con su propio reloj (Clock.HARDWARE_CLOCK_0)
+y el host sólo la mantiene alimentada por bloques:
+
+    productor --push()--> SampleRing --hilo feeder--> QArm.stream_write --> tarjeta
+
+- SampleRing: buffer circular preasignado (muestras x 5) entre el productor
+  (p. ej. el muestreo de una trayectoria) y el hilo que escribe a la tarjeta.
+- BufferedStream: precarga el primer bloque, arranca el writer task y lo
+  alimenta desde el anillo; el jitter de Python sólo afecta cuánto margen
+  queda en el buffer de la tarjeta, no el instante de cada consigna.
+
+Funciona igual con la tarjeta real y con Qarm_sim.SimulatedHIL.
+"""
+
+import threading
+import time
+import numpy as np
+
+
+class SampleRing:
+    """Buffer circular de muestras (capacity x width), un productor y un consumidor."""
+
+    def __init__(self, capacity, width=5):
+        self.buffer = np.zeros((int(capacity), width), dtype=np.float64)
+        self.capacity = int(capacity)
+        self._head = 0      # muestras escritas (total)
+        self._tail = 0      # muestras leídas (total)
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._head - self._tail
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Fin de datos: pop_into devuelve 0 cuando el anillo queda vacío."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _copy(self, start, rows, src=None, dst=None):
+        # copia con vuelta del anillo en, a lo sumo, dos tramos
+        i = start % self.capacity
+        k = min(rows, self.capacity - i)
+        if src is not None:
+            self.buffer[i:i + k] = src[:k]
+            self.buffer[0:rows - k] = src[k:rows]
+        else:
+            dst[:k] = self.buffer[i:i + k]
+            dst[k:rows] = self.buffer[0:rows - k]
+
+    def push(self, block):
+        """Copia block (n x width) al anillo; bloquea mientras esté lleno."""
+        n = len(block)
+        done = 0
+        while done < n:
+            with self._cond:
+                while self._head - self._tail == self.capacity and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return done
+                k = min(n - done, self.capacity - (self._head - self._tail))
+                self._copy(self._head, k, src=block[done:done + k])
+                self._head += k
+                done += k
+                self._cond.notify_all()
+        return done
+
+    def pop_into(self, out, timeout=None):
+        """
+        Copia hasta len(out) muestras a out. Bloquea hasta que haya al menos
+        una; devuelve 0 si el anillo está cerrado y vacío (o vence timeout).
+        """
+        with self._cond:
+            while self._head == self._tail and not self._closed:
+                if not self._cond.wait(timeout):
+                    return 0
+            k = min(len(out), self._head - self._tail)
+            self._copy(self._tail, k, dst=out)
+            self._tail += k
+            self._cond.notify_all()
+            return k
+
+
+class BufferedStream:
+    """
+    Alimenta un writer task del QArm desde un SampleRing.
+
+    Parameters
+    ----------
+    arm : Qarm_lib.QArm
+    frequency : float
+        Frecuencia del writer task (Hz).
+    block : int
+        Muestras por escritura a la tarjeta.
+    card_buffer : int
+        Tamaño del buffer del task en la tarjeta (muestras).
+    preload : int o None
+        Muestras que se cargan antes de arrancar el reloj (por defecto la
+        mitad de card_buffer).
+    ring_blocks : int
+        Capacidad del anillo del host, en bloques.
+    """
+
+    def __init__(self, arm, frequency=500, block=50, card_buffer=1000, preload=None, ring_blocks=16):
+        self.arm = arm
+        self.frequency = float(frequency)
+        self.block = int(block)
+        self.card_buffer = int(card_buffer)
+        self.preload = self.card_buffer // 2 if preload is None else min(int(preload), self.card_buffer)
+        self.ring = SampleRing(max(self.block * int(ring_blocks), self.preload))
+
+        self._out = np.zeros((self.block, 5), dtype=np.float64)
+        self._preload = np.zeros((max(self.preload, 1), 5), dtype=np.float64)
+        self._thread = None
+        self._abort = False
+        self.error = None
+
+        self.t_start = None
+        self.samples = 0
+        self.writes = 0
+        self.margin_min = None
+        self.underflows = None
+
+    # -------------------------
+    # Control
+    # -------------------------
+    def start(self):
+        self._thread = threading.Thread(target=self._feed, name="QArmStream", daemon=True)
+        self._thread.start()
+
+    def push(self, block):
+        """Encola consignas (n x 5) = [j0..j3, gripper]; bloquea si el anillo está lleno."""
+        return self.ring.push(block)
+
+    def finish(self, timeout=None):
+        """
+        Cierra el anillo, espera a que la tarjeta aplique la última muestra
+        encolada y detiene el task. Devuelve stats().
+        """
+        self.ring.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.t_start is not None and not self._abort:
+            remaining = self.t_start + self.samples / self.frequency - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+        get_underflows = getattr(self.arm.card, "task_get_underflows", None)
+        if get_underflows is not None and self.arm.streamTask is not None:
+            self.underflows = get_underflows(self.arm.streamTask)
+        self.arm.stream_stop()
+        return self.stats()
+
+    def abort(self):
+        """Descarta lo encolado y detiene el task de inmediato (p. ej. parada de emergencia)."""
+        self._abort = True
+        self.ring.close()
+        self.arm.stream_stop()
+
+    def play(self, traj):
+        """Muestrea traj a la frecuencia del task y la transmite completa (bloqueante)."""
+        t = traj.time_grid(self.frequency)
+        chunk = np.zeros((self.block * 4, 5), dtype=np.float64)
+        self.start()
+        for i in range(0, len(t), len(chunk)):
+            tt = t[i:i + len(chunk)]
+            q, _, _, g = traj.sample_batch(tt)
+            chunk[:len(tt), 0:4] = q
+            chunk[:len(tt), 4] = g
+            if self.push(chunk[:len(tt)]) < len(tt):
+                break
+        return self.finish()
+
+    # -------------------------
+    # Hilo feeder
+    # -------------------------
+    def _feed(self):
+        out = self._out
+        try:
+            # precarga: el buffer de la tarjeta se llena en parte antes de
+            # arrancar el reloj, así el primer período ya tiene margen
+            pre = self._preload
+            n = 0
+            while n < len(pre):
+                k = self.ring.pop_into(pre[n:])
+                if k == 0:
+                    break
+                n += k
+            if n == 0 or self._abort:
+                return
+            self.arm.stream_start(self.frequency, self.card_buffer, preload=pre[:n])
+            self.t_start = time.perf_counter()
+            self.samples = n
+            self.writes = 1
+
+            while not self._abort:
+                n = self.ring.pop_into(out)
+                if n == 0:
+                    break
+                # margen: muestras aún en la tarjeta al momento de escribir
+                margin = self.samples - (time.perf_counter() - self.t_start) * self.frequency
+                if self.margin_min is None or margin < self.margin_min:
+                    self.margin_min = margin
+                if self.arm.stream_write(out[:n]) < n:
+                    raise RuntimeError("la tarjeta rechazó el bloque")
+                self.samples += n
+                self.writes += 1
+        except Exception as e:
+            if not self._abort:
+                self.error = e
+            self._abort = True
+            self.ring.close()
+
+    # -------------------------
+    # Estadísticas
+    # -------------------------
+    def stats(self):
+        """
+        samples / writes : muestras enviadas y escrituras a la tarjeta
+        margin_min       : menor margen (s) de buffer en la tarjeta al escribir
+        underflows       : períodos sin muestra (sólo si la tarjeta lo informa)
+        """
+        return {
+            "samples": self.samples,
+            "writes": self.writes,
+            "samples_per_write": self.samples / self.writes if self.writes else 0.0,
+            "margin_min": 0.0 if self.margin_min is None else self.margin_min / self.frequency,
+            "underflows": self.underflows,
+            "aborted": self._abort,
+            "error": self.error,
+        }
@@ -0,0 +1,200 @@
+# ============================================================
+#                 Qarm_teach.py
+# ============================================================
+"""
+Enseñanza por demostración: se graba el brazo mientras el operador lo
+mueve (sliders de la GUI o teleoperación con la cámara) y la grabación se
+reduce a una ruta corta, compatible con RUTAS/.
+
+- TeachRecorder: buffer preasignado (t, j0..j3, gripper). record() tiene la
+  firma de TelemetryRing.record, así que lo llama el hilo del lazo en cada
+  período (QArmWrapper.start_recording) o cualquier lazo que escriba al
+  brazo (CAMERA/test.py). Sólo copia sobre memoria ya asignada; si el
+  buffer se llena deja de grabar y cuenta las muestras perdidas.
+- simplify(): Ramer-Douglas-Peucker en espacio articular. Se queda con
+  pocos puntos (no necesariamente el mínimo) tales que ninguna muestra
+  grabada se aparta más de tol_deg (distancia euclídea en grados, J1..J4)
+  del camino por los puntos que quedan; el gripper entra como otra
+  coordenada, escalada para que un cambio de gripper_tol cuente como tol_deg.
+- recording_route(): puntos que quedan -> arreglo Qarm_route.ROUTE_DTYPE.
+
+Cada tramo de una ruta es un MoveJ sincronizado, es decir una recta en
+espacio articular, así que con mezcla 0 el error de la ruta ejecutada
+respecto de la demostración está acotado por la tolerancia. Las pausas y
+los movimientos lentos de la demostración desaparecen: la ruta se ejecuta
+a la velocidad de los límites (route_trajectory) y sólo se detiene en los
+puntos que quedan. El campo "tiempo" de cada punto guarda el tiempo que
+tardó el operador en llegar a él (la ejecución anterior, con retardo fijo,
+reproduce así el ritmo original).
+
+Uso (desde un log de telemetría, ver Qarm_telemetry):
+    python Qarm_teach.py LOGDIR RUTAS/demostracion.json --tol 1.0
+"""
+
+import sys
+import numpy as np
+from Qarm_route import ROUTE_DTYPE, save_route
+
+
+# Tolerancias por defecto: grados en J1..J4 y unidades de consigna del gripper
+TOL_DEG = 1.0
+GRIPPER_TOL = 0.05
+
+
+class TeachRecorder:
+    """
+    Grabación preasignada de capacity muestras [t, j0..j3 (rad), gripper].
+
+    Las juntas son las medidas (measJointPosition), es decir lo que hizo el
+    brazo; el gripper es la consigna (lo que hay que volver a enviar), o el
+    medido si no hay consigna.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buffer = np.empty((self.capacity, 6), dtype=np.float64)
+        self.count = 0
+        self.dropped = 0
+
+    def record(self, t, cmd, measurement):
+        i = self.count
+        if i >= self.capacity:
+            self.dropped += 1
+            return
+        row = self.buffer[i]
+        row[0] = t
+        row[1:6] = measurement.position
+        if cmd is not None:
+            row[5] = cmd[4]
+        # el contador se publica después de escribir la fila
+        self.count = i + 1
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def duration(self):
+        n = self.count
+        return float(self.buffer[n - 1, 0] - self.buffer[0, 0]) if n > 1 else 0.0
+
+    def samples(self):
+        """(t desde la primera muestra (N,), q (N, 4) rad, gripper (N,)), copias."""
+        b = self.buffer[:self.count]
+        t = b[:, 0] - (b[0, 0] if len(b) else 0.0)
+        return t, b[:, 1:5].copy(), b[:, 5].copy()
+
+    def route(self, tol_deg=TOL_DEG, gripper_tol=GRIPPER_TOL):
+        """Ruta simplificada (ROUTE_DTYPE) de lo grabado hasta ahora."""
+        return recording_route(*self.samples(), tol_deg=tol_deg, gripper_tol=gripper_tol)
+
+
+# -------------------------
+# Simplificación
+# -------------------------
+def _segment_distance(p, a, b):
+    """Distancia euclídea de cada fila de p (M, D) al segmento a-b."""
+    u = b - a
+    d = p - a
+    uu = float(u @ u)
+    if uu > 0.0:
+        s = np.clip(d @ u / uu, 0.0, 1.0)
+        d = d - s[:, None] * u
+    return np.sqrt(np.einsum("ij,ij->i", d, d))
+
+
+def rdp(points, tol):
+    """
+    Ramer-Douglas-Peucker iterativo (sin recursión) sobre points (N, D).
+    Devuelve los índices ordenados de los puntos que quedan; el primero y
+    el último siempre quedan y ningún punto queda a más de tol de la
+    poligonal resultante.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        d = _segment_distance(points[a + 1:b], points[a], points[b])
+        k = int(np.argmax(d))
+        if d[k] > tol:
+            k += a + 1
+            keep[k] = True
+            stack.append((k, b))
+            stack.append((a, k))
+    return np.flatnonzero(keep)
+
+
+def _scaled(q, gripper, tol_deg, gripper_tol):
+    """Puntos (N, 5) en unidades de tolerancia: J1..J4 en tol_deg, gripper en gripper_tol."""
+    return np.column_stack((np.rad2deg(q) / tol_deg, gripper / gripper_tol))
+
+
+def simplify(q, gripper, tol_deg=TOL_DEG, gripper_tol=GRIPPER_TOL):
+    """Índices de las muestras que quedan de una grabación q (N, 4) rad, gripper (N,)."""
+    if len(q) < 3:
+        return np.arange(len(q))
+    return rdp(_scaled(q, gripper, tol_deg, gripper_tol), 1.0)
+
+
+def path_error(q, gripper, idx, tol_deg=TOL_DEG, gripper_tol=GRIPPER_TOL):
+    """
+    Mayor apartamiento de la grabación respecto de la poligonal por idx, en
+    las mismas unidades que la tolerancia (grados; el gripper escalado).
+    """
+    p = _scaled(q, gripper, tol_deg, gripper_tol) * tol_deg
+    err = 0.0
+    for a, b in zip(idx[:-1], idx[1:]):
+        if b - a > 1:
+            err = max(err, float(_segment_distance(p[a + 1:b], p[a], p[b]).max()))
+    return err
+
+
+def recording_route(t, q, gripper, tol_deg=TOL_DEG, gripper_tol=GRIPPER_TOL, idx=None):
+    """
+    Grabación -> ruta ROUTE_DTYPE con los puntos de simplify() (o los
+    índices idx ya calculados). "tiempo" de cada punto es lo que tardó la
+    demostración desde el punto anterior.
+    """
+    if not len(q):
+        raise ValueError("grabación vacía")
+    if idx is None:
+        idx = simplify(q, gripper, tol_deg, gripper_tol)
+    arr = np.zeros(len(idx), dtype=ROUTE_DTYPE)
+    arr["pos"] = np.rad2deg(q[idx])
+    arr["gripper"] = gripper[idx]
+    arr["tiempo"][1:] = np.diff(t[idx])
+    return arr
+
+
+def main():
+    import argparse
+    from Qarm_telemetry import TelemetryLog
+    parser = argparse.ArgumentParser(description="Ruta simplificada desde un log de telemetría del QArm")
+    parser.add_argument("log", help="directorio del log (TelemetryLogger)")
+    parser.add_argument("ruta", help="archivo de salida (.json como RUTAS/, .npy o .npz)")
+    parser.add_argument("--tol", type=float, default=TOL_DEG, help="tolerancia en J1..J4 (grados)")
+    parser.add_argument("--gripper-tol", type=float, default=GRIPPER_TOL, help="tolerancia del gripper")
+    parser.add_argument("--desde", type=float, help="inicio de la ventana (s desde el inicio del log)")
+    parser.add_argument("--hasta", type=float, help="fin de la ventana (s)")
+    args = parser.parse_args()
+
+    log = TelemetryLog(args.log)
+    t, pos = log.field("position", args.desde, args.hasta)
+    _, cmd = log.field("cmd", args.desde, args.hasta)
+    if not len(t):
+        print(f"{args.log}: no hay muestras en la ventana", file=sys.stderr)
+        sys.exit(1)
+    q = pos[:, 0:4].astype(np.float64)
+    gripper = np.where(np.isnan(cmd[:, 4]), pos[:, 4], cmd[:, 4]).astype(np.float64)
+    idx = simplify(q, gripper, args.tol, args.gripper_tol)
+    arr = recording_route(t - t[0], q, gripper, idx=idx)
+    save_route(args.ruta, arr)
+    print(f"{len(t)} muestras ({t[-1] - t[0]:.1f} s) -> {len(arr)} puntos en {args.ruta}, "
+          f"error máx {path_error(q, gripper, idx, args.tol, args.gripper_tol):.3f} deg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+# ============================================================
+#                 Qarm_telemetry.py
+# ============================================================
+"""
+Telemetría del QArm a la frecuencia del lazo de control.
+
+- TelemetryRing: buffer circular preasignado; record() copia una muestra
+  (tiempo, consigna y mediciones) sobre memoria preasignada. Lo llama el
+  hilo del lazo en cada período.
+- TelemetryLogger: hilo de fondo que vacía el anillo a disco en chunks .npy
+  memory-mapped (float32 salvo el tiempo), sin bloquear nunca al lazo: si el
+  escritor se atrasa más que la capacidad del anillo se pierden muestras y
+  se cuentan en `dropped`.
+- TelemetryLog: lector perezoso de un directorio de log; sólo mapea los
+  chunks y lee del disco lo que se pide (campo y ventana de tiempo).
+- minmax_decimate / MinMaxDecimator: reducen una ventana de muestras a
+  mín/máx por píxel para graficarla con un costo de dibujo fijo; el segundo
+  en forma incremental sobre el anillo (TelemetryPlot de la GUI).
+
+Formato de un log:
+    LOGDIR/meta.json            columnas, frecuencia, hora de inicio
+    LOGDIR/chunk_000000.npy     arreglo estructurado (t, cmd, position, ...)
+    LOGDIR/chunk_000001.npy     ...
+
+Uso:
+    python Qarm_telemetry.py LOGDIR     # resumen de un log
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+
+# Campos de cada muestra: (nombre, columnas en el anillo)
+FIELDS = (
+    ("t", 1),
+    ("cmd", 5),
+    ("position", 5),
+    ("speed", 5),
+    ("temperature", 5),
+    ("pwm", 5),
+    ("current", 5),
+)
+WIDTH = sum(n for _, n in FIELDS)
+
+# Tipo de los chunks en disco: tiempo en float64, el resto en float32
+CHUNK_DTYPE = np.dtype([
+    (name, np.float64) if name == "t" else (name, np.float32, (n,))
+    for name, n in FIELDS
+])
+
+_COLUMNS = {}
+_c = 0
+for _name, _n in FIELDS:
+    _COLUMNS[_name] = slice(_c, _c + _n) if _n > 1 else _c
+    _c += _n
+
+
+class TelemetryRing:
+    """Buffer circular (capacity x WIDTH) de muestras de telemetría."""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buffer = np.full((self.capacity, WIDTH), np.nan, dtype=np.float64)
+        self.head = 0           # muestras grabadas (total, no se reinicia)
+
+        # fila de armado con vistas fijas: record() no crea objetos nuevos
+        self._stage = np.zeros(WIDTH, dtype=np.float64)
+        self._stage_t = self._stage[0:1]
+        self._stage_cmd = self._stage[1:6]
+        self._stage_other = self._stage[6:26]
+        self._stage_analog = self._stage[26:31]
+
+    def record(self, t, cmd, measurement):
+        """
+        Graba una muestra. cmd: consigna (5,) o None; measurement: QArmMeasurement.
+        Sólo copias sobre el buffer preasignado.
+        """
+        self._stage_t[0] = t
+        if cmd is None:
+            self._stage_cmd.fill(np.nan)
+        else:
+            np.copyto(self._stage_cmd, cmd)
+        np.copyto(self._stage_other, measurement.other)
+        np.copyto(self._stage_analog, measurement.analog)
+        self.buffer[self.head % self.capacity] = self._stage
+        # el índice se publica después de escribir la fila
+        self.head += 1
+
+    def latest(self, n, name=None, head=None):
+        """
+        Últimas n muestras (copia), en orden cronológico. Con name sólo se
+        copian las columnas de ese campo; pasar el mismo head (self.head
+        leído una vez) a varias llamadas las deja alineadas. No toma locks:
+        lo puede llamar cualquier hilo mientras el lazo graba (la fila más
+        vieja puede salir pisada si el anillo da toda la vuelta durante la copia).
+        """
+        if head is None:
+            head = self.head
+        n = min(n, head, self.capacity)
+        cols = slice(None) if name is None else _COLUMNS[name]
+        stop = head % self.capacity
+        start = stop - n
+        if start >= 0:
+            return self.buffer[start:stop, cols].copy()
+        return np.concatenate((self.buffer[start:, cols], self.buffer[:stop, cols]))
+
+    @staticmethod
+    def column(rows, name):
+        """Vista de un campo (p. ej. "position") sobre filas del anillo."""
+        return rows[:, _COLUMNS[name]]
+
+
+class TelemetryLogger:
+    """
+    Escritor de fondo: vuelca un TelemetryRing a chunks .npy memory-mapped.
+
+    Parameters
+    ----------
+    directory : str
+        Directorio del log (se crea si no existe).
+    frequency : float
+        Frecuencia de muestreo (sólo informativa, va a meta.json).
+    capacity : int
+        Muestras en el anillo (margen ante atrasos del escritor).
+    chunk_rows : int
+        Muestras por archivo.
+    flush_period : float
+        Cada cuánto se despierta el escritor (s).
+    ring : TelemetryRing or None
+        Anillo ya grabado por el lazo (p. ej. el del monitor en vivo de
+        QArmWrapper); se vuelca desde la muestra actual. None crea uno propio.
+    """
+
+    def __init__(self, directory, frequency=500, capacity=None, chunk_rows=None, flush_period=0.5,
+                 ring=None):
+        self.directory = directory
+        self.frequency = float(frequency)
+        self.ring = ring or TelemetryRing(capacity or int(self.frequency * 30))
+        self.chunk_rows = int(chunk_rows or self.frequency * 60)
+        self.flush_period = float(flush_period)
+
+        self.tail = self.ring.head      # muestras ya volcadas a disco
+        self.dropped = 0        # muestras pisadas antes de volcarse
+        self.chunks = 0
+        self._chunk = None
+        self._chunk_fill = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, t, cmd, measurement):
+        self.ring.record(t, cmd, measurement)
+
+    # -------------------------
+    # Arranque / parada
+    # -------------------------
+    def start(self):
+        self.write_meta()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="QArmTelemetry", daemon=True)
+        self._thread.start()
+
+    def write_meta(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {
+            "fields": [[name, n] for name, n in FIELDS],
+            "frequency": self.frequency,
+            "chunk_rows": self.chunk_rows,
+            # origen de los tiempos (time.perf_counter) en hora de pared
+            "clock_origin": time.time() - time.perf_counter(),
+        }
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def stop(self):
+        """Vuelca lo pendiente y cierra el último chunk (recortado a su tamaño real)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._close_chunk()
+
+    # -------------------------
+    # Hilo escritor
+    # -------------------------
+    def _run(self):
+        while not self._stop.wait(self.flush_period):
+            self.flush()
+
+    def flush(self):
+        """Vuelca al chunk actual lo grabado desde el último volcado."""
+        head = self.ring.head
+        cap = self.ring.capacity
+        if head - self.tail > cap:
+            # el escritor se atrasó más que el anillo: esas muestras se perdieron
+            self.dropped += head - self.tail - cap
+            self.tail = head - cap
+
+        start = self.tail
+        while self.tail < head:
+            if self._chunk is None:
+                self._open_chunk()
+            i = self.tail % cap
+            n = min(head - self.tail, cap - i, self.chunk_rows - self._chunk_fill)
+            rows = self.ring.buffer[i:i + n]
+            dst = self._chunk[self._chunk_fill:self._chunk_fill + n]
+            for name, _ in FIELDS:
+                dst[name] = rows[:, _COLUMNS[name]]
+            self._chunk_fill += n
+            self.tail += n
+            if self._chunk_fill == self.chunk_rows:
+                self._close_chunk()
+
+        # filas que el lazo pisó mientras se copiaban: se cuentan como perdidas
+        overwritten = self.ring.head - cap - start
+        if overwritten > 0:
+            self.dropped += min(overwritten, head - start)
+
+    def _chunk_path(self, k):
+        return os.path.join(self.directory, f"chunk_{k:06d}.npy")
+
+    def _open_chunk(self):
+        self._chunk = np.lib.format.open_memmap(
+            self._chunk_path(self.chunks), mode="w+",
+            dtype=CHUNK_DTYPE, shape=(self.chunk_rows,)
+        )
+        self._chunk_fill = 0
+
+    def _close_chunk(self):
+        chunk = self._chunk
+        if chunk is None:
+            return
+        self._chunk = None
+        path = self._chunk_path(self.chunks)
+        self.chunks += 1
+        if self._chunk_fill == self.chunk_rows:
+            chunk.flush()
+            del chunk
+            return
+        # chunk incompleto: se reescribe sólo con las filas válidas
+        data = np.array(chunk[:self._chunk_fill])
+        del chunk
+        np.save(path, data)
+
+
+class TelemetryLog:
+    """
+    Lector perezoso de un log de TelemetryLogger.
+
+    Los chunks se abren con mmap_mode="r": abrir un log de varias horas no
+    lee los datos, y field() sólo toca los chunks de la ventana pedida.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.frequency = self.meta["frequency"]
+        self.paths = sorted(glob.glob(os.path.join(directory, "chunk_*.npy")))
+        self._chunks = [None] * len(self.paths)
+        self._bounds = None
+
+    def chunk(self, k):
+        if self._chunks[k] is None:
+            c = np.load(self.paths[k], mmap_mode="r")
+            if k == len(self.paths) - 1 and len(c) and c["t"][-1] == 0.0:
+                # log interrumpido: el último chunk quedó con filas sin escribir
+                c = c[:int(np.argmax(c["t"] == 0.0))]
+            self._chunks[k] = c
+        return self._chunks[k]
+
+    def __len__(self):
+        return sum(len(self.chunk(k)) for k in range(len(self.paths)))
+
+    def bounds(self):
+        """(t_inicio, t_fin) de cada chunk; sólo lee la primera y la última fila."""
+        if self._bounds is None:
+            b = []
+            for k in range(len(self.paths)):
+                t = self.chunk(k)["t"]
+                b.append((float(t[0]), float(t[-1])) if len(t) else (np.inf, -np.inf))
+            self._bounds = b
+        return self._bounds
+
+    @property
+    def t_start(self):
+        b = self.bounds()
+        return b[0][0] if b else 0.0
+
+    @property
+    def duration(self):
+        b = self.bounds()
+        return b[-1][1] - b[0][0] if b else 0.0
+
+    def wall_time(self, t):
+        """Convierte tiempos del log a hora de pared (epoch)."""
+        return self.meta["clock_origin"] + t
+
+    def field(self, name, start=None, stop=None):
+        """
+        Devuelve (t, valores) del campo `name` en la ventana [start, stop)
+        (segundos desde el inicio del log; None = sin límite).
+        """
+        t0 = self.t_start
+        lo = -np.inf if start is None else t0 + start
+        hi = np.inf if stop is None else t0 + stop
+        ts, vs = [], []
+        for k, (a, b) in enumerate(self.bounds()):
+            if b < lo or a >= hi:
+                continue
+            c = self.chunk(k)
+            t = c["t"]
+            i, j = np.searchsorted(t, [lo, hi])
+            ts.append(np.asarray(t[i:j]))
+            vs.append(np.asarray(c[name][i:j]))
+        if not ts:
+            return np.zeros(0), np.zeros((0,) + CHUNK_DTYPE[name].shape, dtype=np.float32)
+        return np.concatenate(ts) - t0, np.concatenate(vs)
+
+    def iter_chunks(self):
+        """Recorre el log chunk por chunk (memmaps de sólo lectura)."""
+        for k in range(len(self.paths)):
+            yield self.chunk(k)
+
+
+# -------------------------
+# Decimación para graficar
+# -------------------------
+def _reduce_bins(bins, y):
+    """Mín y máx de y (n, k) por tramo de bins iguales (bins no decreciente)."""
+    if not len(bins):
+        return bins, y[:0], y[:0]
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    return bins[starts], np.fmin.reduceat(y, starts, axis=0), np.fmax.reduceat(y, starts, axis=0)
+
+
+def _interleave(px, lo, hi):
+    x = np.repeat(px.astype(np.float64), 2)
+    yy = np.empty((2 * len(px), lo.shape[1]))
+    yy[0::2] = lo
+    yy[1::2] = hi
+    return x, yy
+
+
+def minmax_decimate(t, y, t0, t1, width):
+    """
+    Reduce muestras a lo sumo a 2 puntos por columna de píxeles: el mínimo y
+    el máximo de cada columna, así un pico de una sola muestra sigue
+    viéndose. El costo de dibujo queda fijo (<= 2 * width puntos por curva)
+    sea cual sea la frecuencia de muestreo.
+
+    Parameters
+    ----------
+    t : ndarray (n,)
+        Tiempos crecientes.
+    y : ndarray (n, k)
+        k curvas (p. ej. las 5 columnas de "position").
+    t0, t1 : float
+        Ventana de tiempo que ocupa el ancho del gráfico.
+    width : int
+        Ancho en píxeles.
+
+    Returns
+    -------
+    x : ndarray (m,)
+        Columna de píxel de cada punto (0..width-1), cada una repetida dos
+        veces (mín y luego máx).
+    yy : ndarray (m, k)
+        Mín y máx de cada curva en esa columna (los NaN, p. ej. muestras sin
+        consigna, se ignoran salvo que la columna entera sea NaN).
+    """
+    i0, i1 = np.searchsorted(t, (t0, t1))
+    if i1 <= i0:
+        return np.zeros(0), np.zeros((0, y.shape[1]))
+    px = ((t[i0:i1] - t0) * (width / (t1 - t0))).astype(np.int64)
+    np.clip(px, 0, width - 1, out=px)
+    return _interleave(*_reduce_bins(px, y[i0:i1]))
+
+
+class MinMaxDecimator:
+    """
+    minmax_decimate incremental sobre un TelemetryRing, para un gráfico en
+    vivo. Guarda el mín/máx de cada columna de píxel (bins de window/width
+    segundos alineados al tiempo absoluto) y en cada update() sólo reduce
+    las muestras que llegaron desde el anterior: el costo por redibujo
+    depende de frecuencia x período de redibujo, no del largo de la ventana.
+    """
+
+    def __init__(self, window, width):
+        self.window = float(window)
+        self.width = int(width)
+        self.dt = self.window / self.width
+        self.reset()
+
+    def reset(self, name=None):
+        self.name = name
+        self._head = None
+        self._bins = np.zeros(0, dtype=np.int64)
+        self._lo = self._hi = None
+
+    def update(self, ring, name):
+        """
+        Incorpora lo nuevo de ring (campo name; otro campo reinicia) y
+        devuelve (x, yy) como minmax_decimate, con la última columna a la derecha.
+        """
+        if name != self.name:
+            self.reset(name)
+        head = ring.head
+        if head == 0:
+            # el gráfico puede abrirse antes de la primera muestra
+            return np.zeros(0), np.zeros((0, 1))
+        n = min(head if self._head is None else head - self._head, ring.capacity)
+        self._head = head
+        if n > 0:
+            t = ring.latest(n, "t", head)
+            y = ring.latest(n, name, head)
+            if y.ndim == 1:
+                y = y[:, None]
+            bins, lo, hi = _reduce_bins(np.floor(t / self.dt).astype(np.int64), y)
+            if self._lo is not None:
+                if bins[0] == self._bins[-1]:
+                    # la última columna sigue abierta: se combina con lo nuevo
+                    lo[0] = np.fmin(lo[0], self._lo[-1])
+                    hi[0] = np.fmax(hi[0], self._hi[-1])
+                    keep = slice(0, -1)
+                else:
+                    keep = slice(None)
+                bins = np.concatenate((self._bins[keep], bins))
+                lo = np.concatenate((self._lo[keep], lo))
+                hi = np.concatenate((self._hi[keep], hi))
+            first = np.searchsorted(bins, bins[-1] - self.width + 1)
+            self._bins, self._lo, self._hi = bins[first:], lo[first:], hi[first:]
+        if self._lo is None:
+            return np.zeros(0), np.zeros((0, 1))
+        return _interleave(self._bins - (self._bins[-1] - self.width + 1), self._lo, self._hi)
+
+
+def summary(directory):
+    log = TelemetryLog(directory)
+    n = 0
+    err_max = np.zeros(5)
+    t_min = np.full(5, np.inf)
+    t_max = np.full(5, -np.inf)
+    # se recorre chunk por chunk: memoria acotada aun en logs de horas
+    for c in log.iter_chunks():
+        n += len(c)
+        err = np.abs(c["cmd"] - c["position"])
+        err_max = np.fmax(err_max, np.fmax.reduce(err, axis=0))
+        t_min = np.fmin(t_min, c["temperature"].min(axis=0))
+        t_max = np.fmax(t_max, c["temperature"].max(axis=0))
+
+    print(f"{directory}: {n} muestras, {log.duration:.1f} s, {len(log.paths)} chunks")
+    print(f"  inicio       {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(log.wall_time(log.t_start)))}")
+    print(f"  error máx    {np.rad2deg(err_max[0:4])} deg, gripper {err_max[4]:.3f}")
+    print(f"  temperatura  {t_min} -> {t_max} °C")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    np.set_printoptions(precision=2, suppress=True)
+    summary(sys.argv[1])
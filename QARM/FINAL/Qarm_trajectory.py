@@ -0,0 +1,546 @@
+# ============================================================
+#                 Qarm_trajectory.py
+# ============================================================
+"""
+Generación de trayectorias articulares (MoveJ) parametrizadas en el tiempo.
+
+Cada tramo entre dos puntos de la ruta usa un perfil trapezoidal
+sincronizado: todas las juntas comparten la misma ley normalizada s(t),
+q(t) = q0 + dq * s(t), con s: 0 -> 1. La duración es la mínima que respeta
+los límites de velocidad y aceleración de cada junta, así que las juntas
+arrancan y llegan juntas.
+
+Si el perfil no alcanza la velocidad máxima el tramo es triangular.
+Los cambios de gripper agregan un tiempo mínimo al tramo (GRIPPER_TIME).
+
+Mezcla en puntos de paso (blend): un tramo puede arrancar mientras el
+anterior todavía desacelera, superponiendo ambos perfiles. El solapamiento
+es blend * min(ta_anterior, ta_actual), con blend en [0, 1]; así el brazo
+pasa cerca del punto intermedio sin detenerse. Con ese solapamiento la
+velocidad de cada junta sigue acotada por su límite; en juntas que invierten
+el sentido la aceleración puede sumar hasta 2x amax durante la mezcla.
+Los puntos donde cambia el gripper (y los tramos de espera) son paradas
+exactas: nunca se mezclan.
+
+Los tramos se guardan como arreglos NumPy, de modo que tanto la
+construcción (add_moves) como el muestreo sobre una grilla de tiempos
+(sample_batch) y la verificación de límites (check_limits) son vectorizados.
+
+SampledTrajectory envuelve consignas ya calculadas sobre una grilla
+uniforme (p. ej. un MoveL cartesiano resuelto con IK por lotes) con la
+misma interfaz, así el lazo de control y el ejecutor las tratan igual.
+"""
+
+import bisect
+import numpy as np
+
+
+# Mismos valores que el perfil del QArm (j*_profile_velocity / acceleration)
+DEFAULT_VMAX = np.full(4, 1.5708)
+DEFAULT_AMAX = np.full(4, 1.0472)
+
+# Tiempo que se espera para que el gripper termine de abrir/cerrar (s)
+GRIPPER_TIME = 0.5
+
+
+def _normalized_profiles(dq, vmax, amax):
+    """
+    Perfiles trapezoidales de s: 0 -> 1 para N desplazamientos dq (N, 4).
+
+    Returns
+    -------
+    (T, ta, v) : arreglos (N,) con duración, tiempo de aceleración y
+                 velocidad pico de s. Los tramos sin movimiento dan 0.
+    """
+    dist = np.abs(dq)
+    moving = dist > 1e-12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Límites equivalentes sobre s (la junta más exigida manda)
+        vs = np.where(moving, vmax / dist, np.inf).min(axis=1)
+        as_ = np.where(moving, amax / dist, np.inf).min(axis=1)
+        still = ~moving.any(axis=1)
+        vs[still] = 1.0
+        as_[still] = 1.0
+
+        # triangular si no llega a vs
+        tri = vs * vs / as_ >= 1.0
+        ta = np.where(tri, np.sqrt(1.0 / as_), vs / as_)
+        T = np.where(tri, 2.0 * ta, ta + 1.0 / vs)
+        v = np.where(tri, as_ * ta, vs)
+
+    T[still] = 0.0
+    ta[still] = 0.0
+    v[still] = 0.0
+    return T, ta, v
+
+
+def trapezoid_batch(tau, T, ta, v):
+    """
+    (s, ds, dds) de perfiles trapezoidales s: 0 -> 1 en los instantes tau
+    (desde el inicio de cada perfil). T, ta, v: escalares o arreglos como
+    los de _normalized_profiles.
+    """
+    tau = np.asarray(tau, dtype=np.float64)
+    T, ta, v = (np.broadcast_to(np.asarray(x, dtype=np.float64), tau.shape) for x in (T, ta, v))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = np.where(ta > 0.0, v / ta, 0.0)
+    r = T - tau
+
+    accel = tau < ta
+    cruise = ~accel & (tau <= T - ta)
+    s = np.where(accel, 0.5 * a * tau * tau,
+                 np.where(cruise, 0.5 * a * ta * ta + v * (tau - ta),
+                          1.0 - 0.5 * a * r * r))
+    ds = np.where(accel, a * tau, np.where(cruise, v, a * r))
+    dds = np.where(accel, a, np.where(cruise, 0.0, -a))
+
+    # antes de arrancar / tramos de espera / después del final del tramo
+    idle = (tau <= 0.0) | (v == 0.0)
+    done = (tau >= T) | (T <= 0.0)
+    s[idle] = 0.0
+    s[done] = 1.0
+    ds[idle | done] = 0.0
+    dds[idle | done] = 0.0
+    return s, ds, dds
+
+
+def check_limits(q, q_min, q_max):
+    """
+    Verificación vectorizada de límites articulares.
+
+    Parameters
+    ----------
+    q : (M, 4) posiciones (rad)
+    q_min, q_max : (4,) límites (rad)
+
+    Returns
+    -------
+    (bad, first) : máscara (M,) de muestras fuera de límites e índice de la
+                   primera (None si no hay).
+    """
+    bad = ((q < q_min) | (q > q_max)).any(axis=1)
+    idx = np.flatnonzero(bad)
+    return bad, (int(idx[0]) if idx.size else None)
+
+
+class _Segments:
+    """Arreglos contiguos de todos los tramos (se arma al muestrear)."""
+
+    __slots__ = ("t_start", "t_start_list", "duration", "t_acc", "v_peak",
+                 "q0", "dq", "gripper")
+
+    def __init__(self, blocks):
+        cols = list(zip(*blocks))
+        self.t_start = np.concatenate(cols[0])
+        self.duration = np.concatenate(cols[1])
+        self.t_acc = np.concatenate(cols[2])
+        self.v_peak = np.concatenate(cols[3])
+        self.q0 = np.concatenate(cols[4])
+        self.dq = np.concatenate(cols[5])
+        self.gripper = np.concatenate(cols[6])
+        # copia en lista para bisect desde el hilo del lazo (sin NumPy)
+        self.t_start_list = self.t_start.tolist()
+
+
+class Trajectory:
+    """
+    Trayectoria articular por tramos.
+
+    Por tramo se guarda: t_start, duration, t_acc, v_peak, q0 (4), dq (4), gripper.
+    """
+
+    def __init__(self, q_start, gripper_start=0.5):
+        self.q_start = np.array(q_start, dtype=np.float64).reshape(4)
+        self.gripper_start = float(gripper_start)
+        self._blocks = []
+        self._segments = None
+        self._n = 0
+        self._q_end = self.q_start.copy()
+        self._gripper_end = self.gripper_start
+        self._last_ta = 0.0
+        self._tmp = np.zeros(4)
+        self.duration_total = 0.0
+
+    # -------------------------
+    # Construcción
+    # -------------------------
+    def add_moves(self, q_targets, grippers, vmax=DEFAULT_VMAX, amax=DEFAULT_AMAX,
+                  min_duration=0.0, blend=0.0):
+        """
+        Agrega N tramos MoveJ consecutivos en un solo paso vectorizado.
+
+        Parameters
+        ----------
+        q_targets : (N, 4) puntos destino (rad)
+        grippers : (N,) consigna de gripper de cada tramo
+        min_duration : escalar o (N,) duración mínima de cada tramo
+        blend : fracción [0, 1] del tiempo de rampa que se solapa con el
+                tramo anterior (0 = parada exacta en cada punto)
+
+        Returns
+        -------
+        Duraciones (N,) de los tramos agregados.
+        """
+        Q = np.array(q_targets, dtype=np.float64).reshape(-1, 4)
+        n = len(Q)
+        if n == 0:
+            return np.zeros(0)
+        G = np.broadcast_to(np.asarray(grippers, dtype=np.float64), (n,)).copy()
+
+        q0 = np.empty_like(Q)
+        q0[0] = self._q_end
+        q0[1:] = Q[:-1]
+        dq = Q - q0
+        T, ta, v = _normalized_profiles(dq, np.asarray(vmax), np.asarray(amax))
+
+        # Se estiran los perfiles más cortos que min_duration manteniendo su forma
+        t_min = np.broadcast_to(np.asarray(min_duration, dtype=np.float64), (n,))
+        short = T < t_min
+        if short.any():
+            k = np.ones(n)
+            stretch = short & (T > 0.0)
+            k[stretch] = t_min[stretch] / T[stretch]
+            ta = ta * k
+            v = v / k
+            T = np.where(short, t_min, T)
+
+        # Solapamiento con el tramo anterior (sólo si ambos se mueven y el
+        # gripper no cambia en el punto de paso)
+        overlap = np.zeros(n)
+        blend = min(max(float(blend), 0.0), 1.0)
+        if blend > 0.0:
+            ta_prev = np.empty(n)
+            ta_prev[0] = self._last_ta
+            ta_prev[1:] = ta[:-1]
+            g_prev = np.empty(n)
+            g_prev[0] = self._gripper_end
+            g_prev[1:] = G[:-1]
+            moving = v > 0.0
+            moving_prev = ta_prev > 0.0
+            if n > 1:
+                moving_prev[1:] &= moving[:-1]
+            ok = moving & moving_prev & (G == g_prev)
+            overlap[ok] = blend * np.minimum(ta_prev[ok], ta[ok])
+
+        t_start = self.duration_total + np.cumsum(T) - T - np.cumsum(overlap)
+        self._blocks.append((t_start, T, ta, v, q0, dq, G))
+        self._segments = None
+        self._n += n
+
+        self.duration_total = float(t_start[-1] + T[-1])
+        self._q_end = Q[-1].copy()
+        self._gripper_end = float(G[-1])
+        self._last_ta = float(ta[-1]) if v[-1] > 0.0 else 0.0
+        return T
+
+    def add_move(self, q_target, gripper, vmax=DEFAULT_VMAX, amax=DEFAULT_AMAX,
+                 min_duration=0.0, blend=0.0):
+        """Agrega un tramo MoveJ desde el final actual hasta q_target (rad)."""
+        return float(self.add_moves([q_target], [gripper], vmax, amax, min_duration, blend)[0])
+
+    def prepare(self):
+        """Arma los arreglos contiguos de tramos (llamar antes de entregar al lazo)."""
+        if self._segments is None and self._blocks:
+            seg = _Segments(self._blocks)
+            self._blocks = [(seg.t_start, seg.duration, seg.t_acc, seg.v_peak,
+                             seg.q0, seg.dq, seg.gripper)]
+            self._segments = seg
+        return self._segments
+
+    @property
+    def n_segments(self):
+        return self._n
+
+    @property
+    def q_end(self):
+        return self._q_end.copy()
+
+    @property
+    def gripper_end(self):
+        return self._gripper_end
+
+    # -------------------------
+    # Muestreo puntual
+    # -------------------------
+    @staticmethod
+    def _segment_state(seg, k, tau):
+        """(s, ds, dds) del tramo k a tau segundos de su inicio."""
+        T = seg.duration[k]
+        if T <= 0.0 or tau >= T:
+            return 1.0, 0.0, 0.0
+        v = seg.v_peak[k]
+        if tau <= 0.0 or v == 0.0:
+            # antes de arrancar, o tramo de espera (dq = 0)
+            return 0.0, 0.0, 0.0
+        ta = seg.t_acc[k]
+        a = v / ta
+        if tau < ta:
+            return 0.5 * a * tau * tau, a * tau, a
+        if tau <= T - ta:
+            return 0.5 * a * ta * ta + v * (tau - ta), v, 0.0
+        r = T - tau
+        return 1.0 - 0.5 * a * r * r, a * r, -a
+
+    def _segment_index(self, seg, t):
+        k = bisect.bisect_right(seg.t_start_list, t) - 1
+        return min(max(k, 0), self._n - 1)
+
+    def segment_at(self, t):
+        """Índice del último tramo que ya arrancó en el instante t."""
+        seg = self.prepare()
+        return 0 if seg is None else self._segment_index(seg, t)
+
+    def sample(self, t):
+        """
+        Estado en el instante t (s desde el inicio).
+
+        Returns
+        -------
+        (q, qd, qdd, gripper)
+        """
+        seg = self.prepare()
+        if seg is None:
+            z = np.zeros(4)
+            return self.q_start.copy(), z, z.copy(), self.gripper_start
+        k = self._segment_index(seg, t)
+        s, ds, dds = self._segment_state(seg, k, t - seg.t_start_list[k])
+        dq = seg.dq[k]
+        q = seg.q0[k] + dq * s
+        qd = dq * ds
+        qdd = dq * dds
+        if k > 0:
+            # cola del tramo anterior si todavía se está mezclando
+            sp, dsp, ddsp = self._segment_state(seg, k - 1, t - seg.t_start_list[k - 1])
+            if sp < 1.0:
+                dqp = seg.dq[k - 1]
+                q -= dqp * (1.0 - sp)
+                qd += dqp * dsp
+                qdd += dqp * ddsp
+        return q, qd, qdd, float(seg.gripper[k])
+
+    def sample_into(self, t, cmd):
+        """
+        Escribe [q0..q3, gripper] en cmd (5,) sin crear arreglos nuevos.
+        Pensado para el hilo del lazo de control (llamar prepare() antes).
+        """
+        seg = self._segments if self._segments is not None else self.prepare()
+        if seg is None:
+            cmd[0:4] = self.q_start
+            cmd[4] = self.gripper_start
+            return
+        k = self._segment_index(seg, t)
+        s = self._segment_state(seg, k, t - seg.t_start_list[k])[0]
+        q = cmd[0:4]
+        np.multiply(seg.dq[k], s, out=q)
+        np.add(q, seg.q0[k], out=q)
+        if k > 0:
+            sp = self._segment_state(seg, k - 1, t - seg.t_start_list[k - 1])[0]
+            if sp < 1.0:
+                # q -= dq_prev * (1 - sp), sin temporales
+                np.multiply(seg.dq[k - 1], 1.0 - sp, out=self._tmp)
+                np.subtract(q, self._tmp, out=q)
+        cmd[4] = seg.gripper[k]
+
+    # -------------------------
+    # Muestreo vectorizado
+    # -------------------------
+    def sample_batch(self, t):
+        """
+        Evalúa la trayectoria sobre una grilla de tiempos en una sola llamada.
+
+        Parameters
+        ----------
+        t : (M,) instantes (s desde el inicio)
+
+        Returns
+        -------
+        (q, qd, qdd, gripper) : (M, 4), (M, 4), (M, 4), (M,)
+        """
+        t = np.asarray(t, dtype=np.float64)
+        seg = self.prepare()
+        if seg is None:
+            m = t.shape[0]
+            return (np.tile(self.q_start, (m, 1)), np.zeros((m, 4)),
+                    np.zeros((m, 4)), np.full(m, self.gripper_start))
+
+        k = np.searchsorted(seg.t_start, t, side="right") - 1
+        np.clip(k, 0, self._n - 1, out=k)
+
+        s, ds, dds = self._profile_batch(seg, k, t)
+        dq = seg.dq[k]
+        q = seg.q0[k] + dq * s[:, None]
+        qd = dq * ds[:, None]
+        qdd = dq * dds[:, None]
+
+        # cola del tramo anterior en las zonas de mezcla
+        blending = k > 0
+        if self._n > 1 and blending.any():
+            kp = np.maximum(k - 1, 0)
+            sp, dsp, ddsp = self._profile_batch(seg, kp, t)
+            sp[~blending] = 1.0
+            dsp[~blending] = 0.0
+            ddsp[~blending] = 0.0
+            dqp = seg.dq[kp]
+            q -= dqp * (1.0 - sp)[:, None]
+            qd += dqp * dsp[:, None]
+            qdd += dqp * ddsp[:, None]
+
+        return q, qd, qdd, seg.gripper[k]
+
+    @staticmethod
+    def _profile_batch(seg, k, t):
+        """(s, ds, dds) vectorizados de los tramos k en los instantes t."""
+        return trapezoid_batch(t - seg.t_start[k], seg.duration[k], seg.t_acc[k], seg.v_peak[k])
+
+    def time_grid(self, rate):
+        """Grilla de tiempos a `rate` Hz que cubre toda la trayectoria."""
+        return np.arange(0.0, self.duration_total + 0.5 / rate, 1.0 / rate)
+
+
+class SampledTrajectory:
+    """
+    Trayectoria precalculada: consignas q (M, 4) y gripper (M,) en una
+    grilla uniforme a `rate` Hz, desde t = 0. Entre muestras se interpola
+    linealmente; después de la última se mantiene el último punto.
+
+    segment_starts : índices de muestra donde empieza cada tramo lógico
+    (para el progreso del ejecutor); por defecto un único tramo.
+    """
+
+    def __init__(self, q, gripper, rate, segment_starts=(0,)):
+        self.q = np.ascontiguousarray(q, dtype=np.float64).reshape(-1, 4)
+        self.gripper = np.broadcast_to(
+            np.asarray(gripper, dtype=np.float64), (len(self.q),)).copy()
+        self.rate = float(rate)
+        self.q_start = self.q[0].copy()
+        self.gripper_start = float(self.gripper[0])
+        self.duration_total = (len(self.q) - 1) / self.rate
+        self._t_starts = [i / self.rate for i in segment_starts]
+        self._last = len(self.q) - 1
+
+    def prepare(self):
+        return self
+
+    @property
+    def n_segments(self):
+        return len(self._t_starts)
+
+    @property
+    def q_end(self):
+        return self.q[-1].copy()
+
+    @property
+    def gripper_end(self):
+        return float(self.gripper[-1])
+
+    def segment_at(self, t):
+        return max(bisect.bisect_right(self._t_starts, t) - 1, 0)
+
+    def _index(self, t):
+        x = t * self.rate
+        if x <= 0.0:
+            return 0, 0.0
+        i = int(x)
+        if i >= self._last:
+            return self._last, 0.0
+        return i, x - i
+
+    def sample(self, t):
+        i, f = self._index(t)
+        j = min(i + 1, self._last)
+        q = self.q[i] + (self.q[j] - self.q[i]) * f
+        qd = (self.q[j] - self.q[i]) * self.rate if j > i else np.zeros(4)
+        return q, qd, np.zeros(4), float(self.gripper[i])
+
+    def sample_into(self, t, cmd):
+        """Escribe [q0..q3, gripper] en cmd (5,) sin crear arreglos nuevos."""
+        i, f = self._index(t)
+        q = cmd[0:4]
+        if f == 0.0:
+            q[:] = self.q[i]
+        else:
+            # q = q[i] + (q[i+1] - q[i]) * f
+            np.subtract(self.q[i + 1], self.q[i], out=q)
+            np.multiply(q, f, out=q)
+            np.add(q, self.q[i], out=q)
+        cmd[4] = self.gripper[i]
+
+    def sample_batch(self, t):
+        """(q, qd, qdd, gripper) sobre una grilla de tiempos (velocidad y aceleración por diferencias)."""
+        x = np.clip(np.asarray(t, dtype=np.float64) * self.rate, 0.0, self._last)
+        i = np.minimum(x.astype(np.int64), max(self._last - 1, 0))
+        j = np.minimum(i + 1, self._last)
+        f = (x - i)[:, None]
+        q = self.q[i] + (self.q[j] - self.q[i]) * f
+        qd_s = np.gradient(self.q, 1.0 / self.rate, axis=0) if self._last > 0 else np.zeros_like(self.q)
+        qdd_s = np.gradient(qd_s, 1.0 / self.rate, axis=0) if self._last > 0 else np.zeros_like(self.q)
+        k = np.rint(x).astype(np.int64)
+        return q, qd_s[k], qdd_s[k], self.gripper[k]
+
+    def time_grid(self, rate):
+        return np.arange(0.0, self.duration_total + 0.5 / rate, 1.0 / rate)
+
+
+# -------------------------
+# Rutas (lista de dicts de la GUI / RUTAS/*.json, o arreglo
+# Qarm_route.ROUTE_DTYPE de un archivo binario)
+# -------------------------
+def _is_route_array(ruta):
+    return getattr(getattr(ruta, "dtype", None), "names", None) is not None
+
+
+def route_arrays(ruta):
+    """(pos_rad (N, 4), gripper (N,)) de una ruta (lista de dicts o arreglo estructurado)."""
+    if _is_route_array(ruta):
+        return np.deg2rad(ruta["pos"]), np.array(ruta["gripper"], dtype=np.float64)
+    pos = np.deg2rad(np.array([p["pos"] for p in ruta], dtype=np.float64).reshape(-1, 4))
+    grip = np.array([p["gripper"] for p in ruta], dtype=np.float64)
+    return pos, grip
+
+
+def route_trajectory(ruta, q_start=None, gripper_start=None, ciclos=1,
+                     vmax=DEFAULT_VMAX, amax=DEFAULT_AMAX, gripper_time=GRIPPER_TIME,
+                     blend=0.0):
+    """
+    Convierte una ruta [{"pos": [deg x4], "gripper": g, "tiempo": s}, ...]
+    en una Trajectory tiempo-óptima.
+
+    Si se da q_start (rad), la trayectoria arranca ahí y primero va al
+    punto 0 de la ruta. Cada ciclo recorre los puntos 0..N-1 en orden.
+    El campo "tiempo" no se usa: la duración sale de los límites.
+    Con blend > 0 los puntos intermedios se pasan sin detenerse (salvo
+    donde cambia el gripper).
+    """
+    if not len(ruta):
+        raise ValueError("Ruta vacía.")
+
+    pos, grip = route_arrays(ruta)
+    if q_start is None:
+        q_start = pos[0]
+    if gripper_start is None:
+        gripper_start = grip[0]
+
+    ciclos = max(1, int(ciclos))
+    Q = np.tile(pos, (ciclos, 1))
+    G = np.tile(grip, ciclos)
+    prev = np.empty_like(G)
+    prev[0] = gripper_start
+    prev[1:] = G[:-1]
+    t_min = np.where(G != prev, gripper_time, 0.0)
+
+    traj = Trajectory(q_start, gripper_start)
+    traj.add_moves(Q, G, vmax, amax, t_min, blend)
+    traj.prepare()
+    return traj
+
+
+def fixed_delay_cycle_time(ruta):
+    """Duración de un ciclo con la ejecución anterior (retardo fijo por punto)."""
+    if _is_route_array(ruta):
+        return float(ruta["tiempo"][1:].sum())
+    return float(sum(p["tiempo"] for p in ruta[1:]))
+
+
+def optimal_cycle_time(ruta, **kwargs):
+    """Duración de un ciclo (del punto 0 al último) con la trayectoria tiempo-óptima."""
+    return route_trajectory(ruta, ciclos=1, **kwargs).duration_total
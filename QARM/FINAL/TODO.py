@@ -2,10 +2,13 @@
 #                T0DO.py
 # ============================================================
 
+import Qarm_startup as startup
 import tkinter as tk
 from tkinter import messagebox
-from Graphic_interface import QArmGUI
-from Qarm_controller import QArmWrapper
+
+# Mientras el usuario elige el modo se cargan en segundo plano la GUI, el
+# controlador (numpy, simulador, ...) y los bindings de Quanser
+pre = startup.BackgroundImport("Graphic_interface", "Qarm_controller", "quanser.hardware")
 
 
 def ask_mode_gui():
@@ -27,15 +30,22 @@ def ask_mode_gui():
         popup.destroy()
         root.destroy()
 
+    def elegir_emulacion():
+        nonlocal modo
+        modo = "emulacion"
+        popup.destroy()
+        root.destroy()
+
     popup = tk.Toplevel()
     popup.title("Seleccionar modo")
-    popup.geometry("280x150")
+    popup.geometry("280x185")
     popup.resizable(False, False)
 
     tk.Label(popup, text="Selecciona el modo de operación:", font=("Arial", 11)).pack(padx=20, pady=12)
 
     tk.Button(popup, text="Simulación", width=18, command=elegir_simulacion).pack(pady=4)
     tk.Button(popup, text="Físico", width=18, command=elegir_fisico).pack(pady=4)
+    tk.Button(popup, text="Emulación (sin hardware)", width=18, command=elegir_emulacion).pack(pady=4)
 
     popup.protocol("WM_DELETE_WINDOW", lambda: root.destroy())
     root.mainloop()
@@ -44,15 +54,24 @@ def ask_mode_gui():
 
 
 def main():
-    modo = ask_mode_gui()
+    modo = startup.ask_mode(ask_mode_gui)
     if modo is None:
         print("No se seleccionó modo. Saliendo...")
         return
 
+    # ya cargados en segundo plano (si todavía no terminaron, el import espera)
+    from Graphic_interface import QArmGUI
+    from Qarm_controller import QArmWrapper
+    startup.mark("módulos cargados")
+
     brazo = QArmWrapper(modo=modo)
+    brazo.start_loop(frequency=500)
+    startup.mark("lazo de control")
 
     root = tk.Tk()
     app = QArmGUI(root, brazo)
+    # primer comando: la GUI ya está en pantalla y acepta consignas
+    root.after_idle(startup.first_command)
 
     try:
         root.mainloop()
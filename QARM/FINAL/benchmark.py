@@ -0,0 +1,1027 @@
+# ============================================================
+#                 benchmark.py
+# ============================================================
+"""
+Microbenchmarks del stack de control del QArm.
+
+Uso:
+    python benchmark.py read      # camino de lectura (read_std)
+    python benchmark.py readtask  # lectura por reader task (readMode=1) contra el QArm emulado
+    python benchmark.py write     # camino de escritura (write_position)
+    python benchmark.py loop      # lazo de control contra el QArm emulado
+    python benchmark.py route     # tiempo de ciclo de RUTAS/*.json
+    python benchmark.py sample    # muestreo de trayectorias largas (10k puntos)
+    python benchmark.py estop     # latencia botón -> primer HOME durante una ruta
+    python benchmark.py stream    # lazo (una escritura por período) vs writer task por bloques
+    python benchmark.py telemetry # registro a la frecuencia del lazo, escritor y lector de logs
+    python benchmark.py movel     # MoveL: IK por lotes de la línea y desvío ejecutado
+    python benchmark.py startup   # arranque de TODO.py: imports y time-to-first-command
+    python benchmark.py slider    # arrastre de un slider: consignas/s y respuesta de la GUI
+    python benchmark.py plot      # gráfico de telemetría: costo por redibujo vs frecuencia de muestreo
+    python benchmark.py routefile # rutas densas: JSON vs binario (.npy/.npz), carga y memoria
+    python benchmark.py routeedit # edición de una ruta de 10k puntos en la GUI y conversión al ejecutar
+    python benchmark.py teach     # enseñanza por demostración: grabación, simplificación y ejecución
+
+read/write comparan la implementación actual contra la anterior ("legacy")
+e informan llamadas por segundo y memoria asignada por llamada.
+Todo corre sin hardware ni QLabs (Qarm_sim.SimulatedHIL).
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import Qarm_lib as q
+import Qarm_startup
+from Qarm_cartesian import line_samples, movel, path_deviation, solve_line
+from Qarm_controller import QArmWrapper
+from Qarm_executor import RouteExecutor
+from Qarm_route import ROUTE_DTYPE, iter_route, open_route, save_route, to_array, to_list
+from Qarm_sim import SimulatedHIL
+from Qarm_teach import TeachRecorder, path_error, recording_route, simplify
+from Qarm_telemetry import MinMaxDecimator, TelemetryLogger, TelemetryLog, TelemetryRing, minmax_decimate
+from Qarm_trajectory import Trajectory, route_arrays, route_trajectory, fixed_delay_cycle_time, optimal_cycle_time
+
+RUTAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RUTAS")
+
+
+class _NullCard:
+    """Tarjeta que no hace IO: aísla el costo Python del camino de datos."""
+
+    def open(self, *args):
+        pass
+
+    def set_card_specific_options(self, *args):
+        pass
+
+    def read(self, *args):
+        pass
+
+    def write(self, *args):
+        pass
+
+    def task_read(self, *args):
+        pass
+
+    def is_valid(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def _make_arm():
+    return q.QArm(hardware=0, readMode=0, card=_NullCard())
+
+
+def _make_wrapper():
+    wrapper = QArmWrapper(modo="emulacion")
+    wrapper.brazo.card = _NullCard()
+    return wrapper
+
+
+def _read_std_legacy(arm):
+    # Camino anterior: una copia nueva por cada arreglo de medición
+    arm.card.read(
+        arm.READ_ANALOG_CHANNELS, len(arm.READ_ANALOG_CHANNELS),
+        None, 0,
+        None, 0,
+        arm.READ_OTHER_CHANNELS, len(arm.READ_OTHER_CHANNELS),
+        arm.readAnalogBuffer,
+        None,
+        None,
+        arm.readOtherBuffer
+    )
+    rb = arm.readOtherBuffer
+    arm.measJointCurrent = arm.readAnalogBuffer.copy()
+    arm.measJointPosition = rb[0:5].copy()
+    arm.measJointSpeed = rb[5:10].copy()
+    arm.measJointTemperature = rb[10:15].copy()
+    arm.measJointPWM = rb[15:20].copy()
+
+
+def _write_position_legacy(wrapper, pos_rad, gripper_val):
+    # Camino anterior: rad->deg->clip->rad por junta en el wrapper, luego
+    # asarray/reshape, copia elemento a elemento y slices en QArm.write_position
+    pos_deg = np.rad2deg(pos_rad)
+    for i, (low, high) in enumerate(wrapper.JOINT_LIMITS):
+        pos_deg[i] = np.clip(pos_deg[i], low, high)
+    pos_rad_clip = np.deg2rad(pos_deg)
+    g = float(np.clip(float(gripper_val), 0.1, 0.9))
+
+    arm = wrapper.brazo
+    phiCMD = np.asarray(pos_rad_clip, dtype=float).reshape(4,)
+    gpr_val = float(np.clip(g, 0.1, 0.9))
+    for i in range(4):
+        arm.writeOtherBuffer[i] = float(phiCMD[i])
+    arm.writeOtherBuffer[4] = gpr_val
+    arm.card.write(
+        None, 0,
+        None, 0,
+        None, 0,
+        arm.WRITE_OTHER_CHANNELS[0:5], 5,
+        None,
+        None,
+        None,
+        arm.writeOtherBuffer[0:5]
+    )
+
+
+# -------------------------
+# Helpers de medición
+# -------------------------
+def _calls_per_second(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - t0)
+
+
+def _bytes_per_call(fn, n=1000, _calibrate=True):
+    """
+    Bytes asignados (pico transitorio) por llamada, medidos con tracemalloc.
+    Se descuenta el costo del propio harness (una función vacía).
+    """
+    overhead = _bytes_per_call(lambda: None, n, False) if _calibrate else 0.0
+    fn()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        peak_total = 0
+        for _ in range(n):
+            tracemalloc.reset_peak()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - base
+    finally:
+        tracemalloc.stop()
+    return max(0.0, peak_total / n - overhead)
+
+
+def _report(name, fn, n):
+    cps = _calls_per_second(fn, n)
+    bpc = _bytes_per_call(fn)
+    print(f"  {name:<24} {cps:>12,.0f} llamadas/s   {bpc:>8.1f} B/llamada")
+
+
+# -------------------------
+# Benchmarks
+# -------------------------
+def bench_read(args):
+    n = args.n
+    arm = _make_arm()
+    print("read_std:")
+    _report("legacy (copias)", lambda: _read_std_legacy(arm), n)
+    # _read_std_legacy reemplaza las vistas: se recrea el brazo
+    arm = _make_arm()
+    _report("actual (in-place)", arm.read_std, n)
+    snap = arm.snapshot()
+    _report("snapshot(out=...)", lambda: arm.snapshot(snap), n)
+
+
+def bench_readtask(args):
+    """
+    readMode=1 contra SimulatedHIL: QArm crea y arranca el reader task
+    (task_create_reader / task_set_buffer_overflow_mode / task_start) y
+    read_std() lee con task_read, que bloquea hasta cada muestra del reloj
+    del task. Informa lecturas/s y el período logrado durante args.duration s.
+    """
+    arm = q.QArm(hardware=0, readMode=1, frequency=int(args.rate), card=SimulatedHIL())
+    if not arm.status:
+        print("readtask: el QArm no se inicializó")
+        return
+    try:
+        arm.write_position_fast(np.array([0.5, -0.2, 0.3, 0.0, 0.5]))
+        t = []
+        t_end = time.perf_counter() + args.duration
+        while time.perf_counter() < t_end:
+            arm.read_std()
+            t.append(time.perf_counter())
+        dt = np.diff(t)
+        print(f"reader task a {args.rate:.0f} Hz: {len(t)} lecturas en {args.duration:.1f} s "
+              f"({len(t)/args.duration:.0f}/s), período medio {dt.mean()*1e3:.3f} ms, "
+              f"máx {dt.max()*1e3:.3f} ms, posición {np.rad2deg(arm.measJointPosition[0:4])} deg")
+    finally:
+        arm.terminate()
+
+
+def bench_write(args):
+    n = args.n
+    wrapper = _make_wrapper()
+    pos = np.deg2rad([10.0, -20.0, 30.0, 200.0])
+    cmd = np.array([*pos, 0.95], dtype=np.float64)
+    print("write_position:")
+    _report("legacy (loops/temps)", lambda: _write_position_legacy(wrapper, pos, 0.95), n)
+    _report("QArmWrapper (shim)", lambda: wrapper.write_position(pos, 0.95), n)
+    _report("write_position_fast", lambda: wrapper.write_command(cmd), n)
+
+
+def bench_loop(args, post_rate=60.0):
+    """
+    Corre el lazo de control contra el QArm emulado mientras el hilo
+    principal publica consignas (como lo haría la GUI) y mide período,
+    jitter, overruns y la latencia consigna -> escritura.
+    """
+    rate, duration = args.rate, args.duration
+    wrapper = QArmWrapper(modo="emulacion")
+    brazo = wrapper.brazo
+
+    posted = {}
+    latencies = []
+    last = [None]
+
+    def write(cmd):
+        if cmd is not last[0]:
+            last[0] = cmd
+            t_post = posted.pop(id(cmd), None)
+            if t_post is not None:
+                latencies.append(time.perf_counter() - t_post)
+        return brazo.write_position_fast(cmd)
+
+    wrapper.start_loop(rate)
+    wrapper.loop.write_fn = write
+
+    stop = threading.Event()
+
+    def gui_load():
+        # carga de CPU en otro hilo, similar a redibujos de la GUI
+        while not stop.is_set():
+            sum(i * i for i in range(2000))
+            time.sleep(0.001)
+
+    load = threading.Thread(target=gui_load, daemon=True)
+    load.start()
+
+    t_end = time.perf_counter() + duration
+    k = 0
+    while time.perf_counter() < t_end:
+        pos = np.deg2rad([30.0 * np.sin(0.5 * k / post_rate), 10.0, 0.0, 0.0])
+        wrapper.loop.post(pos, 0.5)
+        posted[id(wrapper.loop.setpoint)] = time.perf_counter()
+        k += 1
+        time.sleep(1.0 / post_rate)
+
+    stop.set()
+    stats = wrapper.stop_loop()
+    wrapper.terminate()
+
+    lat = np.array(latencies) * 1e3
+    print(f"lazo de control a {rate:.0f} Hz durante {duration:.1f} s:")
+    print(f"  ciclos             {stats['cycles']}")
+    print(f"  período medio      {stats['period_mean']*1e3:.4f} ms (objetivo {1e3/rate:.4f} ms)")
+    print(f"  jitter std / máx   {stats['jitter_std']*1e6:.1f} / {stats['jitter_max']*1e6:.1f} us")
+    print(f"  overruns           {stats['overruns']}")
+    if lat.size:
+        print(f"  latencia consigna  media {lat.mean():.3f} ms, p99 {np.percentile(lat, 99):.3f} ms")
+
+
+def _load_routes(paths):
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(RUTAS_DIR, "*.json")))
+    routes = []
+    for path in paths:
+        with open(path, "r") as f:
+            routes.append((os.path.basename(path), json.load(f)))
+    return routes
+
+
+def bench_route(args):
+    """
+    Tiempo de ciclo de cada ruta: retardo fijo (ejecución anterior) contra
+    la trayectoria tiempo-óptima, ejecutada en tiempo real sobre el QArm emulado.
+    """
+    wrapper = QArmWrapper(modo="emulacion")
+    wrapper.start_loop(args.rate)
+    print(f"blend = {args.blend:.2f}")
+    print(f"{'ruta':<34} {'fijo (s)':>9} {'óptimo (s)':>11} {'mezcla (s)':>11} "
+          f"{'medido (s)':>11} {'error a 1 s (deg)':>18}")
+    try:
+        for name, ruta in _load_routes(args.routes):
+            # se parte del primer punto de la ruta, ya alcanzado
+            q0 = np.deg2rad(ruta[0]["pos"])
+            done = wrapper.run_trajectory(route_trajectory(ruta[:1], q_start=q0))
+            done.wait()
+            time.sleep(0.5)
+
+            traj = route_trajectory(ruta, q_start=q0, ciclos=args.ciclos, blend=args.blend)
+            t0 = time.perf_counter()
+            wrapper.run_trajectory(traj).wait()
+            measured = (time.perf_counter() - t0) / args.ciclos
+            time.sleep(1.0)
+            err = np.rad2deg(np.abs(wrapper.read_std()["position"][0:4] - traj.q_end)).max()
+            print(f"{name:<34} {fixed_delay_cycle_time(ruta):>9.2f} "
+                  f"{optimal_cycle_time(ruta):>11.2f} "
+                  f"{optimal_cycle_time(ruta, blend=args.blend):>11.2f} "
+                  f"{measured:>11.2f} {err:>18.3f}")
+    finally:
+        wrapper.terminate()
+
+
+def bench_sample(args, waypoints=10000):
+    """
+    Ruta sintética de 10k puntos: construcción, muestreo a la frecuencia del
+    lazo (vectorizado vs punto a punto) y verificación de límites.
+    """
+    rng = np.random.default_rng(0)
+    steps = rng.normal(scale=np.deg2rad(8.0), size=(waypoints, 4))
+    Q = np.cumsum(steps, axis=0)
+    Q = np.clip(Q, QArmWrapper.JOINT_LIMITS_MIN_RAD * 0.9, QArmWrapper.JOINT_LIMITS_MAX_RAD * 0.9)
+    G = np.where(rng.random(waypoints) < 0.05, 0.9, 0.1)
+
+    t0 = time.perf_counter()
+    traj = Trajectory(Q[0], G[0])
+    traj.add_moves(Q, G)
+    traj.prepare()
+    t_build = time.perf_counter() - t0
+
+    t = traj.time_grid(args.rate)
+    t0 = time.perf_counter()
+    q = traj.sample_batch(t)[0]
+    t_batch = time.perf_counter() - t0
+
+    m = min(len(t), 50000)
+    t0 = time.perf_counter()
+    for ti in t[:m]:
+        traj.sample(ti)
+    t_scalar = (time.perf_counter() - t0) / m * len(t)
+
+    t0 = time.perf_counter()
+    bad, _ = QArmWrapper.check_limits(q)
+    t_limits = time.perf_counter() - t0
+
+    print(f"ruta sintética: {waypoints} puntos, {traj.duration_total:.1f} s, "
+          f"{len(t)} consignas a {args.rate:.0f} Hz")
+    print(f"  construcción             {t_build*1e3:10.2f} ms")
+    print(f"  sample_batch             {len(t)/t_batch:14,.0f} puntos/s")
+    print(f"  sample (punto a punto)   {len(t)/t_scalar:14,.0f} puntos/s")
+    print(f"  check_limits             {len(t)/t_limits:14,.0f} puntos/s ({int(bad.sum())} fuera de límites)")
+
+
+def bench_estop(args, trials=30):
+    """
+    Latencia de la parada de emergencia: con una ruta en ejecución (ejecutor
+    no bloqueante), se presiona en un instante al azar y se mide el tiempo
+    hasta que el lazo escribe el primer HOME.
+    """
+    rng = np.random.default_rng(0)
+    routes = _load_routes(args.routes)
+    wrapper = QArmWrapper(modo="emulacion")
+    wrapper.start_loop(args.rate)
+    executor = RouteExecutor(wrapper)
+    lat = []
+    try:
+        for k in range(trials):
+            name, ruta = routes[k % len(routes)]
+            executor.start(ruta, ciclos=args.ciclos, blend=args.blend)
+            time.sleep(rng.uniform(0.1, 0.6))
+            t_press = time.perf_counter()
+            latency = wrapper.emergency_stop(t_press)
+            executor.wait()
+            wrapper.reset_emergency()
+            if latency is not None:
+                lat.append(latency)
+    finally:
+        wrapper.terminate()
+
+    lat = np.array(lat) * 1e3
+    print(f"parada de emergencia a {args.rate:.0f} Hz (período {1e3/args.rate:.2f} ms), "
+          f"{len(lat)}/{trials} pulsaciones")
+    print(f"  media {lat.mean():.3f} ms   p50 {np.percentile(lat, 50):.3f} ms   "
+          f"p99 {np.percentile(lat, 99):.3f} ms   máx {lat.max():.3f} ms")
+
+
+def bench_stream(args):
+    """
+    Misma ruta ejecutada por el lazo de control (una escritura a la tarjeta
+    por período) y por streaming en un writer task (bloques de args.block
+    muestras, aplicadas por el reloj de la tarjeta). Compara llamadas a la
+    tarjeta, CPU del proceso y error final sobre el QArm emulado.
+    """
+    routes = _load_routes(args.routes)
+    name, ruta = routes[0]
+    q0 = np.deg2rad(ruta[0]["pos"])
+    wrapper = QArmWrapper(modo="emulacion")
+    card = wrapper.brazo.card
+    wrapper.start_loop(args.rate)
+    print(f"ruta {name}, {args.ciclos} ciclos, {args.rate:.0f} Hz, bloque {args.block}")
+    print(f"{'modo':<10} {'duración (s)':>13} {'llamadas':>9} {'CPU (ms/s)':>11} "
+          f"{'error (deg)':>12}   temporización")
+    try:
+        for modo in ("lazo", "stream"):
+            wrapper.run_trajectory(route_trajectory(ruta[:1], q_start=q0)).wait()
+            time.sleep(0.5)
+            traj = route_trajectory(ruta, q_start=q0, ciclos=args.ciclos, blend=args.blend)
+
+            calls0 = card.write_count + card.task_write_count
+            wrapper.loop.reset_stats()
+            cpu0 = time.process_time()
+            t0 = time.perf_counter()
+            if modo == "lazo":
+                wrapper.run_trajectory(traj).wait()
+                st = wrapper.loop.stats()
+                timing = (f"jitter {st['jitter_std']*1e6:.0f} us "
+                          f"(máx {st['jitter_max']*1e6:.0f} us), overruns {st['overruns']}")
+            else:
+                st = wrapper.stream_trajectory(traj, block=args.block)
+                timing = (f"reloj de la tarjeta, margen mínimo {st['margin_min']*1e3:.0f} ms, "
+                          f"underflows {st['underflows']}")
+            elapsed = time.perf_counter() - t0
+            cpu = time.process_time() - cpu0
+            calls = card.write_count + card.task_write_count - calls0
+
+            time.sleep(1.0)
+            err = np.rad2deg(np.abs(wrapper.read_std()["position"][0:4] - traj.q_end)).max()
+            print(f"{modo:<10} {elapsed:>13.2f} {calls:>9d} {cpu/elapsed*1e3:>11.1f} "
+                  f"{err:>12.3f}   {timing}")
+    finally:
+        wrapper.terminate()
+
+
+def bench_telemetry(args):
+    """
+    Telemetría: costo de record() en el hilo del lazo, throughput del
+    escritor de chunks, lector perezoso sobre un log sintético de
+    args.hours horas y el lazo emulado con y sin registro.
+    """
+    arm = _make_arm()
+    tmp = tempfile.mkdtemp(prefix="qarm_tel_")
+    try:
+        logger = TelemetryLogger(os.path.join(tmp, "rec"), args.rate, capacity=4096)
+        cmd = np.zeros(5)
+        state = [0.0]
+
+        def record():
+            state[0] += 0.002
+            logger.record(state[0], cmd, arm.measurement)
+
+        print("record() en el hilo del lazo:")
+        _report("TelemetryRing.record", record, args.n)
+
+        # log sintético: el escritor vuelca cada bloque del anillo
+        n = int(args.hours * 3600 * args.rate)
+        path = os.path.join(tmp, "log")
+        logger = TelemetryLogger(path, args.rate)
+        logger.write_meta()
+        block = logger.ring.capacity // 2
+        t_flush = 0.0
+        for i in range(n):
+            logger.record(i / args.rate, cmd, arm.measurement)
+            if (i + 1) % block == 0:
+                t0 = time.perf_counter()
+                logger.flush()
+                t_flush += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        logger.stop()
+        t_flush += time.perf_counter() - t0
+        size = sum(os.path.getsize(f) for f in glob.glob(os.path.join(path, "*")))
+        print(f"\nescritor: {n:,} muestras ({args.hours:.1f} h a {args.rate:.0f} Hz), "
+              f"{logger.chunks} chunks, {size/2**20:.0f} MiB ({size/n:.0f} B/muestra)")
+        print(f"  volcado a disco          {n/t_flush:14,.0f} muestras/s, perdidas {logger.dropped}")
+
+        t0 = time.perf_counter()
+        log = TelemetryLog(path)
+        duration = log.duration
+        t_open = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        t, pos = log.field("position", duration / 2, duration / 2 + 10.0)
+        t_window = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        sum(float(c["temperature"].max()) > 0 for c in log.iter_chunks())
+        t_scan = time.perf_counter() - t0
+        print("lector:")
+        print(f"  abrir + duración         {t_open*1e3:10.2f} ms ({duration/3600:.2f} h)")
+        print(f"  ventana de 10 s          {t_window*1e3:10.2f} ms ({len(t)} muestras)")
+        print(f"  recorrido completo       {n/t_scan:14,.0f} muestras/s")
+
+        # lazo emulado con y sin telemetría
+        wrapper = QArmWrapper(modo="emulacion")
+        wrapper.start_loop(args.rate)
+        try:
+            for label in ("sin telemetría", "con telemetría"):
+                if label == "con telemetría":
+                    wrapper.start_telemetry(os.path.join(tmp, "live"))
+                wrapper.loop.reset_stats()
+                time.sleep(args.duration)
+                st = wrapper.loop.stats()
+                print(f"lazo {label:<16} período {st['period_mean']*1e3:.3f} ms, "
+                      f"jitter {st['jitter_std']*1e6:.1f} us, overruns {st['overruns']}")
+            logger = wrapper.stop_telemetry()
+            log = TelemetryLog(logger.directory)
+            print(f"  registradas {len(log)} muestras en {log.duration:.2f} s, perdidas {logger.dropped}")
+        finally:
+            wrapper.terminate()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_movel(args):
+    """
+    MoveL: costo del precálculo (muestreo de la línea + IK por lotes +
+    verificaciones) y desvío de la recta planificado y medido sobre el QArm emulado.
+    """
+    lines = [
+        ((0.45, 0.00, 0.49), 0.0, (0.35, 0.15, 0.30), 0.3),
+        ((0.35, 0.15, 0.30), 0.3, (0.35, -0.15, 0.30), -0.3),
+        ((0.35, -0.15, 0.30), -0.3, (0.25, 0.0, 0.60), 0.0),
+    ]
+    wrapper = QArmWrapper(modo="emulacion")
+    wrapper.start_loop(args.rate)
+    print(f"{'línea':<44} {'muestras':>8} {'precálculo (ms)':>16} {'IK (us/muestra)':>16} "
+          f"{'desvío plan (mm)':>17} {'desvío medido (mm)':>19}")
+    try:
+        q_now = np.zeros(4)
+        for p0, g0, p1, g1 in lines:
+            P, G = line_samples(p0, g0, p1, g1, args.rate)
+            t0 = time.perf_counter()
+            solve_line(P, G, q_now)
+            t_ik = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            traj = movel(p0, g0, p1, g1, q_now, rate=args.rate)
+            t_build = time.perf_counter() - t0
+            plan = path_deviation(traj.q, p0, p1)
+
+            done, traj = wrapper.movel(np.array(p1), g1, p_start=np.array(p0), gamma_start=g0)
+            qs = []
+            while not done.wait(0.002):
+                qs.append(wrapper.read_std()["position"][0:4].copy())
+            time.sleep(0.5)
+            measured = path_deviation(np.array(qs), p0, p1) if qs else float("nan")
+            q_now = traj.q_end
+
+            name = f"{p0} -> {p1}"
+            print(f"{name:<44} {len(P):>8d} {t_build*1e3:>16.2f} {t_ik/len(P)*1e6:>16.2f} "
+                  f"{plan*1e3:>17.2e} {measured*1e3:>19.2f}")
+    finally:
+        wrapper.terminate()
+
+
+def bench_startup(args):
+    """
+    Arranque de TODO.py (emulación) en subprocesos: desglose de imports y
+    time-to-first-command con y sin tiempo de diálogo para la carga en
+    segundo plano. Necesita display (la GUI se construye antes del primer comando).
+    """
+    Qarm_startup.bench("TODO.py")
+
+
+def _actualizar_slider_legacy(gui):
+    """QArmGUI.actualizar_slider anterior: etiquetas y consigna en cada evento."""
+    for i, v in enumerate(gui.sliders):
+        gui.labels[i].config(text=f"{v.get():.0f}°")
+    angulos = np.array([v.get() for v in gui.sliders])
+    gui.brazo.post_setpoint(np.deg2rad(angulos), np.array([gui.gripper_val.get()]))
+
+
+def bench_slider(args, motion_rate=1000.0, probe_ms=10):
+    """
+    Arrastre del slider J1 de QArmGUI con eventos a motion_rate/s (como los
+    <B1-Motion> de un mouse de alta frecuencia), con el lazo de control
+    corriendo: eventos y consignas publicadas por segundo, CPU del hilo de
+    la GUI y retraso de un after() periódico de probe_ms (respuesta del
+    event loop). Anterior (etiquetas + consigna por evento) vs TkCoalescer.
+    Necesita display.
+    """
+    import tkinter as tk
+    from Graphic_interface import QArmGUI
+
+    print(f"{'':<26} {'eventos/s':>10} {'consignas/s':>12} {'CPU GUI':>8} "
+          f"{'retraso p50':>12} {'p95':>8} {'máx':>8}")
+    for name, legacy in (("anterior (por evento)", True), ("TkCoalescer", False)):
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            print(f"slider: no hay display ({e})")
+            return
+        wrapper = QArmWrapper(modo="emulacion")
+        wrapper.start_loop(args.rate)
+        gui = QArmGUI(root, wrapper)
+        root.update()
+
+        posted = [0]
+        post = wrapper.post_setpoint
+
+        def counting_post(pos, g):
+            posted[0] += 1
+            post(pos, g)
+
+        wrapper.post_setpoint = counting_post
+        if legacy:
+            gui.actualizar_slider = lambda: _actualizar_slider_legacy(gui)
+
+        events = [0]
+        lags = []
+        t0 = time.perf_counter()
+
+        def drag():
+            # los eventos de movimiento llegan en ráfagas entre vueltas del event loop
+            now = time.perf_counter()
+            while events[0] < (now - t0) * motion_rate:
+                gui.sliders[0].set(150.0 * np.sin(0.5 * events[0] / motion_rate))
+                gui.slider_step(0)
+                events[0] += 1
+            root.after(1, drag)
+
+        def probe(expected):
+            now = time.perf_counter()
+            lags.append(now - expected)
+            root.after(probe_ms, probe, now + probe_ms / 1000.0)
+
+        root.after(0, drag)
+        root.after(probe_ms, probe, time.perf_counter() + probe_ms / 1000.0)
+        root.after(int(args.duration * 1000), root.quit)
+        cpu = time.thread_time()
+        root.mainloop()
+        cpu = time.thread_time() - cpu
+        wall = time.perf_counter() - t0
+
+        root.destroy()
+        wrapper.terminate()
+        lag = np.array(lags) * 1e3
+        print(f"{name:<26} {events[0]/wall:>10.0f} {posted[0]/wall:>12.0f} {cpu/wall*100:>7.0f}% "
+              f"{np.percentile(lag, 50):>9.2f} ms {np.percentile(lag, 95):>5.2f} ms {lag.max():>5.2f} ms")
+
+
+def bench_plot(args, window=10.0, width=560, period=0.1, rates=(500, 2000, 10000, 50000)):
+    """
+    TelemetryPlot: costo por redibujo (lectura del anillo + decimación
+    mín/máx por píxel) a distintas frecuencias de muestreo, recalculando la
+    ventana completa (minmax_decimate) vs incremental (MinMaxDecimator); los
+    puntos dibujados son los mismos. Con display, además el gráfico en vivo
+    sobre el lazo emulado: costo por redibujo y jitter del lazo con y sin él.
+    """
+    print(f"ventana de {window:.0f} s en {width} px, redibujo cada {period*1e3:.0f} ms:")
+    print(f"{'muestreo':>10} {'muestras':>10} {'puntos/curva':>13} {'ventana completa':>17} {'incremental':>12}")
+    for rate in rates:
+        ring = TelemetryRing(int(rate * window * 1.2))
+        n = ring.capacity
+        t = 1000.0 + np.arange(n) / rate
+        ring.buffer[:, 0] = t
+        ring.buffer[:, 6:11] = np.sin(t[:, None] * np.arange(1, 6))
+        m = int(window * rate)
+        step = int(rate * period)
+        frames = 20
+
+        # ventana completa en cada redibujo
+        ring.head = n
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            head = ring.head
+            tt = ring.latest(m, "t", head)
+            x, _ = minmax_decimate(tt, ring.latest(m, "position", head), tt[-1] - window, tt[-1], width)
+        full = (time.perf_counter() - t0) / frames
+
+        # incremental: en cada redibujo llegaron rate * period muestras nuevas
+        dec = MinMaxDecimator(window, width)
+        ring.head = n - frames * step
+        dec.update(ring, "position")
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            ring.head += step
+            x, _ = dec.update(ring, "position")
+        inc = (time.perf_counter() - t0) / frames
+        print(f"{rate:>8} Hz {m:>10} {len(x):>13} {full*1e3:>14.2f} ms {inc*1e3:>9.2f} ms")
+
+    import tkinter as tk
+    from Graphic_interface import TelemetryPlot
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"gráfico en vivo: no hay display ({e})")
+        return
+    wrapper = QArmWrapper(modo="emulacion")
+    wrapper.start_loop(args.rate)
+    ring = wrapper.start_monitor()
+    try:
+        for label in ("monitor sin gráfico", "monitor con gráfico"):
+            plot = None
+            if label == "monitor con gráfico":
+                plot = TelemetryPlot(root, ring, window=window, width=width, period_ms=int(period * 1000))
+                plot.pack()
+            k = [0]
+
+            def move():
+                # consigna en movimiento para que haya algo que dibujar
+                k[0] += 1
+                wrapper.post_setpoint(np.deg2rad([30.0 * np.sin(0.05 * k[0]), 10.0, 0.0, 0.0]), np.array([0.5]))
+                root.after(16, move)
+
+            wrapper.loop.reset_stats()
+            root.after(0, move)
+            root.after(int(args.duration * 1000), root.quit)
+            root.mainloop()
+            st = wrapper.loop.stats()
+            line = (f"lazo {label:<20} período {st['period_mean']*1e3:.3f} ms, "
+                    f"jitter {st['jitter_std']*1e6:.1f} us, overruns {st['overruns']}")
+            if plot is not None and plot.redraws:
+                line += f"; redibujo {plot.draw_time/plot.redraws*1e3:.2f} ms medio ({plot.redraws})"
+                plot.destroy()
+            print(line)
+    finally:
+        root.destroy()
+        wrapper.terminate()
+
+
+def _timed_peak(fn):
+    """(resultado, segundos, pico de memoria Python en bytes) de fn(); el tiempo sin tracemalloc."""
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    try:
+        out = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return out, dt, peak
+
+
+def _dense_route(n, rng, rate=500.0):
+    """Ruta densa sintética de n puntos, como una grabación a la frecuencia del lazo."""
+    t = np.arange(n) / rate
+    arr = np.zeros(n, dtype=ROUTE_DTYPE)
+    arr["pos"] = 60.0 * np.sin(t[:, None] * np.array([0.3, 0.5, 0.7, 0.11])) + rng.normal(0, 1e-3, (n, 4))
+    arr["gripper"] = np.where(np.sin(0.2 * t) > 0, 0.9, 0.1)
+    arr["tiempo"] = 1.0 / rate
+    return arr
+
+
+def bench_routefile(args):
+    """
+    Rutas densas (args.points puntos): tamaño en disco, tiempo de guardado
+    y de carga, pico de memoria Python (tracemalloc) y route_arrays() (la
+    conversión a radianes que hace cada ejecución), JSON de la GUI vs .npy
+    (memory-mapped, y recorrido por bloques con iter_route) vs .npz.
+    El mmap no cuenta como memoria hasta que se leen sus páginas.
+    """
+    rng = np.random.default_rng(0)
+    tmp = tempfile.mkdtemp(prefix="qarm_route_")
+    try:
+        for n in args.points:
+            arr = _dense_route(n, rng)
+            print(f"\n{n:,} puntos:")
+            print(f"  {'':<26} {'archivo':>10} {'guardar':>9} {'cargar':>9} {'pico mem':>10} {'route_arrays':>13}")
+            for ext in (".json", ".npy", ".npz"):
+                path = os.path.join(tmp, f"ruta{ext}")
+                if ext == ".json":
+                    # como guardaba/cargaba la GUI: json.dump / json.load de la lista de dicts
+                    ruta = to_list(arr)
+                    t0 = time.perf_counter()
+                    with open(path, "w") as f:
+                        json.dump(ruta, f, indent=4)
+                    t_save = time.perf_counter() - t0
+                    del ruta
+
+                    def load():
+                        with open(path, "r") as f:
+                            return json.load(f)
+                    label = "JSON (lista de dicts)"
+                else:
+                    t0 = time.perf_counter()
+                    save_route(path, arr)
+                    t_save = time.perf_counter() - t0
+
+                    def load():
+                        return open_route(path)
+                    label = "npy (memory-mapped)" if ext == ".npy" else "npz (comprimido)"
+                loaded, t_load, peak = _timed_peak(load)
+                t0 = time.perf_counter()
+                route_arrays(loaded)
+                t_conv = time.perf_counter() - t0
+                print(f"  {label:<26} {os.path.getsize(path)/2**20:>7.1f} MiB {t_save*1e3:>6.0f} ms "
+                      f"{t_load*1e3:>6.1f} ms {peak/2**20:>6.1f} MiB {t_conv*1e3:>10.1f} ms")
+                if ext != ".json":
+                    ok = np.array_equal(np.asarray(loaded).view(np.uint8), arr.view(np.uint8))
+                    if not ok:
+                        print("    (!) los datos leídos no coinciden con los guardados")
+                del loaded
+
+            path = os.path.join(tmp, "ruta.npy")
+
+            def stream():
+                total = 0.0
+                for chunk in iter_route(path):
+                    total += float(chunk["pos"][:, 0].sum())
+                return total
+            _, t_stream, peak = _timed_peak(stream)
+            print(f"  {'npy por bloques (iter)':<26} {'':>10} {'':>9} {t_stream*1e3:>6.1f} ms {peak/2**20:>6.1f} MiB"
+                  f"   ({n/t_stream:,.0f} puntos/s)")
+
+            # JSON -> binario -> JSON sin pérdida
+            src = os.path.join(tmp, "ruta.json")
+            save_route(os.path.join(tmp, "vuelta.npy"), open_route(src))
+            save_route(os.path.join(tmp, "vuelta.json"), open_route(os.path.join(tmp, "vuelta.npy")))
+            with open(os.path.join(tmp, "vuelta.json")) as f, open(src) as g:
+                same = json.load(f) == json.load(g)
+            print(f"  JSON -> npy -> JSON idéntico: {'sí' if same else 'NO'}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _actualizar_lista_legacy(lista, ruta):
+    """QArmGUI.actualizar_lista anterior: reconstrucción completa, dos insert por punto."""
+    lista.delete(0, "end")
+    for i, p in enumerate(ruta):
+        texto = (
+            f"({int(p['pos'][0])}, {int(p['pos'][1])}, "
+            f"{int(p['pos'][2])}, {int(p['pos'][3])})"
+        )
+        lista.insert("end", texto)
+        lista.insert("end", f"── delay {p['tiempo']:.1f}s ──")
+
+
+def _per_op(fn, reps):
+    t0 = time.perf_counter()
+    for k in range(reps):
+        fn(k)
+    return (time.perf_counter() - t0) / reps
+
+
+def bench_routeedit(args, reps=200):
+    """
+    Edición de una ruta de args.points[0] puntos como en QArmGUI (lista de
+    dicts): costo por operación de agregar / editar / insertar / borrar un
+    punto, y de la conversión a arreglo que ejecutar_ruta hace una vez por
+    ejecución (to_array) frente a route_arrays() sobre la lista. Con
+    display, además el costo de refrescar la Listbox tras una edición:
+    reconstrucción completa anterior vs filas del punto.
+    """
+    n = args.points[0]
+    arr = _dense_route(n, np.random.default_rng(0))
+    punto = {"pos": [10.0, 20.0, 30.0, 40.0], "gripper": 0.5, "tiempo": 1.0}
+
+    ruta = to_list(arr)
+    ops = {
+        "agregar": lambda k: ruta.append(dict(punto)),
+        "editar": lambda k: ruta.__setitem__((k * 7919) % n, dict(punto)),
+        "insertar (medio)": lambda k: ruta.insert(n // 2, dict(punto)),
+        "borrar (medio)": lambda k: ruta.__delitem__(n // 2),
+    }
+    print(f"ruta de {n:,} puntos (lista de dicts), {reps} repeticiones por operación:")
+    for op, fn in ops.items():
+        print(f"  {op:<22} {_per_op(fn, reps)*1e6:>10.2f} us")
+    t_list = _per_op(lambda k: route_arrays(ruta), 20)
+    t_conv = _per_op(lambda k: to_array(ruta), 20)
+    arreglo = to_array(ruta)
+    t_arr = _per_op(lambda k: route_arrays(arreglo), 20)
+    print(f"  route_arrays(lista)    {t_list*1e3:>10.2f} ms")
+    print(f"  to_array (al ejecutar) {t_conv*1e3:>10.2f} ms, una vez; después route_arrays "
+          f"{t_arr*1e6:.1f} us por llamada")
+
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Listbox: no hay display ({e})")
+        return
+    try:
+        from Graphic_interface import QArmGUI
+        wrapper = QArmWrapper(modo="emulacion")
+        gui = QArmGUI(root, wrapper)
+        gui.ruta = to_list(arr)
+        t0 = time.perf_counter()
+        gui.actualizar_lista()
+        t_full = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        _actualizar_lista_legacy(gui.lista_puntos, to_list(arr))
+        t_legacy = time.perf_counter() - t0
+
+        def editar(k):
+            gui.ruta[(k * 7919) % n] = dict(punto)
+            gui._reemplazar_filas((k * 7919) % n)
+            root.update_idletasks()
+        t_edit = _per_op(editar, reps)
+        print(f"Listbox ({2*n:,} filas):")
+        print(f"  carga completa     {t_legacy*1e3:>9.1f} ms anterior   {t_full*1e3:>9.1f} ms un insert")
+        print(f"  refresco por edición  {t_legacy*1e3:>6.1f} ms anterior   {t_edit*1e3:>9.3f} ms filas del punto")
+        wrapper.terminate()
+    finally:
+        root.destroy()
+
+
+def _demonstration(rate, rng, moves=8, pause=1.0, speed=20.0, noise=0.02):
+    """
+    Demostración sintética a `rate` Hz: el operador lleva el brazo por
+    `moves` poses a ~speed grados/s, cada junta con su perfil de mínimo
+    jerk desfasado de las otras (caminos curvos en espacio articular, como
+    al mover un slider tras otro o con la cámara), se detiene `pause` s en
+    cada pose y alterna el gripper en la mitad de las pausas; ruido de
+    encoder de `noise` grados. Devuelve (t, q rad, gripper).
+    """
+    poses = rng.uniform([-120, -60, -50, -120], [120, 60, 50, 120], (moves, 4))
+    poses[0] = 0.0
+    q, g = [poses[0:1]], [np.array([0.1])]
+    grip = 0.1
+    for k in range(1, moves):
+        d = np.abs(poses[k] - poses[k - 1]).max()
+        n = max(2, int(rate * 1.875 * d / speed))   # pico de velocidad 1.875 * media
+        start = rng.uniform(0.0, 0.5, 4)
+        end = start + rng.uniform(0.4, 1.0 - start)
+        s = np.clip((np.linspace(0.0, 1.0, n)[1:, None] - start) / (end - start), 0.0, 1.0)
+        s = s ** 3 * (10 - 15 * s + 6 * s * s)
+        q.append(poses[k - 1] + (poses[k] - poses[k - 1]) * s)
+        g.append(np.full(n - 1, grip))
+        if k % 2 == 0:
+            grip = 0.9 if grip < 0.5 else 0.1
+        q.append(np.repeat(poses[k:k + 1], int(rate * pause), axis=0))
+        g.append(np.full(int(rate * pause), grip))
+    q = np.concatenate(q) + rng.normal(0.0, noise, (sum(len(x) for x in q), 4))
+    g = np.concatenate(g)
+    return np.arange(len(q)) / rate, np.deg2rad(q), g
+
+
+def bench_teach(args, tolerances=(0.25, 0.5, 1.0, 2.0)):
+    """
+    Enseñanza por demostración: costo de TeachRecorder.record() por período
+    del lazo (memoria asignada por llamada), y para una demostración
+    sintética a args.rate Hz: tiempo de simplify(), puntos que quedan, error
+    máximo respecto de la grabación y duración de la ruta con
+    route_trajectory (mezcla 0 y args.blend) contra ejecutar la grabación
+    cruda como ruta y contra la duración de la demostración.
+    """
+    meas = q.QArmMeasurement(np.zeros(5), np.zeros(20))
+    cmd = np.array([0.0, 0.0, 0.0, 0.0, 0.5])
+    n = min(args.n, 200000)
+    rec = TeachRecorder(n)
+    t0 = time.perf_counter()
+    for i in range(n):
+        rec.record(i, cmd, meas)
+    dt = time.perf_counter() - t0
+    rec = TeachRecorder(n)
+    tracemalloc.start()
+    for i in range(n):
+        rec.record(i, cmd, meas)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"record(): {dt/n*1e6:.2f} us por muestra, pico de memoria {peak} B en {n} muestras "
+          f"(buffer preasignado de {rec.buffer.nbytes/2**20:.1f} MiB)")
+
+    t, qd, g = _demonstration(args.rate, np.random.default_rng(0))
+    raw = recording_route(t, qd, g, idx=np.arange(len(t)))
+    print(f"\ndemostración sintética: {len(t)} muestras a {args.rate:.0f} Hz, {t[-1]:.1f} s")
+    t0 = time.perf_counter()
+    raw_time = optimal_cycle_time(raw)
+    print(f"  grabación cruda como ruta: {len(raw)} puntos, ciclo {raw_time:.1f} s "
+          f"(route_trajectory en {(time.perf_counter() - t0)*1e3:.0f} ms)")
+    print(f"  {'tolerancia':>10} {'simplify':>9} {'puntos':>7} {'error máx':>10} "
+          f"{'ciclo mezcla 0':>15} {f'mezcla {args.blend:g}':>11} {'vs demostración':>16}")
+    for tol in tolerances:
+        t0 = time.perf_counter()
+        idx = simplify(qd, g, tol)
+        t_simp = time.perf_counter() - t0
+        route = recording_route(t, qd, g, idx=idx)
+        err = path_error(qd, g, idx, tol)
+        c0 = optimal_cycle_time(route)
+        cb = optimal_cycle_time(route, blend=args.blend)
+        print(f"  {tol:>8.2f} ° {t_simp*1e3:>6.1f} ms {len(route):>7} {err:>7.3f} ° "
+              f"{c0:>13.1f} s {cb:>9.1f} s {t[-1]/cb:>15.1f}x")
+
+
+BENCHMARKS = {
+    "read": bench_read,
+    "readtask": bench_readtask,
+    "write": bench_write,
+    "loop": bench_loop,
+    "route": bench_route,
+    "sample": bench_sample,
+    "estop": bench_estop,
+    "stream": bench_stream,
+    "telemetry": bench_telemetry,
+    "movel": bench_movel,
+    "startup": bench_startup,
+    "slider": bench_slider,
+    "plot": bench_plot,
+    "routefile": bench_routefile,
+    "routeedit": bench_routeedit,
+    "teach": bench_teach,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del QArm")
+    parser.add_argument("bench", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", type=int, default=200000, help="iteraciones")
+    parser.add_argument("--rate", type=float, default=500.0, help="frecuencia del lazo (Hz)")
+    parser.add_argument("--duration", type=float, default=5.0, help="duración (s)")
+    parser.add_argument("--ciclos", type=int, default=1, help="ciclos por ruta")
+    parser.add_argument("--blend", type=float, default=1.0, help="mezcla en puntos de paso (0-1)")
+    parser.add_argument("--block", type=int, default=50, help="muestras por bloque (stream)")
+    parser.add_argument("--hours", type=float, default=1.0, help="horas del log sintético (telemetry)")
+    parser.add_argument("--points", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="puntos de las rutas densas (routefile; routeedit usa el primero)")
+    parser.add_argument("routes", nargs="*", help="archivos de ruta (por defecto RUTAS/*.json)")
+    args = parser.parse_args()
+    np.set_printoptions(precision=3, suppress=True)
+    BENCHMARKS[args.bench](args)
+
+
+if __name__ == "__main__":
+    main()
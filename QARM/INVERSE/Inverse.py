@@ -1,40 +1,54 @@
-from pal.products.qarm import QArm
-from hal.products.qarm import QArmUtilities
+import Qarm_startup as startup
 import time
-import numpy as np
 import tkinter as tk
 from tkinter import ttk
 
+# Mientras el usuario elige el modo se cargan en segundo plano numpy, la
+# cinemática, la librería del QArm (PAL) y el mapa de alcance
+pre = startup.BackgroundImport("numpy", "Qarm_kinematics", "pal.products.qarm")
+
+def cargar_alcance():
+    from Qarm_workspace import ReachabilityMap
+    return ReachabilityMap.load_or_generate()
+
+mapa = startup.Background(cargar_alcance, name="mapa de alcance")
+
 # =====================================================
 #        VENTANA DE SELECCIÓN (FÍSICO / SIM)
 # =====================================================
 
-hw_root = tk.Tk()
-hw_root.title("Modo de Operación")
-hw_root.geometry("300x150")
-hw_root.resizable(False, False)
+def elegir_modo():
+    hw_root = tk.Tk()
+    hw_root.title("Modo de Operación")
+    hw_root.geometry("300x150")
+    hw_root.resizable(False, False)
 
-modo = tk.StringVar(value="0")  # por defecto simulación
+    modo = tk.StringVar(value="simulacion")  # por defecto simulación
 
-ttk.Label(hw_root, text="¿Robot físico o simulación?", font=("Arial", 12)).pack(pady=10)
+    ttk.Label(hw_root, text="¿Robot físico o simulación?", font=("Arial", 12)).pack(pady=10)
 
-def elegir_fisico():
-    modo.set("1")
-    hw_root.destroy()
+    def elegir(nombre):
+        modo.set(nombre)
+        hw_root.destroy()
 
-def elegir_simulacion():
-    modo.set("0")
-    hw_root.destroy()
+    btn_frame = ttk.Frame(hw_root)
+    btn_frame.pack(pady=10)
 
-btn_frame = ttk.Frame(hw_root)
-btn_frame.pack(pady=10)
+    ttk.Button(btn_frame, text="Robot Físico", command=lambda: elegir("fisico")).grid(row=0, column=0, padx=10)
+    ttk.Button(btn_frame, text="Simulación", command=lambda: elegir("simulacion")).grid(row=0, column=1, padx=10)
 
-ttk.Button(btn_frame, text="Robot Físico", command=elegir_fisico).grid(row=0, column=0, padx=10)
-ttk.Button(btn_frame, text="Simulación", command=elegir_simulacion).grid(row=0, column=1, padx=10)
+    hw_root.mainloop()
+    return modo.get()
 
-hw_root.mainloop()
+modo_elegido = startup.ask_mode(elegir_modo)
+if modo_elegido not in ("simulacion", "fisico"):
+    raise SystemExit(f"Inverse.py usa PAL: modo {modo_elegido!r} no soportado (simulacion o fisico)")
+hardware_mode = startup.MODOS[modo_elegido]
 
-hardware_mode = int(modo.get())
+# ya cargados en segundo plano (si todavía no terminaron, el import espera)
+import numpy as np
+from pal.products.qarm import QArm
+from Qarm_kinematics import CachedInverse, forward
 print("Iniciando QArm en modo:", "Físico" if hardware_mode == 1 else "Simulación")
 
 
@@ -46,18 +60,17 @@ startTime = time.time()
 def elapsed_time():
     return time.time() - startTime
 
-def actualizar_visor(X, Y, Z, GAMMA, GRIP):
+def actualizar_visor(X, Y, Z, GAMMA, GRIP, alcanzable=True):
     visor_text.set(
         f"X = {X:.3f}\n"
         f"Y = {Y:.3f}\n"
         f"Z = {Z:.3f}\n"
         f"Gamma = {GAMMA:.3f}\n"
         f"Grip = {GRIP:.3f}"
+        + ("" if alcanzable else "\nFUERA DE ALCANCE")
     )
 
 def inversa(X, Y, Z, GAMMA, GRP):
-    actualizar_visor(X, Y, Z, GAMMA, GRP)
-
     result = [X, Y, Z, GAMMA, GRP]
     start = elapsed_time()
 
@@ -71,19 +84,23 @@ def inversa(X, Y, Z, GAMMA, GRP):
     meas = myArm.measJointPosition     # <- atributo, SIN ()
     # ================================
 
-    # IK
-    allPhi, phiCmd = myArmUtilities.qarm_inverse_kinematics(
-        positionCmd,
-        gamma,
-        meas[0:4]
-    )
+    # Mapa de alcance: las poses claramente fuera (vóxel y vecinos
+    # inalcanzables) se descartan sin llamar a la IK; en el borde decide la IK
+    if alcance.classify(positionCmd, gamma) is False:
+        actualizar_visor(X, Y, Z, GAMMA, GRP, False)
+        return
+
+    # IK (solución más cercana a la medición; poses repetidas salen de la caché)
+    phiCmd, alcanzable = ik(positionCmd, gamma, meas[0:4])
+    actualizar_visor(X, Y, Z, GAMMA, GRP, alcanzable)
 
     # FK
-    location, rotation = myArmUtilities.qarm_forward_kinematics(
-        np.append(phiCmd, gamma)
-    )
+    location, rotation = forward(phiCmd)
 
-    print(f"Arm going to: {location}")
+    if alcanzable:
+        print(f"Arm going to: {location}")
+    else:
+        print(f"Fuera de alcance, punto más cercano: {location}")
 
     # Movimiento
     myArm.read_write_std(
@@ -92,8 +109,6 @@ def inversa(X, Y, Z, GAMMA, GRP):
         baseLED=ledCmd
     )
 
-    time.sleep(.05)
-
 def on_change(*args):
     X = slider_X.get()
     Y = slider_Y.get()
@@ -116,7 +131,9 @@ def apagar():
 # =====================================================
 
 myArm = QArm(hardware=hardware_mode, readMode=0)
-myArmUtilities = QArmUtilities()
+ik = CachedInverse()
+alcance = mapa.result()
+startup.mark("brazo y mapa de alcance")
 ledCmd = np.array([1, 0, 1], dtype=np.float64)
 
 np.set_printoptions(precision=2, suppress=True)
@@ -205,5 +222,6 @@ ttk.Button(frame, text="Apagar", command=apagar).grid(row=5, column=0, columnspa
 
 # Primer movimiento
 inversa(X_val, Y_val, Z_val, M_val, G_val)
+startup.first_command()
 
 root.mainloop()
@@ -0,0 +1,274 @@
+# ============================================================
+#                 Qarm_kinematics.py
+# ============================================================
+"""
+Cinemática directa e inversa del QArm, vectorizada con NumPy.
+
+Reemplaza a hal.products.qarm.QArmUtilities (qarm_forward_kinematics /
+qarm_inverse_kinematics) sin depender de Quanser, y resuelve N poses en una
+sola llamada:
+
+- forward(phi):        (N, 4) juntas -> posición (N, 3) y rotación (N, 3, 3)
+- inverse(p, gamma, phi_prev):
+                       (N, 3) posiciones + (N,) gamma -> juntas (N, 4) y
+                       máscara de alcanzables (N,)
+- CachedInverse:       una pose por llamada, con caché LRU sobre la pose
+                       cuantizada (posiciones de jog que se repiten)
+
+Modelo (parámetros DH del QArm, mismos que QArmUtilities):
+    theta0 = phi0
+    theta1 = phi1 + BETA - pi/2
+    theta2 = phi2 - BETA
+    theta3 = phi3 = gamma (giro de la muñeca)
+
+Para cada pose hay hasta 4 soluciones: base hacia el objetivo o de
+espaldas (alcance "por detrás") x codo arriba / codo abajo. Se elige la
+más cercana a phi_prev (normalmente measJointPosition) entre las que
+respetan los límites de las juntas. Si ninguna es válida la pose se marca
+como inalcanzable y se devuelve la solución más cercana proyectada sobre el
+borde del espacio de trabajo, recortada a los límites.
+"""
+
+from functools import lru_cache
+import math
+import numpy as np
+
+
+# Eslabones (m)
+L1 = 0.1400
+L2 = 0.3500
+L3 = 0.0500
+L4 = 0.2500
+L5 = 0.1500
+
+BETA = np.arctan(L3 / L2)
+LAMBDA_1 = L1
+LAMBDA_2 = np.hypot(L2, L3)
+LAMBDA_3 = L4 + L5
+
+# Límites articulares (rad), iguales a QArm.LIMITS_MIN / LIMITS_MAX
+LIMITS_MIN = np.array([-17*np.pi/18, -17*np.pi/36, -19*np.pi/36, -8*np.pi/9], dtype=np.float64)
+LIMITS_MAX = np.array([17*np.pi/18, 17*np.pi/36, 15*np.pi/36, 8*np.pi/9], dtype=np.float64)
+
+
+def _wrap(a):
+    return (a + np.pi) % (2.0 * np.pi) - np.pi
+
+
+def forward(phi):
+    """
+    Cinemática directa.
+
+    Parameters
+    ----------
+    phi : (4,) o (N, 4) ángulos de junta (rad)
+
+    Returns
+    -------
+    (p, R) : (3,), (3, 3) para una pose o (N, 3), (N, 3, 3) para N
+    """
+    phi = np.asarray(phi, dtype=np.float64)
+    single = phi.ndim == 1
+    phi = np.atleast_2d(phi)
+
+    t0 = phi[:, 0]
+    t1 = phi[:, 1] + BETA - np.pi / 2
+    t12 = t1 + phi[:, 2] - BETA
+    t3 = phi[:, 3]
+
+    # Plano vertical del brazo: r radial, z altura
+    r = LAMBDA_2 * np.cos(t1) - LAMBDA_3 * np.sin(t12)
+    z = LAMBDA_1 - LAMBDA_2 * np.sin(t1) - LAMBDA_3 * np.cos(t12)
+
+    c0, s0 = np.cos(t0), np.sin(t0)
+    c12, s12 = np.cos(t12), np.sin(t12)
+    c3, s3 = np.cos(t3), np.sin(t3)
+
+    p = np.empty((len(phi), 3))
+    p[:, 0] = r * c0
+    p[:, 1] = r * s0
+    p[:, 2] = z
+
+    # R04 = Rz(t0) Rx(-pi/2) Rz(t12) Rx(-pi/2) Rz(t3), desarrollado
+    R = np.empty((len(phi), 3, 3))
+    R[:, 0, 0] = c0 * c12 * c3 + s0 * s3
+    R[:, 0, 1] = -c0 * c12 * s3 + s0 * c3
+    R[:, 0, 2] = -c0 * s12
+    R[:, 1, 0] = s0 * c12 * c3 - c0 * s3
+    R[:, 1, 1] = -s0 * c12 * s3 - c0 * c3
+    R[:, 1, 2] = -s0 * s12
+    R[:, 2, 0] = -s12 * c3
+    R[:, 2, 1] = s12 * s3
+    R[:, 2, 2] = -c12
+
+    if single:
+        return p[0], R[0]
+    return p, R
+
+
+def candidates(p, gamma, q_min=LIMITS_MIN, q_max=LIMITS_MAX):
+    """
+    Las 4 soluciones de la inversa para cada pose, con límites [q_min, q_max].
+
+    Returns
+    -------
+    phi : (N, 4, 4)  soluciones [base adelante/atrás x codo] x juntas
+    geometric : (N, 4) la pose está dentro del alcance para esa solución
+    in_limits : (N, 4) además respeta los límites articulares
+    """
+    p = np.atleast_2d(np.asarray(p, dtype=np.float64))
+    n = len(p)
+    gamma = np.broadcast_to(np.asarray(gamma, dtype=np.float64), (n,))
+
+    rho = np.hypot(p[:, 0], p[:, 1])
+    base = np.arctan2(p[:, 1], p[:, 0])
+    h = LAMBDA_1 - p[:, 2]
+
+    phi = np.empty((n, 4, 4))
+    geometric = np.empty((n, 4), dtype=bool)
+
+    # Ley del coseno para el ángulo relativo del codo e = theta2 + pi/2
+    ce = (rho ** 2 + h ** 2 - LAMBDA_2 ** 2 - LAMBDA_3 ** 2) / (2.0 * LAMBDA_2 * LAMBDA_3)
+    ok = np.abs(ce) <= 1.0 + 1e-12
+    e_abs = np.arccos(np.clip(ce, -1.0, 1.0))
+
+    k = 0
+    for sign_r, t0 in ((1.0, base), (-1.0, _wrap(base + np.pi))):
+        r = sign_r * rho
+        for e in (e_abs, -e_abs):
+            t1 = np.arctan2(h, r) - np.arctan2(LAMBDA_3 * np.sin(e), LAMBDA_2 + LAMBDA_3 * np.cos(e))
+            phi[:, k, 0] = t0
+            phi[:, k, 1] = _wrap(t1 - BETA + np.pi / 2)
+            phi[:, k, 2] = _wrap(e - np.pi / 2 + BETA)
+            phi[:, k, 3] = gamma
+            geometric[:, k] = ok
+            k += 1
+
+    in_limits = geometric & np.all((phi >= q_min) & (phi <= q_max), axis=2)
+    return phi, geometric, in_limits
+
+
+def _candidates_one(x, y, z, gamma):
+    """
+    candidates() de una sola pose con aritmética escalar (math): para una
+    pose el costo de armar arreglos domina; misma geometría y mismo orden
+    de soluciones. Devuelve una tupla de 4 (phi (4-tupla), in_limits).
+    """
+    rho = math.hypot(x, y)
+    base = math.atan2(y, x)
+    h = LAMBDA_1 - z
+    ce = (rho * rho + h * h - LAMBDA_2 ** 2 - LAMBDA_3 ** 2) / (2.0 * LAMBDA_2 * LAMBDA_3)
+    ok = abs(ce) <= 1.0 + 1e-12
+    e_abs = math.acos(min(max(ce, -1.0), 1.0))
+    two_pi = 2.0 * math.pi
+    lo = _LIMITS_MIN_T
+    hi = _LIMITS_MAX_T
+
+    out = []
+    for sign_r, t0 in ((1.0, base), (-1.0, (base + 2.0 * math.pi) % two_pi - math.pi)):
+        r = sign_r * rho
+        for e in (e_abs, -e_abs):
+            t1 = math.atan2(h, r) - math.atan2(LAMBDA_3 * math.sin(e), LAMBDA_2 + LAMBDA_3 * math.cos(e))
+            phi = (
+                t0,
+                (t1 - BETA + math.pi / 2 + math.pi) % two_pi - math.pi,
+                (e - math.pi / 2 + BETA + math.pi) % two_pi - math.pi,
+                gamma,
+            )
+            valid = ok and all(lo[j] <= phi[j] <= hi[j] for j in range(4))
+            out.append((phi, valid))
+    return tuple(out)
+
+
+_LIMITS_MIN_T = tuple(float(v) for v in LIMITS_MIN)
+_LIMITS_MAX_T = tuple(float(v) for v in LIMITS_MAX)
+
+
+def _select(phi, geometric, in_limits, phi_prev):
+    """Elige por fila la solución válida más cercana a phi_prev."""
+    n = len(phi)
+    prev = np.broadcast_to(np.asarray(phi_prev, dtype=np.float64)[..., 0:3], (n, 3))
+    dist = np.sum((phi[:, :, 0:3] - prev[:, None, :]) ** 2, axis=2)
+
+    reachable = in_limits.any(axis=1)
+    # sin solución válida: la más cercana sin mirar límites (luego se recorta)
+    dist = np.where(np.where(reachable[:, None], in_limits, True), dist, np.inf)
+    best = np.argmin(dist, axis=1)
+    out = phi[np.arange(n), best]
+    np.clip(out, LIMITS_MIN, LIMITS_MAX, out=out)
+    return out, reachable
+
+
+def inverse(p, gamma, phi_prev=None):
+    """
+    Cinemática inversa de N poses en una llamada.
+
+    Parameters
+    ----------
+    p : (3,) o (N, 3) posición del efector (m)
+    gamma : escalar o (N,) giro de la muñeca (rad)
+    phi_prev : (4,) o (N, 4) juntas de referencia (p. ej. measJointPosition);
+        None = HOME.
+
+    Returns
+    -------
+    (phi, reachable) : (N, 4) juntas y (N,) bool; (4,) y bool si p es (3,)
+    """
+    single = np.ndim(p) == 1
+    if phi_prev is None:
+        phi_prev = np.zeros(4)
+    phi, reachable = _select(*candidates(p, gamma), phi_prev)
+    if single:
+        return phi[0], bool(reachable[0])
+    return phi, reachable
+
+
+class CachedInverse:
+    """
+    Inversa de una pose con caché LRU.
+
+    La clave es la pose cuantizada (quantum en m y rad); se guardan las
+    4 soluciones y la elección de la más cercana a phi_prev se hace en cada
+    llamada, así el resultado no depende de desde dónde se llegó a la pose.
+    El error introducido por la cuantización es a lo sumo quantum / 2.
+    Resuelve y elige con aritmética escalar: una pose por llamada no paga
+    el armado de arreglos de candidates() / _select().
+    """
+
+    def __init__(self, quantum=1e-4, maxsize=4096):
+        self.quantum = float(quantum)
+        self._solve = lru_cache(maxsize=maxsize)(self._solve_key)
+
+    def _solve_key(self, ix, iy, iz, ig):
+        q = self.quantum
+        return _candidates_one(ix * q, iy * q, iz * q, ig * q)
+
+    def __call__(self, p, gamma, phi_prev=None):
+        q = self.quantum
+        key = (round(p[0] / q), round(p[1] / q), round(p[2] / q), round(gamma / q))
+        sols = self._solve(*key)
+        if phi_prev is None:
+            a0 = a1 = a2 = 0.0
+        else:
+            a0, a1, a2 = float(phi_prev[0]), float(phi_prev[1]), float(phi_prev[2])
+
+        # la válida más cercana a phi_prev; sin válidas, la más cercana (recortada)
+        best = None
+        best_d = math.inf
+        reachable = any(valid for _, valid in sols)
+        for phi, valid in sols:
+            if reachable and not valid:
+                continue
+            d = (phi[0] - a0) ** 2 + (phi[1] - a1) ** 2 + (phi[2] - a2) ** 2
+            if d < best_d:
+                best, best_d = phi, d
+        out = np.array(best)
+        if not reachable:
+            np.clip(out, LIMITS_MIN, LIMITS_MAX, out=out)
+        return out, reachable
+
+    def cache_info(self):
+        return self._solve.cache_info()
+
+    def cache_clear(self):
+        self._solve.cache_clear()
@@ -0,0 +1,184 @@
+# ============================================================
+#                 benchmark.py
+# ============================================================
+"""
+Benchmarks de la cinemática del QArm (Qarm_kinematics).
+
+Uso:
+    python benchmark.py ik        # soluciones/s: lote, una a una, caché y Quanser
+    python benchmark.py reach     # mapa de alcance: generación y latencia de consulta
+    python benchmark.py startup   # arranque de Inverse.py: imports y time-to-first-command
+
+Compara el motor vectorizado contra el camino por llamada de Inverse.py
+(QArmUtilities.qarm_inverse_kinematics + qarm_forward_kinematics), si los
+paquetes de Quanser están instalados; si no, esa fila se omite.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import Qarm_startup
+from Qarm_kinematics import CachedInverse, LIMITS_MAX, LIMITS_MIN, forward, inverse
+from Qarm_workspace import ReachabilityMap
+
+try:
+    from hal.products.qarm import QArmUtilities
+except ImportError:
+    QArmUtilities = None
+
+
+def _targets(n, rng):
+    """Poses alcanzables: FK de juntas al azar dentro de los límites."""
+    phi = rng.uniform(LIMITS_MIN * 0.9, LIMITS_MAX * 0.9, size=(n, 4))
+    p, _ = forward(phi)
+    return p, phi[:, 3], phi
+
+
+def _jog(n, rng, step=0.01):
+    """Recorrido de jog: pasos de 1 cm sobre una grilla, con poses repetidas."""
+    steps = rng.integers(-1, 2, size=(n, 3)) * step
+    p = np.array([0.30, 0.0, 0.45]) + np.cumsum(steps, axis=0)
+    p[:, 0] = np.clip(p[:, 0], 0.20, 0.50)
+    p[:, 1] = np.clip(p[:, 1], -0.20, 0.20)
+    p[:, 2] = np.clip(p[:, 2], 0.30, 0.60)
+    return p
+
+
+def bench_ik(args):
+    rng = np.random.default_rng(0)
+    p, gamma, phi_true = _targets(args.n, rng)
+    prev = phi_true + rng.normal(scale=0.05, size=phi_true.shape)
+
+    print(f"{args.n} poses")
+
+    t0 = time.perf_counter()
+    phi, ok = inverse(p, gamma, prev)
+    forward(phi)
+    t_batch = time.perf_counter() - t0
+    err = np.abs(forward(phi)[0] - p).max()
+    print(f"  lote (IK + FK)           {args.n/t_batch:14,.0f} soluciones/s   "
+          f"alcanzables {ok.mean()*100:.1f}%, error FK(IK) {err*1e3:.2e} mm")
+
+    m = min(args.n, 20000)
+    t0 = time.perf_counter()
+    for i in range(m):
+        phi_i, _ = inverse(p[i], gamma[i], prev[i])
+        forward(phi_i)
+    t_single = time.perf_counter() - t0
+    print(f"  una a una (IK + FK)      {m/t_single:14,.0f} soluciones/s")
+
+    jog = _jog(m, rng)
+    ik = CachedInverse()
+    q = np.zeros(4)
+    t0 = time.perf_counter()
+    for i in range(m):
+        q, _ = ik(jog[i], 0.0, q)
+    t_cached = time.perf_counter() - t0
+    info = ik.cache_info()
+    print(f"  jog con caché LRU        {m/t_cached:14,.0f} soluciones/s   "
+          f"aciertos {info.hits/(info.hits + info.misses)*100:.1f}%")
+
+    if QArmUtilities is None:
+        print("  Quanser QArmUtilities    no disponible (hal no instalado)")
+        return
+    util = QArmUtilities()
+    t0 = time.perf_counter()
+    diff = 0.0
+    for i in range(m):
+        _, phi_q = util.qarm_inverse_kinematics(p[i], gamma[i], prev[i])
+        util.qarm_forward_kinematics(phi_q)
+        diff = max(diff, np.abs(np.asarray(phi_q)[0:3] - phi[i, 0:3]).max())
+    t_quanser = time.perf_counter() - t0
+    print(f"  Quanser QArmUtilities    {m/t_quanser:14,.0f} soluciones/s   "
+          f"diferencia máx {np.rad2deg(diff):.2e} deg")
+
+
+def bench_reach(args):
+    """Generación del mapa de alcance y latencia de consulta contra la IK exacta."""
+    tmp = tempfile.mkdtemp(prefix="qarm_reach_")
+    try:
+        path = os.path.join(tmp, "reach_map.npy")
+        t0 = time.perf_counter()
+        ReachabilityMap.generate(path, args.resolution)
+        t_gen = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        m = ReachabilityMap(path)
+        t_open = time.perf_counter() - t0
+        n_vox = int(np.prod(m.shape))
+        print(f"mapa {m.shape} ({n_vox:,} vóxeles de {args.resolution*100:.1f} cm), "
+              f"{os.path.getsize(path)/2**20:.1f} MiB")
+        print(f"  generación               {t_gen:10.2f} s  ({n_vox/t_gen:,.0f} vóxeles/s)")
+        print(f"  apertura (mmap)          {t_open*1e3:10.2f} ms")
+
+        rng = np.random.default_rng(0)
+        P = rng.uniform([-0.6, -0.6, 0.0], [0.6, 0.6, 0.8], size=(args.n, 3))
+        m_single = min(args.n, 20000)
+
+        t0 = time.perf_counter()
+        for i in range(m_single):
+            m.reachable(P[i])
+        t_reach = (time.perf_counter() - t0) / m_single
+        t0 = time.perf_counter()
+        cls = [m.classify(P[i]) for i in range(m_single)]
+        t_cls = (time.perf_counter() - t0) / m_single
+        t0 = time.perf_counter()
+        for i in range(m_single):
+            m.warm_start(P[i])
+        t_warm = (time.perf_counter() - t0) / m_single
+        t0 = time.perf_counter()
+        for i in range(m_single):
+            inverse(P[i], 0.0)
+        t_ik = (time.perf_counter() - t0) / m_single
+        t0 = time.perf_counter()
+        ok, _ = m.lookup(P)
+        t_batch = time.perf_counter() - t0
+        _, exact = inverse(P, 0.0)
+        cls = np.array([np.nan if c is None else float(c) for c in cls])
+        sure = ~np.isnan(cls)
+        wrong = int(np.count_nonzero(sure & (cls != exact[:m_single])))
+
+        print(f"  reachable()              {t_reach*1e6:10.2f} us")
+        print(f"  classify()               {t_cls*1e6:10.2f} us  ({sure.mean()*100:.1f}% sin IK, "
+              f"{wrong} en desacuerdo con la IK)")
+        print(f"  warm_start()             {t_warm*1e6:10.2f} us")
+        print(f"  IK exacta (una pose)     {t_ik*1e6:10.2f} us")
+        print(f"  lookup en lote           {args.n/t_batch:14,.0f} consultas/s")
+        print(f"  coincidencia con IK      {(ok == exact).mean()*100:10.2f} % "
+              f"({args.n} poses al azar; difieren en el borde)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_startup(args):
+    """
+    Arranque de Inverse.py en subprocesos: desglose de imports y
+    time-to-first-command (primer movimiento de los sliders). Inverse.py usa
+    PAL, así que necesita display, pal y el QArm de QLabs (modo simulación).
+    """
+    Qarm_startup.bench("Inverse.py", modo="simulacion")
+
+
+BENCHMARKS = {
+    "ik": bench_ik,
+    "reach": bench_reach,
+    "startup": bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de cinemática del QArm")
+    parser.add_argument("bench", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", type=int, default=100000, help="poses")
+    parser.add_argument("--resolution", type=float, default=0.01, help="vóxel del mapa de alcance (m)")
+    args = parser.parse_args()
+    np.set_printoptions(precision=3, suppress=True)
+    BENCHMARKS[args.bench](args)
+
+
+if __name__ == "__main__":
+    main()